@@ -1,8 +1,7 @@
 # app.py
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import pandas as pd
 import numpy as np
-import joblib
 import sys
 from pathlib import Path
 
@@ -11,48 +10,29 @@ sys.path.append(str(Path(__file__).resolve().parent))
 
 import config # 导入配置文件
 # 显式导入需要的工具函数，避免命名空间冲突
-from src.utils import parse_description, parse_ram # 导入辅助函数
+from src.schema import RequestError, decode_request, decode_batch, encode_response
+from src.ensemble import load_bundle, normalize_records, encode_features, scale_features, predict_batch
+from src.price_table import load_price_table, lookup_price
+from src.drift_monitor import TrafficRecorder, load_category_levels
+from src.region import get_region_coefficient
+from src.calibration import get_calibration_factor, get_calibration_factors
+from src.market_index import get_market_factor
+from src.shadow import ShadowScorer
+from src.explain import ExplanationCache
+from src.parse_cache import get_parse_cache
 
 app = Flask(__name__)
 
 # --- 加载模型和预处理组件 (在启动时加载一次) ---
 try:
     print("正在加载模型和组件...")
-    xgb_model = joblib.load(config.XGB_MODEL_PATH)
-    weights = joblib.load(config.MODEL_WEIGHTS_PATH)
-    feature_names = joblib.load(config.FEATURE_NAMES_PATH)
-    scaler = joblib.load(config.SCALER_PATH)
+    bundle = load_bundle()
     print("XGBoost, Weights, FeatureNames, Scaler 加载成功。")
-
-    # 条件加载KNN和Decay模型
-    try:
-        knn_model = joblib.load(config.KNN_MODEL_PATH)
-        knn_features = joblib.load(config.KNN_FEATURES_PATH)
-        print("KNN 模型加载成功。")
-    except FileNotFoundError:
-        print("KNN 模型文件未找到，将在预测中禁用KNN。")
-        knn_model = None
-        weights['knn'] = 0 # 禁用权重
-
-    try:
-        decay_model = joblib.load(config.DECAY_MODEL_PATH)
-        decay_features = joblib.load(config.DECAY_FEATURES_PATH)
-        print("Decay 模型加载成功。")
-    except FileNotFoundError:
-        print("Decay 模型文件未找到，将在预测中禁用Decay模型。")
-        decay_model = None
-        weights['decay'] = 0 # 禁用权重
-
-    # 重新归一化权重（如果某个模型加载失败）
-    active_models_sum = sum(weights[k] for k in weights if (k == 'xgb' and xgb_model is not None) or \
-                                                          (k == 'knn' and knn_model is not None) or \
-                                                          (k == 'decay' and decay_model is not None))
-    if active_models_sum > 0 and active_models_sum < 1.0:
-         print("部分模型加载失败，重新归一化权重...")
-         scale_factor = 1.0 / active_models_sum
-         for k in weights:
-             weights[k] *= scale_factor
-    print(f"最终使用的模型权重: {weights}")
+    if bundle['knn'] is None: print("KNN 模型文件未找到，将在预测中禁用KNN。")
+    if bundle['decay'] is None: print("Decay 模型文件未找到，将在预测中禁用Decay模型。")
+    if bundle['xgb_quantile'] is None: print("分位数模型文件未找到，价格区间将使用固定比例。")
+    if bundle['fused_linear']: print(f"折叠线性组件加载成功: {list(bundle['fused_linear'])}")
+    print(f"最终使用的模型权重: {bundle['weights']}")
     MODELS_LOADED = True
 
 except FileNotFoundError as e:
@@ -62,55 +42,105 @@ except Exception as e:
      print(f"加载模型时发生未知错误: {e}")
      MODELS_LOADED = False
 
+# 预计算价格查找表 (可选)，网格内的输入直接查表，网格外回退到实时模型；PRICE_TABLE_ENABLED=0 时即使文件存在也不加载
+price_table = load_price_table(config.PRICE_TABLE_PATH) if MODELS_LOADED and config.PRICE_TABLE_ENABLED else None
+if price_table is not None:
+    print(f"价格查找表加载成功 (构建年份 {price_table['build_year']}, 形状 {price_table['values'].shape})")
+PRICE_TABLE_STATS = {'hits': 0, 'misses': 0}
+
+# 级联推理 (可选): 对结果影响小的分段只运行 XGBoost，跳过 KNN/Decay
+CASCADE_ACTIVE = MODELS_LOADED and config.CASCADE_ENABLED and bundle['cascade'] is not None
+if CASCADE_ACTIVE:
+    print(f"级联推理已启用 (容差 {bundle['cascade']['tolerance']}，{len(bundle['cascade']['plans'])} 个分段)")
+CASCADE_STATS = {'fast_path': 0, 'full_path': 0}
+
+# 影子模式 (可选): 候选模型在响应发送后异步打分，不影响主模型延迟
+shadow_scorer = None
+if MODELS_LOADED and config.SHADOW_MODEL_DIR:
+    try:
+        shadow_scorer = ShadowScorer(load_bundle(config.SHADOW_MODEL_DIR), config.SHADOW_LOG_DIR, config.SHADOW_SAMPLE_EVERY,
+                                     config.SHADOW_WORKERS, config.SHADOW_MAX_PENDING, config.SHADOW_BATCH_SIZE, config.SHADOW_BATCH_WAIT)
+        print(f"影子模式已启用，候选模型: {config.SHADOW_MODEL_DIR}")
+    except FileNotFoundError as e:
+        print(f"警告: 候选模型加载失败 ({e})，影子模式未启用。")
+
+# 价格解释: 预测和解释在同一次批量计算中得到，按请求缓存
+explanation_cache = ExplanationCache(bundle) if MODELS_LOADED else None
+
+# 线上流量采样 (漂移监控)，后台线程异步写入环形缓冲区
+# 类别字段按训练分布中的类别表编码，训练分布不存在时不采样
+traffic_levels = load_category_levels() if config.DRIFT_MONITOR_ENABLED else None
+traffic_recorder = TrafficRecorder(config.DRIFT_LOG_DIR, config.DRIFT_LOG_CAPACITY, config.DRIFT_SAMPLE_EVERY, traffic_levels) \
+    if traffic_levels is not None else None
+if config.DRIFT_MONITOR_ENABLED and traffic_recorder is None:
+    print(f"警告: 训练数据分布未找到于 {config.TRAINING_PROFILE_PATH}，漂移监控采样未启用。")
+
+
+# --- 定义特征处理函数 (逻辑位于 src/ensemble.py，与训练时保持一致) ---
+def build_raw_features(data):
+    """构造与训练时列顺序一致、但尚未标准化的特征行"""
+    return encode_features(normalize_records([data]), bundle['feature_names'], bundle['category_levels'])
+
 
-# --- 定义特征处理函数 (需要与feature_engineering.py中的逻辑严格一致!) ---
 def preprocess_input_api(data):
-    # data 是一个字典
-    df = pd.DataFrame([data])
-
-    # --- 执行与训练时相同的特征工程步骤 ---
-    # (与 src/feature_engineering.py 中的逻辑保持一致，但只处理单行)
-    # 1. 解析/设置基本特征
-    df['ram_size'] = df['ram_desc'].apply(lambda x: parse_ram(x)) # 使用导入的函数
-    # ... (处理 release_year, cpu_score 等, 注意填充方式要稳定) ...
-    df['release_year'] = pd.to_numeric(df.get('release_year', config.BASE_DIR.now().year - 2), errors='coerce').fillna(config.BASE_DIR.now().year - 2).astype(int)
-    df['cpu_score'] = pd.to_numeric(df.get('cpu_score', 3000), errors='coerce').fillna(3000) # 使用默认值
-
-    # 2. 时间特征
-    current_year = config.BASE_DIR.now().year
-    df['age'] = (current_year - df['release_year']).clip(lower=0)
-    df['age_factor'] = 0.9 ** df['age']
-
-    # 3. 性能等级
-    bins = [-np.inf, 2000, 5000, 10000, np.inf]
-    labels = ['low', 'mid', 'high', 'very_high']
-    df['performance_tier'] = pd.cut(df['cpu_score'], bins=bins, labels=labels, right=False)
-
-    # 4. One-Hot Encoding (关键：需要对齐训练时的所有列)
-    categorical_features = ['brand', 'gpu_type', 'storage_type', 'screen_condition', 'battery_health', 'performance_tier']
-    for col in categorical_features:
-       df[col] = df.get(col, 'Unknown') # 使用 get 获取，提供默认值
-       df[col] = df[col].astype(str).fillna('Unknown')
-
-    df_encoded = pd.get_dummies(df, columns=categorical_features, dummy_na=False)
-
-    # **对齐特征列**
-    aligned_df = pd.DataFrame(columns=feature_names, index=df_encoded.index).fillna(0)
-    common_cols = list(set(aligned_df.columns) & set(df_encoded.columns))
-    aligned_df[common_cols] = df_encoded[common_cols]
-
-    # 5. 数值特征标准化
-    numerical_features = aligned_df.select_dtypes(include=np.number).columns.tolist()
-    numerical_features_present = [f for f in numerical_features if f in aligned_df.columns]
-    if numerical_features_present:
-         # 检查scaler是否加载成功
-         if 'scaler' in globals() and scaler is not None:
-             aligned_df[numerical_features_present] = scaler.transform(aligned_df[numerical_features_present])
-         else:
-             print("警告: Scaler未加载，未进行标准化。")
-
-
-    return aligned_df[feature_names] # 确保返回训练时的列顺序
+    return scale_features(build_raw_features(data), bundle['scaler'])
+
+
+def client_ip():
+    """客户端 IP (部署在反向代理后时取 X-Forwarded-For 的第一跳)"""
+    if config.REGION_TRUST_FORWARDED_FOR and request.headers.get('X-Forwarded-For'):
+        return request.headers['X-Forwarded-For'].split(',')[0].strip()
+    return request.remote_addr
+
+
+def json_response(obj, status=200):
+    """用 msgspec 编码响应 (比 jsonify 的 json.dumps 快，中文不转义)"""
+    return Response(encode_response(obj), status=status, mimetype='application/json')
+
+
+def apply_adjustments(data, final_prediction, low, high):
+    """(可选) 依次应用市场指数系数 / 区域价格系数 / 人工校准系数，返回调整后的价格和各系数"""
+    factors = {}
+    if config.MARKET_INDEX_ENABLED:
+        factors['market_index'] = get_market_factor(data)
+    if config.REGION_COEFFICIENTS_ENABLED:
+        factors['region'] = get_region_coefficient(client_ip())
+    if config.CALIBRATION_ENABLED:
+        # 校准规则按已应用前面系数的价格匹配
+        price = final_prediction * np.prod(list(factors.values()))
+        factors['calibration'] = get_calibration_factor(data, price)
+    factor = float(np.prod(list(factors.values())))
+    return final_prediction * factor, low * factor, high * factor, factors
+
+
+def batch_adjustment_factors(records, predictions):
+    """apply_adjustments 的批量版本 (/explain): 返回每条记录的 {系数名: 系数}，校准规则整批匹配一次"""
+    factors = [{} for _ in records]
+    if config.MARKET_INDEX_ENABLED:
+        for item, data in zip(factors, records):
+            item['market_index'] = get_market_factor(data)
+    if config.REGION_COEFFICIENTS_ENABLED:
+        region = get_region_coefficient(client_ip()) # 同一个 HTTP 请求，客户端 IP 相同
+        for item in factors:
+            item['region'] = region
+    if config.CALIBRATION_ENABLED:
+        # 校准规则按已应用前面系数的价格匹配
+        prices = np.asarray(predictions, dtype=float) * np.array([np.prod(list(item.values())) for item in factors])
+        for item, f in zip(factors, get_calibration_factors(records, prices)):
+            item['calibration'] = float(f)
+    return factors
+
+
+def format_price_response(final_prediction, low, high):
+    """应用最低价和最小区间宽度，生成返回给客户端的价格字段"""
+    price_low = max(config.MINIMUM_PRICE, int(low)) # 应用最低价
+    price_high = max(price_low + 50, int(high)) # 保证区间宽度
+    return {
+        'predicted_price': int(round(final_prediction)), # 四舍五入取整
+        'price_range_low': price_low,
+        'price_range_high': price_high,
+        'price_range_str': f"{price_low}-{price_high}元"
+    }
 
 # --- API Endpoint ---
 @app.route('/predict', methods=['POST'])
@@ -119,74 +149,55 @@ def predict():
         return jsonify({'error': '模型或依赖组件未成功加载，服务不可用'}), 503 # Service Unavailable
 
     try:
-        data = request.json
+        # 解码并校验请求 (有文本描述时解析出的字段只填补未给出的字段)，无效输入在特征处理之前返回 400
+        data = decode_request(request.get_data())
         print(f"收到请求数据: {data}")
 
-        # 如果输入是文本描述，先解析
-        if 'description' in data and isinstance(data['description'], str):
-            print("解析文本描述...")
-            parsed_info = parse_description(data['description']) # 使用导入的函数
-            # 合并信息，让 JSON 中明确给出的字段覆盖解析出的字段
-            base_info = data.copy()
-            base_info.update(parsed_info) # 解析结果覆盖默认值
-            base_info.update(data) # 用户输入覆盖解析结果
-            data = base_info
-            # del data['description'] # 可以选择移除原始描述
-            print(f"解析并合并后数据: {data}")
-
-
-        # 数据预处理/特征工程
-        print("进行特征处理...")
-        features_df = preprocess_input_api(data)
-        print(f"处理后特征维度: {features_df.shape}")
-        # print(f"处理后特征样本: \n{features_df.head().to_string()}") # 打印样本用于调试
-
-        # 模型预测
-        print("进行模型预测...")
-        final_prediction = 0.0
-        if xgb_model:
-            xgb_pred = xgb_model.predict(features_df)[0]
-            final_prediction += weights['xgb'] * xgb_pred
-            print(f"XGB Pred: {xgb_pred:.2f}")
-
-        if knn_model:
-            # 确保只使用KNN训练时的特征
-            knn_input_features = features_df[knn_features]
-            knn_pred = knn_model.predict(knn_input_features)[0]
-            final_prediction += weights['knn'] * knn_pred
-            print(f"KNN Pred: {knn_pred:.2f}")
-
-        if decay_model:
-             # 确保只使用Decay模型训练时的特征
-            decay_input_features = features_df[decay_features]
-            decay_pred = decay_model.predict(decay_input_features)[0]
-            final_prediction += weights['decay'] * decay_pred
-            print(f"Decay Pred: {decay_pred:.2f}")
-
-        # 确保价格不为负
-        final_prediction = max(0, float(final_prediction))
+        # 网格内的输入直接查表 (O(1))
+        cached = lookup_price(price_table, data)
+        if cached is not None:
+            PRICE_TABLE_STATS['hits'] += 1
+            final_prediction, low, high = cached
+            print(f"查找表命中: {final_prediction:.2f}")
+        else:
+            if price_table is not None:
+                PRICE_TABLE_STATS['misses'] += 1
+
+            # 数据预处理/特征工程
+            print("进行特征处理...")
+            raw_features_df = build_raw_features(data)
+            print(f"处理后特征维度: {raw_features_df.shape}")
+
+            # 模型预测
+            print("进行模型预测...")
+            preds = predict_batch(bundle, raw_features_df)
+            for name in ('xgb', 'knn', 'decay'):
+                if name in preds:
+                    print(f"{name.upper()} Pred: {preds[name][0]:.2f}")
+            final_prediction, low, high = float(preds['final'][0]), float(preds['low'][0]), float(preds['high'][0])
+            if 'fast_path' in preds:
+                CASCADE_STATS['fast_path' if preds['fast_path'][0] else 'full_path'] += 1
         print(f"最终预测价格 (原始): {final_prediction:.2f}")
 
 
-        # (可选) 应用区域价格系数 / 人工校准系数
-        # final_prediction *= get_region_coefficient(...)
-        # final_prediction *= get_calibration_factor(...)
+        if traffic_recorder is not None:
+            traffic_recorder.record(data, final_prediction)
+        model_prediction = (final_prediction, low, high) # 应用各类系数之前的模型输出，供影子模式对比
+
+        # (可选) 应用市场指数系数 / 区域价格系数 / 人工校准系数
+        final_prediction, low, high, _ = apply_adjustments(data, final_prediction, low, high)
 
         # 格式化输出价格区间
-        price_low = int(final_prediction * config.PRICE_RANGE_FACTOR_LOW)
-        price_high = int(final_prediction * config.PRICE_RANGE_FACTOR_HIGH)
-        price_low = max(config.MINIMUM_PRICE, price_low) # 应用最低价
-        price_high = max(price_low + 50, price_high) # 保证区间宽度
-
-        response_data = {
-            'predicted_price': int(round(final_prediction)), # 四舍五入取整
-            'price_range_low': price_low,
-            'price_range_high': price_high,
-            'price_range_str': f"{price_low}-{price_high}元"
-        }
+        response_data = format_price_response(final_prediction, low, high)
         print(f"返回结果: {response_data}")
-        return jsonify(response_data)
-
+        response = json_response(response_data)
+        if shadow_scorer is not None:
+            response.call_on_close(lambda: shadow_scorer.submit(data, *model_prediction))
+        return response
+
+    except RequestError as e:
+        print(f"无效请求: {e}")
+        return json_response({'error': str(e)}, 400)
     except KeyError as e:
          print(f"预测时发生KeyError: {e} - 输入数据可能缺少必要字段。")
          return jsonify({'error': f'Missing key in input data or processing: {e}'}), 400
@@ -196,10 +207,58 @@ def predict():
         traceback.print_exc() # 打印详细错误栈
         return jsonify({'error': 'Prediction failed due to an internal error.', 'message': str(e)}), 500
 
+@app.route('/explain', methods=['POST'])
+def explain():
+    """返回价格及其解释 (基准价、各字段贡献、相似成交)；body 可以是单个请求或请求列表 (批量解释)"""
+    if not MODELS_LOADED:
+        return jsonify({'error': '模型或依赖组件未成功加载，服务不可用'}), 503
+
+    try:
+        records, is_list = decode_batch(request.get_data(), config.EXPLAIN_MAX_BATCH)
+
+        explained = explanation_cache.explain(records)
+        results = []
+        all_factors = batch_adjustment_factors(records, [model_price for model_price, *_ in explained])
+        for (model_price, low, high, explanation), factors in zip(explained, all_factors):
+            factor = float(np.prod(list(factors.values())))
+            # 缓存中的解释由多个请求共享，这里只组合新的响应对象，不修改它
+            results.append(dict(format_price_response(model_price * factor, low * factor, high * factor), explanation=explanation,
+                                adjustments={name: round(float(f), 4) for name, f in factors.items()}))
+        return json_response(results if is_list else results[0])
+
+    except RequestError as e:
+        print(f"无效请求: {e}")
+        return json_response({'error': str(e)}, 400)
+    except KeyError as e:
+        print(f"解释时发生KeyError: {e} - 输入数据可能缺少必要字段。")
+        return jsonify({'error': f'Missing key in input data or processing: {e}'}), 400
+    except Exception as e:
+        print(f"解释过程中发生错误: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': 'Explanation failed due to an internal error.', 'message': str(e)}), 500
+
 # --- 根路径或其他辅助端点 ---
 @app.route('/')
 def home():
-    return "旧电脑估价模型 API 已启动。请使用 /predict 端点进行估价。"
+    return "旧电脑估价模型 API 已启动。请使用 /predict 端点进行估价，/explain 查看价格构成。"
+
+@app.route('/stats')
+def stats():
+    """当前 worker 的查找表命中统计 (附带解释缓存、描述解析缓存和影子打分统计)"""
+    total = PRICE_TABLE_STATS['hits'] + PRICE_TABLE_STATS['misses']
+    coverage = PRICE_TABLE_STATS['hits'] / total if total else 0.0
+    result = {'price_table': dict(PRICE_TABLE_STATS, coverage=coverage)}
+    if shadow_scorer is not None:
+        result['shadow'] = dict(shadow_scorer.stats)
+    if CASCADE_ACTIVE:
+        served = CASCADE_STATS['fast_path'] + CASCADE_STATS['full_path']
+        result['cascade'] = dict(CASCADE_STATS, fast_path_fraction=CASCADE_STATS['fast_path'] / served if served else 0.0)
+    if explanation_cache is not None:
+        result['explain_cache'] = dict(explanation_cache.stats, size=len(explanation_cache))
+    if config.PARSE_CACHE_ENABLED:
+        result['parse_cache'] = dict(get_parse_cache().stats)
+    return jsonify(result)
 
 # --- 启动 Flask 应用 ---
 if __name__ == '__main__':
@@ -1,228 +1,254 @@
-# scripts/scraper_selenium.py
-
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-import time
-import random
-import pandas as pd
-from datetime import datetime
-import sys
+# config.py
+# 项目配置: 路径、模型参数、服务参数和爬虫参数。
+# 只依赖标准库，API、训练脚本和爬虫都可以廉价地导入；爬虫所需的 requests/selenium
+# 只在 scripts/ 下的爬虫入口中导入。
+#
+# 覆盖方式 (优先级从高到低):
+#   1. 环境变量 OCV_<名称>，如 OCV_MODEL_DIR=/srv/models、OCV_KNN_K=7、
+#      OCV_XGB_PARAMS='{"n_estimators": 500}' (dict/list 使用 JSON)
+#   2. JSON 配置文件: 环境变量 OCV_CONFIG_FILE 指定的路径，默认为项目根目录下的 config.local.json
+#   3. 本文件中的默认值
+# 所有值在首次导入时计算一次并缓存为模块级常量。
+import json
+import os
+from functools import lru_cache
 from pathlib import Path
-import re # 引入 re
-
-# 添加项目根目录到 Python 路径
-project_root = Path(__file__).resolve().parent.parent
-sys.path.append(str(project_root))
-
-try:
-    import config
-    print("成功导入 config.py")
-    START_URL = config.SCRAPER_SELENIUM_START_URL
-    SEARCH_KEYWORD = config.SCRAPER_SEARCH_KEYWORD # 可能不需要，如果 URL 包含搜索
-    MAX_ITEMS_TO_SCRAPE = config.SCRAPER_SELENIUM_MAX_ITEMS
-    OUTPUT_CSV_FILE = config.SCRAPER_OUTPUT_DIR / f'selenium_scraped_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-    USER_AGENT = config.SCRAPER_USER_AGENT
-    SLEEP_MIN = config.SCRAPER_SLEEP_MIN
-    SLEEP_MAX = config.SCRAPER_SLEEP_MAX
-except ImportError:
-    print("警告: 未找到或无法导入 config.py。将使用脚本内定义的默认值。")
-    # --- 如果没有 config.py ---
-    START_URL = "https://complex-dynamic-site.com" # !!! 必须替换 !!!
-    SEARCH_KEYWORD = "二手 联想 小新"
-    MAX_ITEMS_TO_SCRAPE = 50
-    OUTPUT_CSV_FILE = Path(f'selenium_scraped_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv')
-    USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    SLEEP_MIN = 2.0
-    SLEEP_MAX = 5.0
-    OUTPUT_CSV_FILE.parent.mkdir(parents=True, exist_ok=True)
-
-# --- WebDriver 初始化 ---
-def initialize_driver():
-    print("正在初始化 WebDriver...")
-    options = webdriver.ChromeOptions()
-    # options.add_argument('--headless') # 无头模式测试时可能需要注释掉，以便观察
-    options.add_argument('--disable-gpu')
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    options.add_argument(f'user-agent={USER_AGENT}')
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_experimental_option('useAutomationExtension', False)
-    # 添加更多反检测选项 (可选)
-    options.add_argument("--disable-blink-features=AutomationControlled")
 
+ENV_PREFIX = 'OCV_'
+BASE_DIR = Path(__file__).resolve().parent
+
+
+@lru_cache(maxsize=1)
+def _file_overrides():
+    path = Path(os.environ.get(ENV_PREFIX + 'CONFIG_FILE', BASE_DIR / 'config.local.json'))
+    if not path.exists():
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _coerce(raw, default):
+    """把环境变量中的字符串转换为与默认值相同的类型"""
+    if isinstance(default, bool):
+        return raw.strip().lower() in ('1', 'true', 'yes', 'on')
+    if isinstance(default, Path):
+        return Path(raw)
+    if isinstance(default, (int, float)):
+        return type(default)(raw)
+    if isinstance(default, (dict, list, tuple)):
+        value = json.loads(raw)
+        return tuple(value) if isinstance(default, tuple) else value
+    return raw
+
+
+def _setting(name, default):
+    """读取单个配置项: 环境变量 > 配置文件 > 默认值"""
+    env_value = os.environ.get(ENV_PREFIX + name)
+    if env_value is not None:
+        return _coerce(env_value, default)
+    if name in _file_overrides():
+        value = _file_overrides()[name]
+        if isinstance(default, Path):
+            return Path(value)
+        return tuple(value) if isinstance(default, tuple) else value
+    return default
+
+
+def settings():
+    """返回当前生效的全部配置 (用于调试或打印)"""
+    return {name: value for name, value in globals().items() if name.isupper()}
+
+
+# --- 目录 ---
+DATA_DIR = _setting('DATA_DIR', BASE_DIR / 'data')
+MODEL_DIR = _setting('MODEL_DIR', BASE_DIR / 'models')
+LOG_DIR = _setting('LOG_DIR', BASE_DIR / 'logs')
+
+# --- 数据 ---
+RAW_DATA_PATH = _setting('RAW_DATA_PATH', DATA_DIR / 'raw_data.csv')
+PROCESSED_DATA_PATH = _setting('PROCESSED_DATA_PATH', DATA_DIR / 'processed_data.csv')
+
+# --- 模型组件 ---
+XGB_MODEL_PATH = _setting('XGB_MODEL_PATH', MODEL_DIR / 'xgb_model.pkl')
+XGB_QUANTILE_MODEL_PATH = _setting('XGB_QUANTILE_MODEL_PATH', MODEL_DIR / 'xgb_quantile_model.pkl')
+PRICE_INTERVAL_CONFORMAL_PATH = _setting('PRICE_INTERVAL_CONFORMAL_PATH', MODEL_DIR / 'interval_conformal.pkl') # 分位数区间的共形校准结果
+KNN_MODEL_PATH = _setting('KNN_MODEL_PATH', MODEL_DIR / 'knn_model.pkl')
+KNN_FEATURES_PATH = _setting('KNN_FEATURES_PATH', MODEL_DIR / 'knn_features.pkl')
+KNN_LISTINGS_PATH = _setting('KNN_LISTINGS_PATH', MODEL_DIR / 'knn_listings.pkl') # KNN 训练样本的帖子信息 (/explain 展示相似成交)
+DECAY_MODEL_PATH = _setting('DECAY_MODEL_PATH', MODEL_DIR / 'decay_model.pkl')
+DECAY_FEATURES_PATH = _setting('DECAY_FEATURES_PATH', MODEL_DIR / 'decay_features.pkl')
+MODEL_WEIGHTS_PATH = _setting('MODEL_WEIGHTS_PATH', MODEL_DIR / 'model_weights.pkl')
+FEATURE_NAMES_PATH = _setting('FEATURE_NAMES_PATH', MODEL_DIR / 'feature_names.pkl')
+SCALER_PATH = _setting('SCALER_PATH', MODEL_DIR / 'scaler.pkl')
+CATEGORY_LEVELS_PATH = _setting('CATEGORY_LEVELS_PATH', MODEL_DIR / 'category_levels.pkl')
+FUSED_LINEAR_PATH = _setting('FUSED_LINEAR_PATH', MODEL_DIR / 'fused_linear.pkl')
+CASCADE_PATH = _setting('CASCADE_PATH', MODEL_DIR / 'cascade.pkl') # 级联推理的分段路由 (src/cascade.py)
+PRICE_TABLE_PATH = _setting('PRICE_TABLE_PATH', MODEL_DIR / 'price_table.npz')
+TRAINING_PROFILE_PATH = _setting('TRAINING_PROFILE_PATH', MODEL_DIR / 'training_profile.pkl')
+
+# --- 特征工程与模型参数 ---
+FEATURE_ENGINEERING_MODE = _setting('FEATURE_ENGINEERING_MODE', 'dense') # 'dense' 或 'compact'
+XGB_PARAMS = _setting('XGB_PARAMS', {
+    'n_estimators': 300,
+    'max_depth': 6,
+    'learning_rate': 0.05,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'objective': 'reg:squarederror',
+    'eval_metric': 'rmse',
+    'early_stopping_rounds': 10,
+    'random_state': 42,
+    'n_jobs': -1,
+})
+KNN_K = _setting('KNN_K', 5)
+MODEL_WEIGHTS = _setting('MODEL_WEIGHTS', {'xgb': 0.6, 'knn': 0.25, 'decay': 0.15})
+
+# --- 级联推理 (对结果影响小的分段跳过 KNN/Decay) ---
+CASCADE_ENABLED = _setting('CASCADE_ENABLED', False) # API 是否按 cascade.pkl 路由 (训练时总会拟合并报告)
+CASCADE_TOLERANCE = _setting('CASCADE_TOLERANCE', 0.05) # 快速路径与完整混合预测的相对偏差上限
+CASCADE_COVERAGE = _setting('CASCADE_COVERAGE', 0.95) # 分段内满足容差的样本比例至少为此值才走快速路径
+CASCADE_MIN_SEGMENT_SIZE = _setting('CASCADE_MIN_SEGMENT_SIZE', 30) # 样本少于此值的分段不学习 (退回粗分段或完整路径)
+CASCADE_REPORT_TOLERANCES = _setting('CASCADE_REPORT_TOLERANCES', (0.01, 0.02, 0.05, 0.1)) # 训练时报告的容差
+
+# --- 价格区间 ---
+PRICE_RANGE_FACTOR_LOW = _setting('PRICE_RANGE_FACTOR_LOW', 0.9) # 无分位数模型时使用的固定比例
+PRICE_RANGE_FACTOR_HIGH = _setting('PRICE_RANGE_FACTOR_HIGH', 1.1)
+PRICE_INTERVAL_QUANTILES = _setting('PRICE_INTERVAL_QUANTILES', (0.1, 0.9))
+PRICE_INTERVAL_CALIBRATION_FRACTION = _setting('PRICE_INTERVAL_CALIBRATION_FRACTION', 0.2) # 训练集中留作共形校准集的比例 (0 为不校准)
+MINIMUM_PRICE = _setting('MINIMUM_PRICE', 100)
+
+# --- 请求校验 (src/schema.py) ---
+REQUEST_MAX_DESCRIPTION_LENGTH = _setting('REQUEST_MAX_DESCRIPTION_LENGTH', 5000) # 超过此长度的描述返回 400
+
+# --- 预计算价格查找表 ---
+PRICE_TABLE_ENABLED = _setting('PRICE_TABLE_ENABLED', True) # 训练时是否构建查找表，API 是否使用它
+PRICE_TABLE_BATCH_SIZE = _setting('PRICE_TABLE_BATCH_SIZE', 50000)
+PRICE_TABLE_GRID = _setting('PRICE_TABLE_GRID', {
+    'brand': ['Apple', 'Lenovo', 'ThinkPad', 'Dell', 'HP', 'Asus', 'Acer', 'Huawei', 'Xiaomi', 'Other', 'Unknown'],
+    'gpu_type': ['Integrated', 'Dedicated', 'Unknown'], # 'Unknown': 描述中没有提到的字段 (utils.MISSING_CATEGORY)
+    'storage_type': ['SSD', 'HDD', 'Unknown'],
+    'screen_condition': ['完美', '良好', '较差', 'Unknown'],
+    'battery_health': ['完美', '良好', '较差', 'Unknown'],
+    'ram_size': [4, 8, 16, 32],
+    # 每个性能等级内按约 1.3 倍间隔取点，配合 PRICE_TABLE_CPU_TOLERANCE 覆盖连续的分数 (3000 为缺少 cpu_score 时的默认值)
+    'cpu_score': [1000, 1300, 1700, 2300, 3000, 3900, 4700, 5800, 7500, 9000, 11500, 15000, 19500],
+    'age': list(range(0, 11)),
+})
+# cpu_score 是连续值: 与最近网格点的相对偏差不超过该比例且性能等级相同时按该网格点查表，否则回退到实时模型
+PRICE_TABLE_CPU_TOLERANCE = _setting('PRICE_TABLE_CPU_TOLERANCE', 0.15)
+
+# --- 漂移监控 ---
+DRIFT_MONITOR_ENABLED = _setting('DRIFT_MONITOR_ENABLED', True)
+DRIFT_LOG_DIR = _setting('DRIFT_LOG_DIR', LOG_DIR / 'traffic')
+DRIFT_LOG_CAPACITY = _setting('DRIFT_LOG_CAPACITY', 100000) # 每个 worker 环形缓冲区的记录数
+DRIFT_SAMPLE_EVERY = _setting('DRIFT_SAMPLE_EVERY', 10) # 每 N 个请求采样一条
+DRIFT_HISTOGRAM_BINS = _setting('DRIFT_HISTOGRAM_BINS', 10)
+DRIFT_WINDOW_DAYS = _setting('DRIFT_WINDOW_DAYS', 7)
+DRIFT_MIN_SAMPLES = _setting('DRIFT_MIN_SAMPLES', 500)
+DRIFT_PSI_THRESHOLD = _setting('DRIFT_PSI_THRESHOLD', 0.2)
+DRIFT_UNSEEN_RATE_THRESHOLD = _setting('DRIFT_UNSEEN_RATE_THRESHOLD', 0.05)
+DRIFT_DEFAULT_RATE_THRESHOLD = _setting('DRIFT_DEFAULT_RATE_THRESHOLD', 0.3)
+DRIFT_REPORT_PATH = _setting('DRIFT_REPORT_PATH', MODEL_DIR / 'drift_report.json')
+
+# --- 地区价格系数 ---
+REGION_COEFFICIENTS_ENABLED = _setting('REGION_COEFFICIENTS_ENABLED', True)
+REGION_IP_RANGES_PATH = _setting('REGION_IP_RANGES_PATH', DATA_DIR / 'region_ip_ranges.csv') # start_ip,end_ip,region
+REGION_COEFFICIENTS_PATH = _setting('REGION_COEFFICIENTS_PATH', MODEL_DIR / 'region_coefficients.csv') # region,coefficient
+REGION_HOLDOUT_PATH = _setting('REGION_HOLDOUT_PATH', MODEL_DIR / 'holdout_predictions.pkl') # 训练时测试集的实际价格/预测/location，用于推导地区系数
+REGION_IP_CACHE_SIZE = _setting('REGION_IP_CACHE_SIZE', 65536) # 热门客户端 IP 的 LRU 缓存大小
+REGION_SHRINKAGE = _setting('REGION_SHRINKAGE', 20) # 推导系数时向 1.0 收缩的强度 (等效样本数)
+REGION_MIN_COUNT = _setting('REGION_MIN_COUNT', 5) # 样本数少于此值的地区不生成系数
+REGION_TRUST_FORWARDED_FOR = _setting('REGION_TRUST_FORWARDED_FOR', False) # 部署在反向代理后时读取 X-Forwarded-For
+
+# --- 人工校准规则 ---
+CALIBRATION_ENABLED = _setting('CALIBRATION_ENABLED', True)
+CALIBRATION_RULES_PATH = _setting('CALIBRATION_RULES_PATH', DATA_DIR / 'calibration_rules.json')
+CALIBRATION_RELOAD_INTERVAL = _setting('CALIBRATION_RELOAD_INTERVAL', 5.0) # 检查规则文件是否修改的间隔 (秒)
+CALIBRATION_AUDIT_LOG_PATH = _setting('CALIBRATION_AUDIT_LOG_PATH', LOG_DIR / 'calibration_audit.jsonl')
+
+# --- 近似重复帖子检测 (MinHash/LSH) ---
+DEDUP_ENABLED = _setting('DEDUP_ENABLED', True)
+DEDUP_MODE = _setting('DEDUP_MODE', 'drop') # 'drop': 每个重发簇只保留一条; 'group': 保留全部，按簇划分训练/测试集
+DEDUP_SHINGLE_SIZE = _setting('DEDUP_SHINGLE_SIZE', 3) # 字符 shingle 长度 (中文描述较短，3 个字符较合适)
+DEDUP_NUM_PERM = _setting('DEDUP_NUM_PERM', 64) # MinHash 签名长度
+DEDUP_BANDS = _setting('DEDUP_BANDS', 16) # LSH band 数 (每个 band 含 NUM_PERM/BANDS 个值)
+DEDUP_THRESHOLD = _setting('DEDUP_THRESHOLD', 0.7) # 估计 Jaccard 相似度不低于此值视为重发
+DEDUP_PRICE_TOLERANCE = _setting('DEDUP_PRICE_TOLERANCE', 0.2) # 价格相对差超过此值不视为同一台机器
+DEDUP_CHUNK_SIZE = _setting('DEDUP_CHUNK_SIZE', 100000) # 每批计算签名的描述条数
+DEDUP_SEED = _setting('DEDUP_SEED', 42)
+
+# --- 价格解释 (/explain) ---
+EXPLAIN_CACHE_SIZE = _setting('EXPLAIN_CACHE_SIZE', 10000) # 每个 worker 缓存的 (预测, 解释) 条数
+EXPLAIN_TOP_FEATURES = _setting('EXPLAIN_TOP_FEATURES', 8) # 每个解释列出的字段数 (按贡献绝对值)
+EXPLAIN_MAX_BATCH = _setting('EXPLAIN_MAX_BATCH', 100) # 单次 /explain 请求最多解释的条数
+
+# --- 爬虫数据 ETL (爬虫输出 → RAW_DATA_PATH) ---
+ETL_SOURCE_DIR = _setting('ETL_SOURCE_DIR', '') # 爬虫输出目录，为空时使用 SCRAPER_OUTPUT_DIR
+ETL_SOURCE_PATTERN = _setting('ETL_SOURCE_PATTERN', '*_scraped_data_*.csv')
+ETL_MANIFEST_PATH = _setting('ETL_MANIFEST_PATH', DATA_DIR / 'etl_manifest.json') # 已处理文件的 mtime/大小/内容哈希
+ETL_WORKERS = _setting('ETL_WORKERS', 0) # 解析描述的进程数，0 表示使用全部 CPU
+ETL_CHUNK_SIZE = _setting('ETL_CHUNK_SIZE', 20000) # 每个进程任务解析的描述条数
+
+# --- 描述解析缓存 (src/parse_cache.py，训练/ETL 与各 API worker 共享) ---
+PARSE_CACHE_ENABLED = _setting('PARSE_CACHE_ENABLED', True)
+PARSE_CACHE_PATH = _setting('PARSE_CACHE_PATH', DATA_DIR / 'parse_cache.sqlite') # 按 (解析器版本, 描述哈希) 存储解析结果
+PARSE_CACHE_MEMORY_SIZE = _setting('PARSE_CACHE_MEMORY_SIZE', 10000) # 每个进程内存 LRU 的条数
+PARSE_CACHE_TIMEOUT = _setting('PARSE_CACHE_TIMEOUT', 0.5) # 数据库被锁时等待的秒数，超时则跳过缓存直接解析
+
+# --- 影子模式 (候选模型在线对比) ---
+SHADOW_MODEL_DIR = _setting('SHADOW_MODEL_DIR', '') # 候选模型组件目录，为空时不启用
+SHADOW_LOG_DIR = _setting('SHADOW_LOG_DIR', LOG_DIR / 'shadow')
+SHADOW_SAMPLE_EVERY = _setting('SHADOW_SAMPLE_EVERY', 1) # 每 N 个请求用候选模型打分一次
+SHADOW_WORKERS = _setting('SHADOW_WORKERS', 1) # 后台打分线程数
+SHADOW_MAX_PENDING = _setting('SHADOW_MAX_PENDING', 1000) # 积压任务超过此值时丢弃新的打分任务
+SHADOW_BATCH_SIZE = _setting('SHADOW_BATCH_SIZE', 64) # 每批打分的最大请求数
+SHADOW_BATCH_WAIT = _setting('SHADOW_BATCH_WAIT', 0.05) # 攒批的最长等待时间 (秒)
+
+# --- 市场价格指数 (按 post_date) ---
+MARKET_INDEX_ENABLED = _setting('MARKET_INDEX_ENABLED', True)
+MARKET_INDEX_STATE_PATH = _setting('MARKET_INDEX_STATE_PATH', DATA_DIR / 'market_index_state.pkl') # 增量累加的 (分段, 周) 统计
+MARKET_INDEX_REFERENCE_PATH = _setting('MARKET_INDEX_REFERENCE_PATH', MODEL_DIR / 'market_reference.pkl') # 训练时的参考周水平
+MARKET_INDEX_SEGMENT = _setting('MARKET_INDEX_SEGMENT', 'performance_tier')
+MARKET_INDEX_WINDOW_WEEKS = _setting('MARKET_INDEX_WINDOW_WEEKS', 8) # 滚动平滑窗口 (周)
+MARKET_INDEX_MIN_COUNT = _setting('MARKET_INDEX_MIN_COUNT', 20) # 窗口内样本数少于此值时改用总体指数
+MARKET_INDEX_MAX_LOG_ADJUSTMENT = _setting('MARKET_INDEX_MAX_LOG_ADJUSTMENT', 0.5) # 单次调整的对数幅度上限
+MARKET_INDEX_RELOAD_INTERVAL = _setting('MARKET_INDEX_RELOAD_INTERVAL', 60.0) # API 检查指数状态文件是否更新的间隔 (秒)
+
+# --- 分段评估报告 ---
+EVALUATION_REPORT_PATH = _setting('EVALUATION_REPORT_PATH', MODEL_DIR / 'evaluation_report.json')
+EVAL_PRICE_BANDS = _setting('EVAL_PRICE_BANDS', [0, 1000, 2000, 3000, 5000, 8000, float('inf')]) # 按实际价格分段的边界
+EVAL_BOOTSTRAP_REPS = _setting('EVAL_BOOTSTRAP_REPS', 200) # 自助法重采样次数，0 表示不计算置信区间
+EVAL_BOOTSTRAP_WORKERS = _setting('EVAL_BOOTSTRAP_WORKERS', 0) # 并行进程数，0 表示使用全部 CPU
+EVAL_BOOTSTRAP_SEED = _setting('EVAL_BOOTSTRAP_SEED', 42)
+EVAL_MIN_SEGMENT_SIZE = _setting('EVAL_MIN_SEGMENT_SIZE', 30) # 打印最差分段时忽略样本过少的分段
+
+# --- 训练流水线性能分析 (python src/train_model.py --profile) ---
+PROFILE_DIR = _setting('PROFILE_DIR', LOG_DIR / 'profile') # 每次运行写入一个子目录 (summary.json 及 .prof/.folded)
+PROFILE_SAMPLE_INTERVAL = _setting('PROFILE_SAMPLE_INTERVAL', 0.01) # RSS 和调用栈的采样间隔 (秒)
+
+# --- 爬虫 (仅 scripts/ 下的爬虫使用) ---
+SCRAPER_OUTPUT_DIR = _setting('SCRAPER_OUTPUT_DIR', DATA_DIR)
+SCRAPER_SEARCH_KEYWORD = _setting('SCRAPER_SEARCH_KEYWORD', '二手 联想 小新')
+SCRAPER_USER_AGENT = _setting('SCRAPER_USER_AGENT', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+SCRAPER_SLEEP_MIN = _setting('SCRAPER_SLEEP_MIN', 2.0)
+SCRAPER_SLEEP_MAX = _setting('SCRAPER_SLEEP_MAX', 5.0)
+SCRAPER_BASIC_BASE_URL = _setting('SCRAPER_BASIC_BASE_URL', 'http://example-static-site.com/search') # !!! 必须替换 !!!
+SCRAPER_BASIC_MAX_PAGES = _setting('SCRAPER_BASIC_MAX_PAGES', 3)
+SCRAPER_SELENIUM_START_URL = _setting('SCRAPER_SELENIUM_START_URL', 'https://complex-dynamic-site.com') # !!! 必须替换 !!!
+SCRAPER_SELENIUM_MAX_ITEMS = _setting('SCRAPER_SELENIUM_MAX_ITEMS', 50)
+SCRAPER_SELENIUM_CAPTURE_MODE = _setting('SCRAPER_SELENIUM_CAPTURE_MODE', 'network') # 'network': 读取 XHR 的 JSON 响应; 'script': 一次 execute_script 提取 DOM
+SCRAPER_SELENIUM_API_PATTERN = _setting('SCRAPER_SELENIUM_API_PATTERN', r'/api/items') # 列表数据接口 URL 的正则 (!!! 必须替换 !!!)
+SCRAPER_SELENIUM_ITEMS_PATH = _setting('SCRAPER_SELENIUM_ITEMS_PATH', 'data.items') # JSON 响应中商品列表的路径
+SCRAPER_SELENIUM_FIELD_MAP = _setting('SCRAPER_SELENIUM_FIELD_MAP', { # 输出字段 -> JSON 商品字段
+    'description': 'title', 'actual_price': 'price', 'location': 'location', 'post_date': 'post_time'})
+SCRAPER_SELENIUM_SELECTORS = _setting('SCRAPER_SELENIUM_SELECTORS', { # script 模式: 商品元素及其子元素的 CSS 选择器
+    'item': 'div.product-item', 'description': 'a.product-title', 'actual_price': 'span.product-price',
+    'next': 'button.next'})
+SCRAPER_SELENIUM_WAIT_TIMEOUT = _setting('SCRAPER_SELENIUM_WAIT_TIMEOUT', 15.0) # 等待列表数据出现的最长时间 (秒)
+
+# 确保数据/模型/日志目录存在
+for _directory in (DATA_DIR, MODEL_DIR, LOG_DIR, SCRAPER_OUTPUT_DIR):
     try:
-        service = ChromeService(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=options)
-        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-        print("WebDriver 初始化成功。")
-        return driver
-    except Exception as e:
-        print(f"WebDriver 初始化失败: {e}")
-        return None
-
-# --- 主程序 ---
-if __name__ == "__main__":
-    all_data = []
-    scraped_count = 0
-    current_page = 1
-
-    print(f"--- 开始 Selenium 爬虫 ---")
-    print(f"目标起始 URL: {START_URL}")
-    print(f"目标抓取数量: {MAX_ITEMS_TO_SCRAPE}")
-    print(f"!!! 警告: 需要根据目标网站修改页面交互逻辑 (登录、搜索、滚动、点击下一页) !!!")
-    print(f"!!! 需要根据目标网站修改元素定位器 (CSS 选择器) !!!")
-
-    driver = initialize_driver()
-
-    if driver:
-        try:
-            driver.get(START_URL)
-            print(f"已打开页面: {START_URL}")
-            time.sleep(random.uniform(3, 5)) # 等待初步加载
-
-            # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-            # +++ 在这里添加特定于目标网站的操作:                      +++
-            # +++ 1. 处理登录 (如果需要)                             +++
-            # +++ 2. 输入搜索关键词 (如果起始 URL 不是搜索结果页)        +++
-            # +++ 3. 点击搜索按钮                                     +++
-            # +++ 示例:                                               +++
-            # +++ search_box = driver.find_element(By.ID, 'search-input') +++
-            # +++ search_box.send_keys(SEARCH_KEYWORD)                 +++
-            # +++ search_button = driver.find_element(By.CSS_SELECTOR, 'button.search-btn') +++
-            # +++ search_button.click()                              +++
-            # +++ time.sleep(5) # 等待搜索结果加载                      +++
-            # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-
-            wait = WebDriverWait(driver, 15) # 增加等待时间
-
-            while scraped_count < MAX_ITEMS_TO_SCRAPE:
-                print(f"\n--- 正在处理第 {current_page} 页 (已抓取 {scraped_count}/{MAX_ITEMS_TO_SCRAPE} 项) ---")
-
-                # 尝试向下滚动加载更多内容
-                try:
-                    last_height = driver.execute_script("return document.body.scrollHeight")
-                    for _ in range(3): # 滚动几次
-                        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                        time.sleep(random.uniform(SLEEP_MIN, SLEEP_MAX))
-                        new_height = driver.execute_script("return document.body.scrollHeight")
-                        if new_height == last_height:
-                            # print("滚动到底部，高度未增加。")
-                            break
-                        last_height = new_height
-                except Exception as scroll_e:
-                    print(f"滚动页面时出错: {scroll_e}")
-
-
-                # !!! 定位商品元素 (必须根据实际情况修改!) !!!
-                # 假设商品项是 class="product-item" 的 div
-                item_selector = 'div.product-item' # !!! 必须修改 !!!
-                try:
-                    item_elements = wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, item_selector)))
-                    print(f"在当前页面找到 {len(item_elements)} 个商品元素 (基于选择器 '{item_selector}')")
-                except TimeoutException:
-                    print(f"等待商品元素 ('{item_selector}') 超时，可能页面结构已更改或无更多内容。")
-                    if current_page == 1 and not all_data: # 如果第一页就找不到，很可能是选择器错了
-                         print("错误：请检查商品元素的选择器是否正确！")
-                    break # 停止
-
-                # --- 遍历提取数据 (必须修改!) ---
-                new_items_on_page = 0
-                for element in item_elements:
-                    # 可能需要检查这个元素是否已经被处理过（如果滚动加载导致重复）
-                    if scraped_count >= MAX_ITEMS_TO_SCRAPE: break
-                    try:
-                        data = {}
-                        # !!! 以下是假设的选择器，必须修改 !!!
-                        title_element = element.find_element(By.CSS_SELECTOR, 'a.product-title') # 假设标题
-                        data['description'] = title_element.text.strip() if title_element else 'N/A'
-
-                        price_element = element.find_element(By.CSS_SELECTOR, 'span.product-price') # 假设价格
-                        price_text = price_element.text.strip() if price_element else '0'
-                        data['actual_price'] = ''.join(filter(str.isdigit, price_text.split('.')[0])) or '0'
-
-                        # ... 尝试提取其他信息，同样需要适配选择器 ...
-                        # info_element = element.find_element(By.CSS_SELECTOR, 'div.product-meta')
-                        # data['info'] = info_element.text.strip() if info_element else 'N/A'
-
-                        # 解析配置 (仍然困难，需要具体规则)
-                        # ...
-                        data['ram_size'] = 'Unknown'
-                        data['brand'] = 'Unknown'
-                        # ... 其他字段设为 Unknown ...
-                        for field in ['release_year', 'cpu_score', 'gpu_type', 'storage_type', 'screen_condition', 'battery_health']:
-                             data[field] = 'Unknown'
-
-                        data['scrape_timestamp'] = datetime.now().isoformat()
-
-                        # 简单的去重逻辑 (基于描述和价格)，或者使用更复杂的ID
-                        item_key = (data['description'], data['actual_price'])
-                        # 这里需要一个集合来存储已处理项的键
-                        # if item_key not in processed_keys_set: # 假设有 processed_keys_set
-                        if data['description'] != 'N/A' and data['actual_price'] != '0':
-                             all_data.append(data)
-                             scraped_count += 1
-                             new_items_on_page += 1
-                             # processed_keys_set.add(item_key) # 添加到已处理集合
-
-                    except NoSuchElementException: continue # 元素内缺少子元素，跳过
-                    except Exception as e: print(f"处理单个元素时出错: {e}"); continue
-
-                print(f"本轮找到 {new_items_on_page} 个新项目。")
-                if scraped_count >= MAX_ITEMS_TO_SCRAPE: break # 达到目标数量
-
-                # --- 处理分页 (必须修改!) ---
-                try:
-                    # !!! 假设 "下一页" 按钮的选择器是 'button.next' !!!
-                    next_button_selector = 'button.next' # !!! 必须修改 !!!
-                    next_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, next_button_selector)))
-                    print("找到'下一页'按钮，准备点击...")
-                    # 尝试滚动到按钮可见区域再点击
-                    driver.execute_script("arguments[0].scrollIntoView(true);", next_button)
-                    time.sleep(0.5)
-                    # 使用 JS 点击可能更稳定
-                    driver.execute_script("arguments[0].click();", next_button)
-                    print("已点击'下一页'。")
-                    current_page += 1
-                    time.sleep(random.uniform(SLEEP_MIN + 1, SLEEP_MAX + 1)) # 等待新页面加载
-                except TimeoutException:
-                    print("找不到或无法点击'下一页'按钮 (基于选择器 '{next_button_selector}')，爬取结束。")
-                    break
-                except Exception as e:
-                    print(f"点击下一页 ('{next_button_selector}') 时出错: {e}")
-                    break
-
-        except Exception as e:
-            print(f"爬取主循环中发生错误: {e}")
-            import traceback
-            traceback.print_exc()
-        finally:
-            if driver:
-                driver.quit()
-                print("浏览器已关闭。")
-
-    # --- 保存数据 ---
-    if all_data:
-        print(f"\n爬取结束，总共获得 {len(all_data)} 条有效数据。")
-        print(f"正在将数据保存到 {OUTPUT_CSV_FILE} ...")
-        df = pd.DataFrame(all_data)
-        desired_columns = [ # 定义期望列顺序
-             'description', 'actual_price', #'info',
-             'brand', 'release_year', 'cpu_score', 'gpu_type', 'ram_size',
-             'storage_type', 'screen_condition', 'battery_health',
-             'scrape_timestamp']
-        df_output = pd.DataFrame(columns=desired_columns)
-        for col in desired_columns:
-              df_output[col] = df.get(col)
-
-        try:
-            df_output.to_csv(OUTPUT_CSV_FILE, index=False, encoding='utf-8-sig')
-            print(f"数据成功保存到: {OUTPUT_CSV_FILE}")
-        except Exception as e:
-            print(f"保存 CSV 文件失败: {e}")
-    else:
-        print("没有抓取到有效数据，未生成文件。")
+        Path(_directory).mkdir(parents=True, exist_ok=True)
+    except OSError:
+        pass
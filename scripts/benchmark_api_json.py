@@ -0,0 +1,88 @@
+# scripts/benchmark_api_json.py
+# 比较 API 请求解码 / 响应编码的两种实现 (每个请求的耗时，微秒):
+#   json:    request.json (json.loads) + 解析描述后的 dict 复制合并 + jsonify (改用 src/schema.py 之前的实现)
+#   msgspec: 解码为 PredictRequest Struct 并校验 + 一次性构造字段 dict + msgspec 编码
+# 只测 JSON 处理本身，不包含模型预测；有描述的请求两边都包含 parse_description 的耗时。
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+from flask import Flask, Response, jsonify
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+import config
+from src.utils import parse_description
+from src.schema import decode_request, encode_response
+
+STRUCTURED = {'brand': 'Lenovo', 'release_year': 2020, 'cpu_score': 8000, 'gpu_type': 'Integrated', 'ram_desc': '16GB',
+              'storage_type': 'SSD', 'screen_condition': '良好', 'battery_health': '良好'}
+TEXT = {'description': '自用联想ThinkPad X1 Carbon 2019年购入 i7-8565U 16G内存 512G固态 屏幕完美无划痕 电池健康度良好 配件齐全'}
+PREDICT_RESPONSE = {'predicted_price': 3250, 'price_range_low': 2900, 'price_range_high': 3600, 'price_range_str': '2900-3600元'}
+EXPLAIN_RESPONSE = dict(PREDICT_RESPONSE, explanation={
+    'base_price': 2810.5, 'model_price': 3251.2, 'other_features': 12.3,
+    'contributions': [{'feature': f, 'value': 'Lenovo', 'contribution': 101.25} for f in
+                      ('cpu_score', 'age', 'ram_size', 'brand', 'gpu_type', 'storage_type', 'screen_condition', 'battery_health')],
+    'similar_listings': {'contribution': 80.1, 'knn_price': 3300.0, 'neighbors': [
+        {'brand': 'Lenovo', 'cpu_score': 8100.0, 'ram_size': 16.0, 'age': 5.0, 'description': TEXT['description'],
+         'post_date': '2026-09-01', 'price': 3300.0, 'distance': 0.1234, 'weight': 0.2} for _ in range(5)]},
+}, adjustments={'market_index': 1.0123})
+
+flask_app = Flask(__name__)
+config.PARSE_CACHE_ENABLED = False # 两边都直接解析描述 (不经过 src/parse_cache.py)，只比较 JSON 处理
+
+
+def json_decode(body):
+    """改用 schema 之前的 /predict 请求处理 (request.json + merge_description)"""
+    data = json.loads(body)
+    if 'description' in data and isinstance(data['description'], str):
+        parsed_info = parse_description(data['description'])
+        base_info = data.copy()
+        base_info.update(parsed_info)
+        base_info.update(data)
+        data = base_info
+    return data
+
+
+def json_encode(obj):
+    return jsonify(obj)
+
+
+def msgspec_encode(obj):
+    return Response(encode_response(obj), mimetype='application/json')
+
+
+def time_per_call(func, arg, repeat):
+    func(arg) # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(arg)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API JSON 解码/编码基准测试")
+    parser.add_argument('--repeat', type=int, default=20000)
+    args = parser.parse_args()
+
+    rows = []
+    # decode_request 会打印解析日志，计时时丢弃输出
+    with flask_app.app_context(), contextlib.redirect_stdout(io.StringIO()):
+        for name, payload, response in (('structured', STRUCTURED, PREDICT_RESPONSE), ('text', TEXT, PREDICT_RESPONSE),
+                                        ('explain', STRUCTURED, EXPLAIN_RESPONSE)):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            for path, decode, encode in (('json', json_decode, json_encode), ('msgspec', decode_request, msgspec_encode)):
+                decode_us = time_per_call(decode, body, args.repeat)
+                encode_us = time_per_call(encode, response, args.repeat)
+                rows.append({'payload': name, 'path': path, 'decode_us': decode_us, 'encode_us': encode_us, 'total_us': decode_us + encode_us})
+    results = pd.DataFrame(rows)
+    baseline = results[results['path'] == 'json'].set_index('payload')['total_us']
+    results['speedup'] = baseline.reindex(results['payload']).to_numpy() / results['total_us']
+    print(results.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
@@ -0,0 +1,77 @@
+# scripts/benchmark_feature_engineering.py
+# 比较 dense / compact 两种特征工程模式在大数据量下的内存占用和训练耗时
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.feature_engineering import clean_raw_data, encode_and_scale
+
+
+def make_synthetic_data(n_rows, seed=42):
+    """生成与 raw_data.csv 字段一致的合成数据"""
+    rng = np.random.default_rng(seed)
+    release_year = rng.integers(2010, 2026, n_rows)
+    cpu_score = rng.integers(800, 15000, n_rows)
+    ram = rng.choice([4, 8, 16, 32, 64], n_rows)
+    brand = rng.choice(['Apple', 'Lenovo', 'Dell', 'HP', 'Asus', 'Acer', 'Huawei', 'Xiaomi', 'MSI', 'Other'], n_rows)
+    price = (500 + cpu_score * 0.3 + ram * 40) * 0.88 ** (2026 - release_year) * rng.lognormal(0, 0.15, n_rows)
+    return pd.DataFrame({
+        'brand': brand,
+        'release_year': release_year,
+        'cpu_score': cpu_score,
+        'gpu_type': rng.choice(['Integrated', 'GTX1650', 'RTX3060', 'RTX4060', 'M1', 'M2'], n_rows),
+        'ram_desc': pd.Series(ram).astype(str) + 'GB',
+        'ram_size': ram,
+        'storage_type': rng.choice(['SSD', 'HDD', 'SSD+HDD', 'Unknown'], n_rows),
+        'screen_condition': rng.choice(['完美', '良好', '轻微划痕', '较差'], n_rows),
+        'battery_health': rng.choice(['完美', '良好', '一般', '较差'], n_rows),
+        'actual_price': price.round(),
+    })
+
+
+def run_mode(raw_df, mode, n_estimators):
+    df = raw_df.copy()
+    tracemalloc.start()
+    start = time.perf_counter()
+    X, y, _, _ = encode_and_scale(clean_raw_data(df), mode)
+    fe_seconds = time.perf_counter() - start
+    _, fe_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    params = dict(n_estimators=n_estimators, max_depth=6, learning_rate=0.1, tree_method='hist', n_jobs=-1)
+    if mode == 'compact':
+        params['enable_categorical'] = True
+    start = time.perf_counter()
+    xgb.XGBRegressor(**params).fit(X, y)
+    fit_seconds = time.perf_counter() - start
+
+    return {
+        'mode': mode,
+        'columns': X.shape[1],
+        'X_MB': X.memory_usage(deep=True).sum() / 1024 ** 2,
+        'fe_peak_MB': fe_peak / 1024 ** 2,
+        'fe_s': fe_seconds,
+        'xgb_fit_s': fit_seconds,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="特征工程模式基准测试")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--n-estimators', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"生成 {args.rows} 行合成数据...")
+    raw_df = make_synthetic_data(args.rows)
+    results = pd.DataFrame([run_mode(raw_df, mode, args.n_estimators) for mode in ('dense', 'compact')])
+    print(results.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
@@ -0,0 +1,100 @@
+# scripts/fixture_listing_site.py
+# 本地测试站点: 模拟 "页面通过 XHR 拉取 JSON 再渲染列表" 的二手交易网站，用于调试 scraper_selenium.py
+#   GET /search?page=N     列表页 (HTML + JS，加载后请求 /api/items?page=N 并渲染 div.product-item)
+#   GET /api/items?page=N  JSON: {"data": {"page": N, "has_more": true, "items": [...]}}
+# 用法:
+#   python scripts/fixture_listing_site.py --port 8765 --pages 5 --per-page 50
+#   OCV_SCRAPER_SELENIUM_START_URL=http://127.0.0.1:8765/search python scripts/scraper_selenium.py
+import argparse
+import json
+import random
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+BRANDS = ['Apple', 'Lenovo', 'Dell', 'HP', 'Asus', 'Huawei', 'Xiaomi']
+SERIES = {'Apple': 'MacBook Air M1', 'Lenovo': '小新 Pro 14', 'Dell': 'XPS 13', 'HP': '战66', 'Asus': '天选 4',
+          'Huawei': 'MateBook 14', 'Xiaomi': 'RedmiBook Pro'}
+CONDITIONS = ['99新 无划痕', '95新 轻微使用痕迹', '成色一般 电池健康85%']
+CITIES = ['北京 朝阳区', '上海 浦东新区', '广东 深圳', '浙江 杭州', '四川 成都']
+
+PAGE_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>二手笔记本 第 {page} 页</title></head>
+<body>
+<div id="list"></div>
+<button class="next" {next_disabled} onclick="location.href='/search?page={next_page}'">下一页</button>
+<script>
+fetch('/api/items?page={page}').then(r => r.json()).then(payload => {{
+  const list = document.getElementById('list');
+  for (const item of payload.data.items) {{
+    const div = document.createElement('div');
+    div.className = 'product-item';
+    div.innerHTML = `<a class="product-title" href="/item/${{item.id}}">${{item.title}}</a>` +
+                    `<span class="product-price">¥${{item.price}}.00</span>` +
+                    `<div class="product-meta">${{item.location}} · ${{item.post_time}}</div>`;
+    list.appendChild(div);
+  }}
+}});
+</script>
+</body></html>"""
+
+
+def make_items(page, per_page, seed=0):
+    """按页号确定性地生成商品 (同一页多次请求结果相同)"""
+    rng = random.Random(seed * 100003 + page)
+    items = []
+    for i in range(per_page):
+        brand = rng.choice(BRANDS)
+        ram = rng.choice([8, 16, 32])
+        storage = rng.choice([256, 512, 1024])
+        items.append({
+            'id': page * 10000 + i,
+            'title': f"{brand} {SERIES[brand]} {ram}G内存 {storage}G固态 {rng.choice(CONDITIONS)}",
+            'price': rng.randrange(1500, 9000, 10),
+            'location': rng.choice(CITIES),
+            'post_time': (date(2026, 10, 1) - timedelta(days=rng.randrange(0, 60))).isoformat(),
+        })
+    return items
+
+
+def make_handler(pages, per_page):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, body, content_type):
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            page = int(parse_qs(url.query).get('page', ['1'])[0])
+            if url.path == '/api/items':
+                items = make_items(page, per_page) if 1 <= page <= pages else []
+                self._send(json.dumps({'data': {'page': page, 'has_more': page < pages, 'items': items}}, ensure_ascii=False),
+                           'application/json; charset=utf-8')
+            elif url.path in ('/', '/search'):
+                self._send(PAGE_HTML.format(page=page, next_page=page + 1, next_disabled='' if page < pages else 'disabled'),
+                           'text/html; charset=utf-8')
+            else:
+                self.send_error(404)
+
+        def log_message(self, format, *args):
+            pass # 不打印每个请求
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地 JSON 列表测试站点")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--per-page', type=int, default=50)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.pages, args.per_page))
+    print(f"测试站点已启动: http://127.0.0.1:{args.port}/search ({args.pages} 页 × {args.per_page} 条)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,369 @@
+# scripts/load_test.py
+# 开环压测: 按固定到达率 (与响应快慢无关) 向本地启动的 gunicorn app:app 回放 /predict 请求，
+# 得到各到达率下的延迟分位数、实际吞吐和错误率，用于确定 gunicorn worker 数和比较不同服务模式。
+# - 请求来源: 漂移监控采集的线上流量 (--traffic)、保存的请求 JSONL (--payloads)，或由训练数据合成；
+#   结构化字段与自由文本 description 按 --text-ratio 混合
+# - 延迟从 "计划发送时刻" 开始计算，服务端排队时客户端不会放慢发送 (避免闭环压测的协同遗漏)
+# - 同一次运行中所有 (模式, worker 数, 到达率) 使用相同的请求序列和到达时间，结果可直接对比；
+#   结果保存为 JSON，--compare 可以把多次运行的结果并排打印
+# 用法:
+#   python scripts/load_test.py --workers 1 2 4 --rates 10 20 40 80 --duration 20
+#   python scripts/load_test.py --mode model:PRICE_TABLE_ENABLED=0 --mode table:PRICE_TABLE_ENABLED=1 --workers 2
+#   (PRICE_TABLE_ENABLED=0 时 API 不加载 price_table.npz，两个模式分别测实时模型和查表)
+#   python scripts/load_test.py --compare logs/load_test/a.json logs/load_test/b.json
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+import config # 导入配置文件
+from src.drift_monitor import load_traffic
+
+STRUCTURED_FIELDS = ['brand', 'release_year', 'cpu_score', 'gpu_type', 'ram_desc', 'storage_type', 'screen_condition', 'battery_health']
+PERCENTILES = (50, 90, 99)
+TIMEOUT_STATUS, CONNECTION_ERROR_STATUS, BAD_RESPONSE_STATUS = -1, -2, -3
+
+
+# --- 请求来源 ---
+def _clean_payload(record):
+    return {k: (v.item() if isinstance(v, np.generic) else v) for k, v in record.items() if not pd.isna(v)}
+
+
+def payloads_from_traffic(log_dir):
+    """漂移监控环形缓冲区中的线上请求 (只有结构化字段)"""
+    traffic = load_traffic(log_dir)
+    if traffic.empty:
+        return []
+    traffic['ram_desc'] = traffic['ram_size'].map(lambda v: f"{v:.0f}GB" if np.isfinite(v) else np.nan)
+    traffic.loc[traffic['cpu_score_default'], 'cpu_score'] = np.nan # 原请求没有给出 cpu_score
+    return [_clean_payload(r) for r in traffic[STRUCTURED_FIELDS].to_dict('records')]
+
+
+def payloads_from_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def payloads_from_raw_data(path):
+    """由训练数据合成请求，返回 (结构化请求, 文本请求)；没有 description 列时用字段拼出描述"""
+    df = pd.read_csv(path, low_memory=False)
+    structured = [_clean_payload(r) for r in df.reindex(columns=STRUCTURED_FIELDS).to_dict('records')]
+    if 'description' in df.columns and df['description'].notna().any():
+        texts = df['description'].dropna().astype(str)
+    else:
+        texts = (df['brand'].astype(str) + ' 笔记本 ' + df['ram_desc'].astype(str) + '内存 ' + df['storage_type'].astype(str)
+                 + ' 成色' + df['screen_condition'].astype(str) + ' 电池' + df['battery_health'].astype(str))
+    return structured, [{'description': text} for text in texts]
+
+
+def build_payload_mix(structured, texts, n, text_ratio, seed):
+    """按比例抽取 n 个请求 (同一 seed 得到相同的序列)"""
+    rng = np.random.default_rng(seed)
+    use_text = rng.random(n) < text_ratio if texts else np.zeros(n, dtype=bool)
+    if not structured:
+        use_text[:] = True
+    picks = []
+    for is_text in use_text:
+        pool = texts if is_text else structured
+        picks.append(pool[rng.integers(len(pool))])
+    return picks, float(use_text.mean())
+
+
+def encode_request(payload, host):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    head = (f"POST /predict HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode('ascii')
+    return head + body
+
+
+def arrival_offsets(rate, duration, arrival, seed):
+    """每个请求相对开始时刻的计划发送时间 (秒)"""
+    n = int(rate * duration)
+    uniform = np.arange(n) / rate
+    if arrival != 'poisson' or n < 2:
+        return uniform
+    # 泊松到达: 指数分布的间隔，再整体缩放到与均匀到达相同的时间跨度，使实际到达率恰好等于 rate
+    offsets = np.cumsum(np.random.default_rng(seed).exponential(1.0 / rate, n))
+    offsets -= offsets[0]
+    return offsets * (uniform[-1] / offsets[-1])
+
+
+# --- 开环客户端 ---
+async def _send(host, port, request_bytes):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(request_bytes)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read() # Connection: close，读到 EOF 即响应结束
+        try:
+            return int(status_line.split()[1])
+        except (IndexError, ValueError):
+            return BAD_RESPONSE_STATUS # 服务端没有返回状态行就关闭了连接
+    finally:
+        writer.close()
+
+
+async def run_open_loop(host, port, requests, offsets, timeout):
+    """按 offsets 发送请求，返回 (延迟秒数, 状态码, 发送滞后秒数)；超时/连接失败/无效响应的状态码为负数"""
+    n = len(offsets)
+    latency, lag = np.full(n, np.nan), np.zeros(n)
+    status = np.zeros(n, dtype=np.int64)
+    loop = asyncio.get_running_loop()
+    start = loop.time() + 0.1
+
+    async def one(i, scheduled):
+        lag[i] = loop.time() - scheduled
+        try:
+            status[i] = await asyncio.wait_for(_send(host, port, requests[i % len(requests)]), timeout)
+        except asyncio.TimeoutError:
+            status[i] = TIMEOUT_STATUS
+        except OSError:
+            status[i] = CONNECTION_ERROR_STATUS
+        latency[i] = loop.time() - scheduled
+
+    tasks = []
+    for i, offset in enumerate(offsets):
+        delay = start + offset - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(i, start + offset)))
+    await asyncio.gather(*tasks)
+    return latency, status, lag
+
+
+def summarize(latency, status, lag, offsets, rate, warmup):
+    """预热期之后发出的请求的延迟分位数 (只统计成功的请求)、实际吞吐和错误率"""
+    measured = offsets >= warmup
+    latency, status, lag = latency[measured], status[measured], lag[measured]
+    offsets = offsets[measured]
+    ok = (status >= 200) & (status < 300)
+    # 实际吞吐 = 成功数 / (预热结束 → 最后一个成功响应的时刻)，服务端排队时低于到达率
+    window = max(float((offsets + latency)[ok].max() - warmup), 1e-9) if ok.any() else 1.0
+    ok_ms = latency[ok] * 1000
+    result = {
+        'offered_rps': rate,
+        'achieved_rps': float(ok.sum() / window),
+        'requests': int(measured.sum()),
+        'error_rate': float(1 - ok.mean()) if measured.any() else 0.0,
+        'timeouts': int((status == TIMEOUT_STATUS).sum()),
+        'connection_errors': int((status == CONNECTION_ERROR_STATUS).sum()),
+        'bad_responses': int((status == BAD_RESPONSE_STATUS).sum()),
+        'http_errors': int(((status >= 300) | ((status > 0) & (status < 200))).sum()),
+        'client_lag_p99_ms': float(np.percentile(lag, 99) * 1000) if len(lag) else 0.0,
+    }
+    for p in PERCENTILES:
+        result[f'p{p}_ms'] = float(np.percentile(ok_ms, p)) if len(ok_ms) else float('nan')
+    result['max_ms'] = float(ok_ms.max()) if len(ok_ms) else float('nan')
+    return result
+
+
+# --- 本地 gunicorn 进程 ---
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(host, port, proc, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn 已退出 (返回码 {proc.returncode})")
+        try:
+            with socket.create_connection((host, port), timeout=1) as s:
+                s.sendall(f"GET / HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode('ascii'))
+                if s.recv(64).startswith(b'HTTP/1.1 200'):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"gunicorn 在 {timeout} 秒内未就绪")
+
+
+def start_server(workers, overrides, gunicorn_args, log_path, startup_timeout):
+    """启动 gunicorn app:app，overrides 为 {配置名: 值} (通过 OCV_ 环境变量传入)"""
+    port = _free_port()
+    env = dict(os.environ, **{config.ENV_PREFIX + name: value for name, value in overrides.items()})
+    cmd = [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+           '--backlog', '2048', *shlex.split(gunicorn_args), 'app:app']
+    with open(log_path, 'ab') as log: # 子进程持有自己的文件描述符，启动后即可关闭
+        proc = subprocess.Popen(cmd, cwd=project_root, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    try:
+        _wait_ready('127.0.0.1', port, proc, startup_timeout)
+    except RuntimeError:
+        stop_server(proc)
+        raise
+    return proc, port
+
+
+def stop_server(proc):
+    if proc.poll() is None:
+        proc.send_signal(signal.SIGTERM) # gunicorn 收到 SIGTERM 后平滑退出
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+
+
+def parse_mode(text):
+    """'名称:KEY=VAL,KEY=VAL' → (名称, {KEY: VAL})；只写名称表示默认配置"""
+    name, _, assignments = text.partition(':')
+    overrides = dict(item.split('=', 1) for item in assignments.split(',') if item)
+    return name, overrides
+
+
+# --- 结果输出 ---
+def print_results(results):
+    df = pd.DataFrame(results)
+    columns = ['mode', 'workers', 'offered_rps', 'achieved_rps', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'error_rate', 'client_lag_p99_ms']
+    if 'run' in df.columns and df['run'].nunique() > 1:
+        columns.insert(0, 'run')
+    print(df[columns].to_string(index=False, float_format=lambda v: f"{v:.1f}" if abs(v) >= 1 else f"{v:.3f}"))
+    # 到达率 × (模式, worker 数) 的 p99 宽表，便于比较
+    keys = [c for c in ('run', 'mode', 'workers') if c in columns]
+    print("\np99 (ms)，行: 到达率 (请求/秒)，列: " + ' / '.join(keys))
+    print(df.pivot_table(index='offered_rps', columns=keys, values='p99_ms').to_string(float_format=lambda v: f"{v:.1f}"))
+
+
+def save_plot(results, path):
+    """p99 延迟-吞吐曲线 (matplotlib 为可选依赖，未安装时跳过)"""
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("未安装 matplotlib，跳过绘图。")
+        return
+    df = pd.DataFrame(results)
+    fig, ax = plt.subplots(figsize=(8, 5))
+    for (mode, workers), group in df.groupby(['mode', 'workers']):
+        ax.plot(group['achieved_rps'], group['p99_ms'], marker='o', label=f"{mode} ×{workers}")
+    ax.set_xlabel('achieved throughput (req/s)')
+    ax.set_ylabel('p99 latency (ms)')
+    ax.set_yscale('log')
+    ax.legend()
+    fig.savefig(path, dpi=120, bbox_inches='tight')
+    print(f"延迟-吞吐曲线已保存到 {path}")
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=project_root, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="/predict 开环压测")
+    parser.add_argument('--mode', action='append', default=None,
+                        help="服务模式 '名称:配置名=值,...' (配置名同 config.py，可重复；默认只测当前配置)")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1])
+    parser.add_argument('--rates', type=float, nargs='+', default=[5, 10, 20, 40], help="到达率 (请求/秒)，从低到高")
+    parser.add_argument('--duration', type=float, default=20.0, help="每个到达率的持续时间 (秒)")
+    parser.add_argument('--warmup', type=float, default=2.0, help="不计入统计的开头时间 (秒)")
+    parser.add_argument('--arrival', choices=['uniform', 'poisson'], default='poisson')
+    parser.add_argument('--timeout', type=float, default=5.0, help="单个请求的超时 (秒)，超时计为错误")
+    parser.add_argument('--max-error-rate', type=float, default=0.2, help="错误率超过此值后不再测试更高的到达率")
+    parser.add_argument('--text-ratio', type=float, default=0.3, help="自由文本 description 请求的比例")
+    parser.add_argument('--traffic', help="从漂移监控的采样目录回放线上请求 (如 logs/traffic)")
+    parser.add_argument('--payloads', help="请求 JSONL 文件 (每行一个 /predict 的 JSON body)")
+    parser.add_argument('--raw-data', default=str(config.RAW_DATA_PATH), help="合成请求用的训练数据")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--url', help="压测已启动的服务 (如 http://127.0.0.1:5000)，此时忽略 --mode/--workers")
+    parser.add_argument('--gunicorn-args', default='', help="额外的 gunicorn 参数，如 '--preload --threads 4'")
+    parser.add_argument('--startup-timeout', type=float, default=120.0)
+    parser.add_argument('--output', help="结果 JSON 路径 (默认 logs/load_test/load_test_<时间>.json)")
+    parser.add_argument('--compare', nargs='+', help="并排打印多次运行的结果 JSON")
+    args = parser.parse_args()
+
+    if args.compare:
+        merged = []
+        for path in args.compare:
+            with open(path, encoding='utf-8') as f:
+                run = json.load(f)
+            merged += [dict(r, run=Path(path).stem) for r in run['results']]
+        print_results(merged)
+        sys.exit(0)
+
+    # 请求序列: 结构化请求和文本请求按比例混合
+    if args.payloads:
+        loaded = payloads_from_jsonl(args.payloads)
+        structured, texts = [p for p in loaded if 'description' not in p], [p for p in loaded if 'description' in p]
+        source = args.payloads
+    elif args.traffic:
+        structured, texts = payloads_from_traffic(args.traffic), payloads_from_raw_data(args.raw_data)[1]
+        source = f"{args.traffic} + {args.raw_data} (文本)"
+    else:
+        structured, texts = payloads_from_raw_data(args.raw_data)
+        source = args.raw_data
+    n_requests = int(max(args.rates) * args.duration)
+    payloads, text_share = build_payload_mix(structured, texts, n_requests, args.text_ratio, args.seed)
+    print(f"请求来源: {source}，结构化 {len(structured)} 条 / 文本 {len(texts)} 条，抽取 {n_requests} 个 (文本占 {text_share:.0%})")
+
+    output = Path(args.output) if args.output else Path(config.LOG_DIR) / 'load_test' / f"load_test_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    server_log = output.with_suffix('.server.log')
+    if args.url:
+        target = args.url.split('://', 1)[-1].rstrip('/')
+        host, _, port = target.partition(':')
+        port = port or 80
+        plans = [('external', None, {})]
+    else:
+        modes = [parse_mode(m) for m in args.mode] if args.mode else [('default', {})]
+        plans = [(name, workers, overrides) for name, overrides in modes for workers in args.workers]
+
+    results = []
+    for mode, workers, overrides in plans:
+        proc = None
+        if workers is not None:
+            print(f"\n启动 gunicorn: 模式 {mode} {overrides or ''}，{workers} 个 worker ...")
+            proc, port = start_server(workers, overrides, args.gunicorn_args, server_log, args.startup_timeout)
+            host = '127.0.0.1'
+        requests = [encode_request(p, host) for p in payloads]
+        try:
+            asyncio.run(run_open_loop(host, int(port), requests, np.zeros(min(20, len(requests))), args.timeout)) # 预热: 各 worker 的首次预测
+            for step, rate in enumerate(sorted(args.rates)):
+                offsets = arrival_offsets(rate, args.duration, args.arrival, args.seed + step)
+                latency, status, lag = asyncio.run(run_open_loop(host, int(port), requests, offsets, args.timeout))
+                result = dict(mode=mode, workers=workers, overrides=overrides,
+                              **summarize(latency, status, lag, offsets, rate, args.warmup))
+                results.append(result)
+                print(f"  {rate:>7.1f} 请求/秒: 实际 {result['achieved_rps']:.1f}/秒，p50 {result['p50_ms']:.1f} ms，"
+                      f"p99 {result['p99_ms']:.1f} ms，错误率 {result['error_rate']:.1%}")
+                if result['error_rate'] > args.max_error_rate:
+                    print(f"  错误率超过 {args.max_error_rate:.0%}，已饱和，跳过更高的到达率。")
+                    break
+        finally:
+            if proc is not None:
+                stop_server(proc)
+
+    meta = {
+        'started': datetime.now().isoformat(timespec='seconds'), 'git_revision': git_revision(), 'argv': sys.argv[1:],
+        'cpu_count': os.cpu_count(), 'python': platform.python_version(), 'payload_source': source,
+        'text_share': text_share, 'arrival': args.arrival, 'duration': args.duration, 'warmup': args.warmup, 'seed': args.seed,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=1)
+    print(f"\n结果已保存到 {output} (服务端日志: {server_log})\n")
+    print_results(results)
+    save_plot(results, output.with_suffix('.png'))
+    if any(r['client_lag_p99_ms'] > 50 for r in results):
+        print("警告: 客户端发送滞后 p99 超过 50 ms，压测客户端本身可能已饱和 (与服务端在同一台机器上争抢 CPU)。")
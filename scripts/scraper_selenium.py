@@ -4,9 +4,8 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service as ChromeService
 from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+import base64
+import json
 import time
 import random
 import pandas as pd
@@ -29,6 +28,12 @@ try:
     USER_AGENT = config.SCRAPER_USER_AGENT
     SLEEP_MIN = config.SCRAPER_SLEEP_MIN
     SLEEP_MAX = config.SCRAPER_SLEEP_MAX
+    CAPTURE_MODE = config.SCRAPER_SELENIUM_CAPTURE_MODE
+    API_PATTERN = config.SCRAPER_SELENIUM_API_PATTERN
+    ITEMS_PATH = config.SCRAPER_SELENIUM_ITEMS_PATH
+    FIELD_MAP = config.SCRAPER_SELENIUM_FIELD_MAP
+    SELECTORS = config.SCRAPER_SELENIUM_SELECTORS
+    WAIT_TIMEOUT = config.SCRAPER_SELENIUM_WAIT_TIMEOUT
 except ImportError:
     print("警告: 未找到或无法导入 config.py。将使用脚本内定义的默认值。")
     # --- 如果没有 config.py ---
@@ -39,6 +44,12 @@ except ImportError:
     USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     SLEEP_MIN = 2.0
     SLEEP_MAX = 5.0
+    CAPTURE_MODE = 'network'
+    API_PATTERN = r'/api/items' # !!! 必须替换 !!!
+    ITEMS_PATH = 'data.items'
+    FIELD_MAP = {'description': 'title', 'actual_price': 'price', 'location': 'location', 'post_date': 'post_time'}
+    SELECTORS = {'item': 'div.product-item', 'description': 'a.product-title', 'actual_price': 'span.product-price', 'next': 'button.next'}
+    WAIT_TIMEOUT = 15.0
     OUTPUT_CSV_FILE.parent.mkdir(parents=True, exist_ok=True)
 
 # --- WebDriver 初始化 ---
@@ -54,6 +65,8 @@ def initialize_driver():
     options.add_experimental_option('useAutomationExtension', False)
     # 添加更多反检测选项 (可选)
     options.add_argument("--disable-blink-features=AutomationControlled")
+    # 打开 performance 日志，network 模式从中读取 XHR 响应 (Network.* 事件)
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
 
     try:
         service = ChromeService(ChromeDriverManager().install())
@@ -65,145 +78,207 @@ def initialize_driver():
         print(f"WebDriver 初始化失败: {e}")
         return None
 
+# --- 数据提取 ---
+# 旧实现对每个商品元素调用 find_element 取标题和价格，每次调用都是一次 WebDriver 往返，
+# 一页 50 个商品需要 100+ 次 IPC。现在每页的提取只需要一到几次往返:
+#   network 模式: 页面本身通过 XHR 拉取 JSON 列表，从 Chrome performance 日志中找到这些响应，
+#                 再用 CDP Network.getResponseBody 直接取回 JSON (字段完整，无需解析 DOM 文本)
+#   script 模式:  一次 execute_script 在浏览器内遍历所有商品元素，以一个 JSON 数组返回
+EXTRACT_ITEMS_JS = """
+const [itemSelector, fields] = arguments;
+const items = Array.from(document.querySelectorAll(itemSelector), element => {
+    const row = {};
+    for (const [name, selector] of Object.entries(fields)) {
+        const node = element.querySelector(selector);
+        row[name] = node ? node.textContent.trim() : null;
+    }
+    return row;
+});
+// 翻页后旧页面可能还没被替换: 第一个商品与上次提取的相同时返回 null，由调用方继续等待
+const signature = items.length ? JSON.stringify(items[0]) : null;
+if (signature === null || signature === window.__lastScrapedSignature) return null;
+window.__lastScrapedSignature = signature;
+return JSON.stringify(items);
+"""
+
+
+class NetworkCapture:
+    """从 performance 日志中收集匹配 API_PATTERN 的 JSON 响应
+
+    日志每次读取后即被清空；响应头 (responseReceived) 和加载完成 (loadingFinished) 可能分属两次读取，
+    所以未完成的请求保存在 pending 中，加载完成后再取响应体。
+    """
+
+    def __init__(self, driver, url_pattern):
+        self.driver = driver
+        self.url_pattern = re.compile(url_pattern)
+        self.pending = {} # requestId -> url
+        self.finished = set()
+
+    def poll(self):
+        """读取新的日志事件，返回已加载完成的 JSON 响应体列表"""
+        for entry in self.driver.get_log('performance'):
+            message = json.loads(entry['message'])['message']
+            method, params = message.get('method'), message.get('params', {})
+            if method == 'Network.responseReceived':
+                response = params.get('response', {})
+                if self.url_pattern.search(response.get('url', '')) and 'json' in response.get('mimeType', ''):
+                    self.pending[params['requestId']] = response['url']
+            elif method == 'Network.loadingFinished':
+                self.finished.add(params.get('requestId'))
+
+        payloads = []
+        for request_id in [r for r in self.pending if r in self.finished]:
+            url = self.pending.pop(request_id)
+            self.finished.discard(request_id)
+            try:
+                body = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+                text = base64.b64decode(body['body']).decode('utf-8') if body.get('base64Encoded') else body['body']
+                payloads.append(json.loads(text))
+            except Exception as e:
+                print(f"读取响应体失败 ({url}): {e}")
+        self.finished &= set(self.pending) # 只保留仍在等待的请求，避免集合无限增长
+        return payloads
+
+
+def items_from_payload(payload, path):
+    """按点分路径 (如 'data.items') 取出 JSON 中的商品列表"""
+    for key in path.split('.') if path else []:
+        payload = payload.get(key, []) if isinstance(payload, dict) else []
+    return payload if isinstance(payload, list) else []
+
+
+def parse_price(value):
+    if isinstance(value, (int, float)):
+        return str(int(value))
+    text = str(value or '').strip()
+    return ''.join(filter(str.isdigit, text.split('.')[0])) or '0'
+
+
+def normalize_item(raw, field_map):
+    """把 JSON 商品或 DOM 提取结果映射为输出字段，缺失的字段设为 Unknown"""
+    data = {field: raw.get(source) for field, source in field_map.items()}
+    data['description'] = (data.get('description') or 'N/A').strip()
+    data['actual_price'] = parse_price(data.get('actual_price'))
+    for field in ['brand', 'release_year', 'cpu_score', 'gpu_type', 'ram_size', 'storage_type', 'screen_condition', 'battery_health']:
+        if not data.get(field):
+            data[field] = 'Unknown'
+    data['scrape_timestamp'] = datetime.now().isoformat()
+    return data
+
+
+def extract_items_script(driver, selectors):
+    """script 模式: 一次 execute_script 提取当前页面的所有商品"""
+    fields = {name: selector for name, selector in selectors.items() if name not in ('item', 'next')}
+    rows = json.loads(driver.execute_script(EXTRACT_ITEMS_JS, selectors['item'], fields) or '[]')
+    return [normalize_item(row, {name: name for name in fields}) for row in rows]
+
+
+def wait_for_items(driver, capture, timeout):
+    """等待当前页的列表数据出现 (轮询间隔 0.1 秒，而不是固定 sleep)，返回本页的商品 (已标准化)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if capture is not None:
+            items = [normalize_item(item, FIELD_MAP) for payload in capture.poll() for item in items_from_payload(payload, ITEMS_PATH)]
+        else:
+            items = extract_items_script(driver, SELECTORS)
+        if items:
+            return items
+        time.sleep(0.1)
+    return []
+
+
+def go_to_next_page(driver):
+    """点击 "下一页" (一次 execute_script 完成查找、可用性检查和点击)，没有可用按钮时返回 False"""
+    return driver.execute_script("""
+        const button = document.querySelector(arguments[0]);
+        if (!button || button.disabled) return false;
+        button.scrollIntoView(true);
+        button.click();
+        return true;
+    """, SELECTORS['next'])
+
+
+def scrape(driver, start_url, max_items, capture_mode):
+    """打开起始页并逐页提取商品，直到达到 max_items 或没有下一页，返回去重后的商品列表 (出错时返回已抓取的部分)"""
+    all_data = []
+    processed_keys = set() # 已抓取商品的 (描述, 价格)，避免滚动加载或重复响应导致的重复
+    current_page = 1
+    try:
+        capture = NetworkCapture(driver, API_PATTERN) if capture_mode == 'network' else None
+        driver.get(start_url)
+        print(f"已打开页面: {start_url}")
+
+        # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+        # +++ 在这里添加特定于目标网站的操作:                      +++
+        # +++ 1. 处理登录 (如果需要)                             +++
+        # +++ 2. 输入搜索关键词 (如果起始 URL 不是搜索结果页)        +++
+        # +++ 3. 点击搜索按钮                                     +++
+        # +++ 示例:                                               +++
+        # +++ search_box = driver.find_element(By.ID, 'search-input') +++
+        # +++ search_box.send_keys(SEARCH_KEYWORD)                 +++
+        # +++ search_button = driver.find_element(By.CSS_SELECTOR, 'button.search-btn') +++
+        # +++ search_button.click()                              +++
+        # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+        while len(all_data) < max_items:
+            print(f"\n--- 正在处理第 {current_page} 页 (已抓取 {len(all_data)}/{max_items} 项) ---")
+            start = time.perf_counter()
+            items = wait_for_items(driver, capture, WAIT_TIMEOUT)
+            if not items and capture is not None:
+                # 没有捕获到匹配的接口响应 (接口正则不对或数据内嵌在 HTML 中)，退回 DOM 提取
+                print(f"未捕获到匹配 '{API_PATTERN}' 的 JSON 响应，改用 script 模式提取。")
+                capture = None
+                items = wait_for_items(driver, None, 1.0)
+            print(f"本页提取 {len(items)} 个商品，耗时 {(time.perf_counter() - start) * 1000:.0f} ms")
+            if not items:
+                if current_page == 1:
+                    print("错误：第一页没有提取到商品，请检查接口 URL/字段映射或 CSS 选择器是否正确！")
+                break
+
+            new_items_on_page = 0
+            for data in items:
+                if len(all_data) >= max_items: break
+                item_key = (data['description'], data['actual_price'])
+                if data['description'] != 'N/A' and data['actual_price'] != '0' and item_key not in processed_keys:
+                    all_data.append(data)
+                    processed_keys.add(item_key)
+                    new_items_on_page += 1
+            print(f"本页新增 {new_items_on_page} 个项目。")
+            if len(all_data) >= max_items: break # 达到目标数量
+
+            # --- 处理分页 (必须根据目标网站修改 SELECTORS['next']) ---
+            time.sleep(random.uniform(SLEEP_MIN, SLEEP_MAX)) # 控制访问频率，避免被封
+            if not go_to_next_page(driver):
+                print(f"找不到或无法点击'下一页'按钮 (选择器 '{SELECTORS['next']}')，爬取结束。")
+                break
+            current_page += 1
+
+    except Exception as e:
+        print(f"爬取主循环中发生错误: {e}")
+        import traceback
+        traceback.print_exc()
+    return all_data
+
+
 # --- 主程序 ---
 if __name__ == "__main__":
     all_data = []
-    scraped_count = 0
-    current_page = 1
 
     print(f"--- 开始 Selenium 爬虫 ---")
     print(f"目标起始 URL: {START_URL}")
     print(f"目标抓取数量: {MAX_ITEMS_TO_SCRAPE}")
-    print(f"!!! 警告: 需要根据目标网站修改页面交互逻辑 (登录、搜索、滚动、点击下一页) !!!")
-    print(f"!!! 需要根据目标网站修改元素定位器 (CSS 选择器) !!!")
+    print(f"提取模式: {CAPTURE_MODE}" + (f" (接口: {API_PATTERN})" if CAPTURE_MODE == 'network' else f" (选择器: {SELECTORS})"))
+    print(f"!!! 警告: 需要根据目标网站修改页面交互逻辑 (登录、搜索、翻页) 以及接口 URL / 字段映射或 CSS 选择器 !!!")
 
     driver = initialize_driver()
 
     if driver:
         try:
-            driver.get(START_URL)
-            print(f"已打开页面: {START_URL}")
-            time.sleep(random.uniform(3, 5)) # 等待初步加载
-
-            # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-            # +++ 在这里添加特定于目标网站的操作:                      +++
-            # +++ 1. 处理登录 (如果需要)                             +++
-            # +++ 2. 输入搜索关键词 (如果起始 URL 不是搜索结果页)        +++
-            # +++ 3. 点击搜索按钮                                     +++
-            # +++ 示例:                                               +++
-            # +++ search_box = driver.find_element(By.ID, 'search-input') +++
-            # +++ search_box.send_keys(SEARCH_KEYWORD)                 +++
-            # +++ search_button = driver.find_element(By.CSS_SELECTOR, 'button.search-btn') +++
-            # +++ search_button.click()                              +++
-            # +++ time.sleep(5) # 等待搜索结果加载                      +++
-            # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-
-            wait = WebDriverWait(driver, 15) # 增加等待时间
-
-            while scraped_count < MAX_ITEMS_TO_SCRAPE:
-                print(f"\n--- 正在处理第 {current_page} 页 (已抓取 {scraped_count}/{MAX_ITEMS_TO_SCRAPE} 项) ---")
-
-                # 尝试向下滚动加载更多内容
-                try:
-                    last_height = driver.execute_script("return document.body.scrollHeight")
-                    for _ in range(3): # 滚动几次
-                        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                        time.sleep(random.uniform(SLEEP_MIN, SLEEP_MAX))
-                        new_height = driver.execute_script("return document.body.scrollHeight")
-                        if new_height == last_height:
-                            # print("滚动到底部，高度未增加。")
-                            break
-                        last_height = new_height
-                except Exception as scroll_e:
-                    print(f"滚动页面时出错: {scroll_e}")
-
-
-                # !!! 定位商品元素 (必须根据实际情况修改!) !!!
-                # 假设商品项是 class="product-item" 的 div
-                item_selector = 'div.product-item' # !!! 必须修改 !!!
-                try:
-                    item_elements = wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, item_selector)))
-                    print(f"在当前页面找到 {len(item_elements)} 个商品元素 (基于选择器 '{item_selector}')")
-                except TimeoutException:
-                    print(f"等待商品元素 ('{item_selector}') 超时，可能页面结构已更改或无更多内容。")
-                    if current_page == 1 and not all_data: # 如果第一页就找不到，很可能是选择器错了
-                         print("错误：请检查商品元素的选择器是否正确！")
-                    break # 停止
-
-                # --- 遍历提取数据 (必须修改!) ---
-                new_items_on_page = 0
-                for element in item_elements:
-                    # 可能需要检查这个元素是否已经被处理过（如果滚动加载导致重复）
-                    if scraped_count >= MAX_ITEMS_TO_SCRAPE: break
-                    try:
-                        data = {}
-                        # !!! 以下是假设的选择器，必须修改 !!!
-                        title_element = element.find_element(By.CSS_SELECTOR, 'a.product-title') # 假设标题
-                        data['description'] = title_element.text.strip() if title_element else 'N/A'
-
-                        price_element = element.find_element(By.CSS_SELECTOR, 'span.product-price') # 假设价格
-                        price_text = price_element.text.strip() if price_element else '0'
-                        data['actual_price'] = ''.join(filter(str.isdigit, price_text.split('.')[0])) or '0'
-
-                        # ... 尝试提取其他信息，同样需要适配选择器 ...
-                        # info_element = element.find_element(By.CSS_SELECTOR, 'div.product-meta')
-                        # data['info'] = info_element.text.strip() if info_element else 'N/A'
-
-                        # 解析配置 (仍然困难，需要具体规则)
-                        # ...
-                        data['ram_size'] = 'Unknown'
-                        data['brand'] = 'Unknown'
-                        # ... 其他字段设为 Unknown ...
-                        for field in ['release_year', 'cpu_score', 'gpu_type', 'storage_type', 'screen_condition', 'battery_health']:
-                             data[field] = 'Unknown'
-
-                        data['scrape_timestamp'] = datetime.now().isoformat()
-
-                        # 简单的去重逻辑 (基于描述和价格)，或者使用更复杂的ID
-                        item_key = (data['description'], data['actual_price'])
-                        # 这里需要一个集合来存储已处理项的键
-                        # if item_key not in processed_keys_set: # 假设有 processed_keys_set
-                        if data['description'] != 'N/A' and data['actual_price'] != '0':
-                             all_data.append(data)
-                             scraped_count += 1
-                             new_items_on_page += 1
-                             # processed_keys_set.add(item_key) # 添加到已处理集合
-
-                    except NoSuchElementException: continue # 元素内缺少子元素，跳过
-                    except Exception as e: print(f"处理单个元素时出错: {e}"); continue
-
-                print(f"本轮找到 {new_items_on_page} 个新项目。")
-                if scraped_count >= MAX_ITEMS_TO_SCRAPE: break # 达到目标数量
-
-                # --- 处理分页 (必须修改!) ---
-                try:
-                    # !!! 假设 "下一页" 按钮的选择器是 'button.next' !!!
-                    next_button_selector = 'button.next' # !!! 必须修改 !!!
-                    next_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, next_button_selector)))
-                    print("找到'下一页'按钮，准备点击...")
-                    # 尝试滚动到按钮可见区域再点击
-                    driver.execute_script("arguments[0].scrollIntoView(true);", next_button)
-                    time.sleep(0.5)
-                    # 使用 JS 点击可能更稳定
-                    driver.execute_script("arguments[0].click();", next_button)
-                    print("已点击'下一页'。")
-                    current_page += 1
-                    time.sleep(random.uniform(SLEEP_MIN + 1, SLEEP_MAX + 1)) # 等待新页面加载
-                except TimeoutException:
-                    print("找不到或无法点击'下一页'按钮 (基于选择器 '{next_button_selector}')，爬取结束。")
-                    break
-                except Exception as e:
-                    print(f"点击下一页 ('{next_button_selector}') 时出错: {e}")
-                    break
-
-        except Exception as e:
-            print(f"爬取主循环中发生错误: {e}")
-            import traceback
-            traceback.print_exc()
+            all_data = scrape(driver, START_URL, MAX_ITEMS_TO_SCRAPE, CAPTURE_MODE)
         finally:
-            if driver:
-                driver.quit()
-                print("浏览器已关闭。")
+            driver.quit()
+            print("浏览器已关闭。")
 
     # --- 保存数据 ---
     if all_data:
@@ -211,10 +286,10 @@ if __name__ == "__main__":
         print(f"正在将数据保存到 {OUTPUT_CSV_FILE} ...")
         df = pd.DataFrame(all_data)
         desired_columns = [ # 定义期望列顺序
-             'description', 'actual_price', #'info',
+             'description', 'actual_price',
              'brand', 'release_year', 'cpu_score', 'gpu_type', 'ram_size',
              'storage_type', 'screen_condition', 'battery_health',
-             'scrape_timestamp']
+             'post_date', 'location', 'scrape_timestamp']
         df_output = pd.DataFrame(columns=desired_columns)
         for col in desired_columns:
               df_output[col] = df.get(col)
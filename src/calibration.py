@@ -0,0 +1,276 @@
+# src/calibration.py
+import numpy as np
+import pandas as pd
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+import config # 导入配置文件
+from src.utils import parse_ram # 导入辅助函数
+from src.ensemble import TIER_BINS, TIER_LABELS, DEFAULT_CPU_SCORE, DEFAULT_AGE
+
+# 规则文件格式 (JSON 列表)，例如:
+# [
+#   {"id": "x1-battery", "brand": "Lenovo", "description_regex": "X1", "battery_health": "较差", "factor": 0.92},
+#   {"id": "apple-m", "brand": "Apple", "description_regex": "M[1-4]", "factor": 1.05,
+#    "valid_from": "2026-10-01", "valid_until": "2026-10-31", "note": "本月苹果 M 系列上调"}
+# ]
+# - 类别字段 (brand/performance_tier/gpu_type/storage_type/screen_condition/battery_health) 取值相等匹配，可写列表
+# - ram_size/cpu_score/release_year 可写 [最小值, 最大值] 区间 (闭区间，null 表示不限)
+# - description_regex 对描述文本做不区分大小写的正则匹配
+# - 同时命中的多条规则系数相乘
+CATEGORY_FIELDS = ('brand', 'performance_tier', 'gpu_type', 'storage_type', 'screen_condition', 'battery_health')
+RANGE_FIELDS = ('ram_size', 'cpu_score', 'release_year')
+WILDCARD = '*'
+TIER_EDGES = TIER_BINS[1:-1] # 内部分界点，bisect 查找性能等级
+
+audit_logger = logging.getLogger('calibration.audit')
+
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def compile_rule(raw):
+    """校验并预处理单条规则 (正则预编译、类别取值转为集合)"""
+    if 'factor' not in raw or 'id' not in raw:
+        raise ValueError(f"规则缺少 id 或 factor: {raw}")
+    rule = {
+        'id': str(raw['id']),
+        'factor': float(raw['factor']),
+        'categories': {f: {str(v) for v in _as_list(raw[f])} for f in CATEGORY_FIELDS if f in raw},
+        'ranges': {f: (raw[f][0], raw[f][1]) for f in RANGE_FIELDS if f in raw},
+        'regex': re.compile(raw['description_regex'], re.IGNORECASE) if raw.get('description_regex') else None,
+        'valid_from': raw.get('valid_from'),
+        'valid_until': raw.get('valid_until'),
+    }
+    for field in RANGE_FIELDS:
+        if field in raw and len(raw[field]) != 2:
+            raise ValueError(f"规则 {rule['id']} 的 {field} 必须是 [最小值, 最大值]")
+    return rule
+
+
+def build_rule_index(rules):
+    """按 (brand, performance_tier) 建立索引，未限定的字段用通配符 '*'"""
+    index = {}
+    for rule in rules:
+        brands = rule['categories'].get('brand', {WILDCARD})
+        tiers = rule['categories'].get('performance_tier', {WILDCARD})
+        for brand in brands:
+            for tier in tiers:
+                index.setdefault((brand, tier), []).append(rule)
+    return index
+
+
+def _in_range(value, bounds):
+    low, high = bounds
+    return value is not None and (low is None or value >= low) and (high is None or value <= high)
+
+
+def _rule_active(rule, today):
+    return (rule['valid_from'] is None or today >= rule['valid_from']) and \
+           (rule['valid_until'] is None or today <= rule['valid_until'])
+
+
+def rule_matches(rule, fields, today):
+    if not _rule_active(rule, today):
+        return False
+    for field, allowed in rule['categories'].items():
+        if fields.get(field) not in allowed:
+            return False
+    for field, bounds in rule['ranges'].items():
+        if not _in_range(fields.get(field), bounds):
+            return False
+    if rule['regex'] is not None and not rule['regex'].search(fields.get('description') or ''):
+        return False
+    return True
+
+
+def request_fields(data):
+    """从单条请求中取出规则匹配所需的字段 (默认值与 normalize_records 一致)"""
+    def to_number(value, default):
+        try:
+            return float(value) if value is not None else default
+        except (TypeError, ValueError):
+            return default
+
+    cpu_score = to_number(data.get('cpu_score'), DEFAULT_CPU_SCORE)
+    fields = {f: str(data.get(f, 'Unknown')) for f in CATEGORY_FIELDS if f != 'performance_tier'}
+    fields.update(
+        performance_tier=TIER_LABELS[bisect.bisect_right(TIER_EDGES, cpu_score)],
+        cpu_score=cpu_score,
+        release_year=to_number(data.get('release_year'), datetime.now().year - DEFAULT_AGE),
+        ram_size=parse_ram(data.get('ram_desc')) if 'ram_desc' in data else to_number(data.get('ram_size'), None),
+        description=data.get('description') if isinstance(data.get('description'), str) else '',
+    )
+    return fields
+
+
+def request_frame(records):
+    """批量模式: 每条请求的规则匹配字段 (与 request_fields 相同) 组成的 DataFrame，数值字段缺失为 NaN"""
+    fields = pd.DataFrame([request_fields(data) for data in records], columns=[*CATEGORY_FIELDS, *RANGE_FIELDS, 'description'])
+    for field in RANGE_FIELDS:
+        fields[field] = pd.to_numeric(fields[field], errors='coerce')
+    return fields
+
+
+class CalibrationEngine:
+    """从规则文件加载人工校准规则，按 (brand, tier) 索引匹配，文件修改后自动热加载"""
+
+    def __init__(self, rules_path, reload_interval=5.0):
+        self.rules_path = Path(rules_path)
+        self.reload_interval = reload_interval
+        self.rules, self.index = [], {}
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.maybe_reload(force=True)
+
+    def maybe_reload(self, force=False):
+        """距上次检查超过 reload_interval 秒时检查文件 mtime，变化则重新编译规则"""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.reload_interval:
+            return
+        with self._lock:
+            self._last_check = now
+            try:
+                mtime = os.stat(self.rules_path).st_mtime
+            except FileNotFoundError:
+                self.rules, self.index, self._mtime = [], {}, None
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.rules_path, encoding='utf-8') as f:
+                    rules = [compile_rule(raw) for raw in json.load(f)]
+            except (ValueError, re.error) as e:
+                # 规则文件有误时保留旧规则，避免一次错误编辑清空所有校准
+                print(f"校准规则加载失败，继续使用旧规则: {e}")
+                self._mtime = mtime
+                return
+            # 新的规则和索引整体替换，请求线程读到的总是一致的快照
+            self.rules, self.index, self._mtime = rules, build_rule_index(rules), mtime
+            print(f"校准规则已加载: {len(rules)} 条 ({self.rules_path})")
+
+    def candidates(self, brand, tier):
+        index = self.index
+        return index.get((brand, tier), []) + index.get((brand, WILDCARD), []) + \
+               index.get((WILDCARD, tier), []) + index.get((WILDCARD, WILDCARD), [])
+
+    def match(self, data):
+        """返回 (系数, 命中的规则 id 列表)"""
+        self.maybe_reload()
+        if not self.index:
+            return 1.0, []
+        fields = request_fields(data)
+        today = date.today().isoformat()
+        factor, applied = 1.0, []
+        for rule in self.candidates(fields['brand'], fields['performance_tier']):
+            if rule_matches(rule, fields, today):
+                factor *= rule['factor']
+                applied.append(rule['id'])
+        return factor, applied
+
+    def batch_factors(self, fields):
+        """批量模式: fields 为 request_frame 的结果，按 (brand, tier) 分组，只对候选规则在数组上匹配
+
+        返回 (每行系数的数组, [(规则, 命中行的位置数组)])。
+        """
+        self.maybe_reload()
+        factors = np.ones(len(fields), dtype=float)
+        applied = []
+        if not self.index or len(fields) == 0:
+            return factors, applied
+        today = date.today().isoformat()
+        for (brand, tier), positions in fields.groupby(['brand', 'performance_tier'], sort=False).indices.items():
+            group = fields.iloc[positions]
+            for rule in self.candidates(brand, tier):
+                if not _rule_active(rule, today):
+                    continue
+                mask = np.ones(len(positions), dtype=bool)
+                for field, allowed in rule['categories'].items():
+                    mask &= group[field].isin(allowed).to_numpy()
+                for field, (low, high) in rule['ranges'].items():
+                    values = group[field].to_numpy(dtype=float)
+                    mask &= ~np.isnan(values) # 与 _in_range 一致: 缺失值不命中区间
+                    if low is not None:
+                        mask &= values >= low
+                    if high is not None:
+                        mask &= values <= high
+                if rule['regex'] is not None:
+                    mask &= group['description'].str.contains(rule['regex'], regex=True).to_numpy(dtype=bool)
+                if mask.any():
+                    factors[positions[mask]] *= rule['factor']
+                    applied.append((rule, positions[mask]))
+        return factors, applied
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = CalibrationEngine(config.CALIBRATION_RULES_PATH, config.CALIBRATION_RELOAD_INTERVAL)
+    return _engine
+
+
+def _audit_handler():
+    if not audit_logger.handlers:
+        Path(config.CALIBRATION_AUDIT_LOG_PATH).parent.mkdir(parents=True, exist_ok=True)
+        handler = logging.FileHandler(config.CALIBRATION_AUDIT_LOG_PATH, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        audit_logger.addHandler(handler)
+        audit_logger.setLevel(logging.INFO)
+        audit_logger.propagate = False
+
+
+def get_calibration_factor(data, prediction=None):
+    """人工校准系数: 返回命中规则系数的乘积；有规则命中时写入审计日志 (JSON Lines)"""
+    factor, applied = get_engine().match(data)
+    if applied:
+        _audit_handler()
+        audit_logger.info(json.dumps({
+            'ts': datetime.now().isoformat(timespec='seconds'),
+            'rules': applied,
+            'factor': factor,
+            'prediction': prediction,
+            'calibrated_prediction': None if prediction is None else prediction * factor,
+            'brand': data.get('brand'),
+            'cpu_score': data.get('cpu_score'),
+            'description': data.get('description'),
+        }, ensure_ascii=False))
+    return factor
+
+
+def get_calibration_factors(records, predictions=None):
+    """批量人工校准系数 (/explain)，返回与 records 等长的数组；每条命中的规则对每个请求写一条审计日志"""
+    factors, applied = get_engine().batch_factors(request_frame(records))
+    if applied:
+        _audit_handler()
+        ts = datetime.now().isoformat(timespec='seconds')
+        for rule, positions in applied:
+            for i in positions:
+                data = records[i]
+                prediction = None if predictions is None else float(predictions[i])
+                audit_logger.info(json.dumps({
+                    'ts': ts,
+                    'rule': rule['id'],
+                    'rule_factor': rule['factor'],
+                    'factor': float(factors[i]), # 该请求所有命中规则系数的乘积
+                    'prediction': prediction,
+                    'calibrated_prediction': None if prediction is None else prediction * float(factors[i]),
+                    'brand': data.get('brand'),
+                    'cpu_score': data.get('cpu_score'),
+                    'description': data.get('description'),
+                }, ensure_ascii=False))
+    return factors
@@ -0,0 +1,229 @@
+# src/cascade.py
+import numpy as np
+import pandas as pd
+import joblib
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config # 导入配置文件
+from src.utils import smape
+from src.evaluation import decode_category
+
+# 级联推理: 对混合结果影响很小的分段只运行 XGBoost (或 XGBoost + Decay)，跳过 KNN 近邻搜索。
+# 训练时在测试集的一半 (校准集) 上按分段 (品牌|性能等级，样本不足时退回性能等级) 学习:
+#   被跳过模型的加权贡献 ≈ 截距 + 系数 · [XGBoost 预测, cpu_score, ram_size, age] (分段内最小二乘拟合)，
+#   若用这个近似代替后，分段内至少 CASCADE_COVERAGE 比例的样本与完整混合预测的相对偏差不超过 CASCADE_TOLERANCE，
+#   该分段就走快速路径；候选路径从便宜到贵依次尝试，都不满足时走完整路径。
+# 另一半测试集用来报告快速路径占比和 sMAPE 变化。没有学过的分段一律走完整路径。
+SECONDARY_MODELS = ('knn', 'decay')
+CANDIDATE_PATHS = [('xgb',), ('xgb', 'decay')] # 从便宜到贵
+PROXY_FEATURES = ['cpu_score', 'ram_size', 'age'] # 近似修正项使用的原始特征 (与 KNN 的输入相同)
+
+
+def _dense_values(X_raw):
+    """(特征数组, 列名列表)；密集模式的特征全是数值列，整体转成数组后按位置取列
+    (单行请求约 2µs，按列名选取约 150µs)。紧凑模式 (含字符串类别列) 数组为 None"""
+    columns = X_raw.columns.tolist() # 遍历 Index 本身比遍历 list 慢一个数量级
+    try:
+        return X_raw.to_numpy(dtype=float), columns
+    except (TypeError, ValueError):
+        return None, columns
+
+
+def _decode(X_raw, dense, field):
+    """与 evaluation.decode_category 相同，密集模式直接在数组上取 One-Hot 列"""
+    values, columns = dense
+    if field in columns: # 紧凑模式的类别列 (比 decode_category 中的 astype(str) 快)
+        return X_raw[field].to_numpy(dtype=object).astype(str)
+    if values is None:
+        return decode_category(X_raw, field)
+    prefix = field + '_'
+    positions = [i for i, c in enumerate(columns) if c.startswith(prefix)]
+    labels = np.array([columns[i][len(prefix):] for i in positions] + ['Unknown'], dtype=object)
+    if not positions:
+        return np.full(len(X_raw), 'Unknown', dtype=object)
+    onehot = values[:, positions]
+    return labels[np.where(onehot.max(axis=1) > 0, onehot.argmax(axis=1), len(positions))]
+
+
+def proxy_features(X_raw, dense=None):
+    """PROXY_FEATURES 中存在的列 (n, k)"""
+    values, columns = dense or (None, X_raw.columns.tolist())
+    names = [f for f in PROXY_FEATURES if f in columns]
+    if values is not None:
+        return values[:, [columns.index(f) for f in names]]
+    return np.column_stack([X_raw[f].to_numpy(dtype=float) for f in names]) if names else np.empty((len(X_raw), 0))
+
+
+def proxy_matrix(xgb_pred, features):
+    """近似修正项的设计矩阵: [1, XGBoost 预测, PROXY_FEATURES]"""
+    return np.column_stack([np.ones(len(xgb_pred)), np.asarray(xgb_pred, dtype=float), features])
+
+
+def segment_keys(X_raw, dense=None):
+    """每行的 (细分段, 粗分段) 键: '品牌|性能等级' 与 '性能等级' (X_raw 为未标准化的特征，两种特征模式均可)"""
+    dense = dense or (None, X_raw.columns.tolist())
+    tier = _decode(X_raw, dense, 'performance_tier')
+    brand = _decode(X_raw, dense, 'brand')
+    return np.array([f"{b}|{t}" for b, t in zip(brand, tier)], dtype=object), tier.astype(str)
+
+
+def blend(predictions, weights):
+    """完整的混合预测 (与 predict_batch 一致)"""
+    final = sum(weights[name] * predictions[name] for name in ('xgb',) + SECONDARY_MODELS if name in predictions)
+    return np.maximum(final, 0)
+
+
+def _fit_segment(predictions, design, weights, tolerance, coverage):
+    """为一个分段选择最便宜的、满足容差的路径，返回 plan 或 None (完整路径)"""
+    full = blend(predictions, weights)
+    for models in CANDIDATE_PATHS:
+        if any(name not in predictions for name in models):
+            continue
+        skipped = [name for name in SECONDARY_MODELS if name in predictions and name not in models]
+        if not skipped:
+            continue
+        kept = sum(weights[name] * predictions[name] for name in models)
+        missing = sum(weights[name] * predictions[name] for name in skipped)
+        coef = np.linalg.lstsq(design, missing, rcond=None)[0]
+        estimate = np.maximum(kept + design @ coef, 0)
+        deviation = np.abs(estimate - full) / np.maximum(full, 1)
+        if np.quantile(deviation, coverage) <= tolerance:
+            return {'models': models, 'coef': coef}
+    return None
+
+
+def fit_cascade(X_raw, predictions, weights, tolerance=None, coverage=None, min_size=None):
+    """按分段学习快速路径，返回可保存的级联配置
+
+    plans 中细分段的键优先于粗分段；样本足够但不满足容差的分段记为 None，明确走完整路径。
+    """
+    tolerance = config.CASCADE_TOLERANCE if tolerance is None else tolerance
+    coverage = coverage or config.CASCADE_COVERAGE
+    min_size = min_size or config.CASCADE_MIN_SEGMENT_SIZE
+    predictions = {name: np.asarray(predictions[name], dtype=float) for name in ('xgb',) + SECONDARY_MODELS if name in predictions}
+    design = proxy_matrix(predictions['xgb'], proxy_features(X_raw))
+    plans = {}
+    for keys in segment_keys(X_raw):
+        for key in np.unique(keys):
+            mask = keys == key
+            if mask.sum() >= min_size:
+                plans[key] = _fit_segment({name: p[mask] for name, p in predictions.items()}, design[mask], weights, tolerance, coverage)
+    return {'plans': plans, 'tolerance': tolerance, 'coverage': coverage, 'weights': dict(weights)}
+
+
+def route(cascade, X_raw):
+    """每行应运行的子模型及近似修正项
+
+    返回 dict: 'knn'/'decay' (是否运行该模型的布尔数组)、'coef' (近似修正项系数，完整路径的行为 0)、
+    'features' (近似修正项用到的特征)、'fast' (是否走快速路径)。
+    """
+    dense = _dense_values(X_raw)
+    fine, coarse = segment_keys(X_raw, dense)
+    n = len(fine)
+    routing = {name: np.ones(n, dtype=bool) for name in SECONDARY_MODELS}
+    routing.update(coef=None, features=proxy_features(X_raw, dense), fast=np.zeros(n, dtype=bool))
+    plans = cascade['plans']
+    for i, (fine_key, coarse_key) in enumerate(zip(fine, coarse)):
+        plan = plans[fine_key] if fine_key in plans else plans.get(coarse_key)
+        if plan is None:
+            continue
+        if routing['coef'] is None:
+            routing['coef'] = np.zeros((n, len(plan['coef'])))
+        for name in SECONDARY_MODELS:
+            routing[name][i] = name in plan['models']
+        routing['coef'][i], routing['fast'][i] = plan['coef'], True
+    return routing
+
+
+def correction(routing, xgb_pred):
+    """快速路径的行: 被跳过模型的加权贡献的近似值；完整路径的行为 0"""
+    if routing['coef'] is None:
+        return np.zeros(len(xgb_pred))
+    return np.einsum('ij,ij->i', proxy_matrix(xgb_pred, routing['features']), routing['coef'])
+
+
+def cascade_blend(predictions, weights, routing):
+    """按路由组合预测 (跳过的模型不计入，改加近似修正项)"""
+    final = weights['xgb'] * predictions['xgb'] + correction(routing, predictions['xgb'])
+    for name in SECONDARY_MODELS:
+        if name in predictions:
+            final += weights[name] * np.where(routing[name], predictions[name], 0)
+    return np.maximum(final, 0)
+
+
+def evaluate_cascade(cascade, X_raw, predictions, weights, y_true):
+    """快速路径占比及其相对完整混合预测的精度变化"""
+    full = blend(predictions, weights)
+    routing = route(cascade, X_raw)
+    estimate = cascade_blend(predictions, weights, routing)
+    deviation = np.abs(estimate - full) / np.maximum(full, 1)
+    smape_full, smape_cascade = smape(y_true, full), smape(y_true, estimate)
+    return {
+        'tolerance': cascade['tolerance'],
+        'fast_path_fraction': float(routing['fast'].mean()),
+        'knn_skipped_fraction': float(1 - routing['knn'].mean()),
+        'smape_full': float(smape_full),
+        'smape_cascade': float(smape_cascade),
+        'smape_delta': float(smape_cascade - smape_full),
+        'p95_deviation': float(np.quantile(deviation, 0.95)) if len(deviation) else 0.0,
+        'max_deviation': float(deviation.max()) if len(deviation) else 0.0,
+    }
+
+
+def train_cascade(X_raw, predictions, weights, y_true, seed=42):
+    """训练时调用: 测试集一半校准、一半评估，打印各容差下的权衡，保存 config.CASCADE_TOLERANCE 对应的级联配置"""
+    y_true = np.asarray(y_true, dtype=float)
+    order = np.random.default_rng(seed).permutation(len(y_true))
+    calib, evaluation = np.sort(order[:len(order) // 2]), np.sort(order[len(order) // 2:])
+    subset = lambda rows: {name: np.asarray(p)[rows] for name, p in predictions.items()}
+
+    report, cascade = [], None
+    tolerances = sorted(set(config.CASCADE_REPORT_TOLERANCES) | {config.CASCADE_TOLERANCE})
+    for tolerance in tolerances:
+        fitted = fit_cascade(X_raw.iloc[calib], subset(calib), weights, tolerance)
+        report.append(evaluate_cascade(fitted, X_raw.iloc[evaluation], subset(evaluation), weights, y_true[evaluation]))
+        if tolerance == config.CASCADE_TOLERANCE:
+            cascade = fitted
+    cascade['report'] = report
+    print(pd.DataFrame(report).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    joblib.dump(cascade, config.CASCADE_PATH)
+    chosen = report[tolerances.index(config.CASCADE_TOLERANCE)]
+    print(f"级联配置已保存到 {config.CASCADE_PATH} (容差 {config.CASCADE_TOLERANCE}: 快速路径 {chosen['fast_path_fraction']:.1%}，"
+          f"sMAPE 变化 {chosen['smape_delta']:+.3f}，{'已' if config.CASCADE_ENABLED else '未'}在 API 中启用)")
+    return cascade
+
+
+if __name__ == "__main__":
+    # 用法: python src/cascade.py [样本数，默认 500] —— 逐条请求比较级联与完整路径的延迟 (需要 OCV_CASCADE_ENABLED=1)
+    # 样本取自训练数据，其中包含 KNN 的训练样本 (KNN 在这些样本上几乎等于真实价格)，偏差会高于训练时报告的测试集偏差
+    from src.ensemble import load_bundle, normalize_records, encode_features, predict_batch
+    n_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    bundle = load_bundle()
+    if bundle.get('cascade') is None or not config.CASCADE_ENABLED:
+        sys.exit(f"需要 {config.CASCADE_PATH} (先运行 src/train_model.py) 并设置 OCV_CASCADE_ENABLED=1")
+    raw = pd.read_csv(config.RAW_DATA_PATH)
+    raw = raw.sample(min(n_samples, len(raw)), random_state=0).drop(columns=['actual_price'], errors='ignore')
+    rows = [encode_features(normalize_records(raw.iloc[[i]]), bundle['feature_names'], bundle['category_levels']) for i in range(len(raw))]
+
+    latencies, finals, fast = {False: [], True: []}, {False: [], True: []}, []
+    for row in rows:
+        for cascade in (False, True): # 交替执行，避免预热和缓存对某一方有利
+            start = time.perf_counter()
+            preds = predict_batch(bundle, row, cascade=cascade)
+            latencies[cascade].append((time.perf_counter() - start) * 1000)
+            finals[cascade].append(preds['final'][0])
+        fast.append(bool(preds['fast_path'][0]))
+
+    full_ms, cascade_ms, fast = np.array(latencies[False]), np.array(latencies[True]), np.array(fast)
+    deviation = np.abs(np.array(finals[True]) - np.array(finals[False])) / np.maximum(finals[False], 1)
+    print(f"样本数 {len(rows)}，快速路径占比 {fast.mean():.1%}")
+    print(f"完整路径: 平均 {full_ms.mean():.2f} ms, p50 {np.median(full_ms):.2f} ms")
+    print(f"级联:     平均 {cascade_ms.mean():.2f} ms, p50 {np.median(cascade_ms):.2f} ms "
+          f"(快速路径 {cascade_ms[fast].mean() if fast.any() else float('nan'):.2f} ms, "
+          f"完整路径 {cascade_ms[~fast].mean() if (~fast).any() else float('nan'):.2f} ms)")
+    print(f"与完整路径的相对偏差: 平均 {deviation.mean():.4f}, p95 {np.quantile(deviation, 0.95):.4f}, 最大 {deviation.max():.4f}")
@@ -0,0 +1,175 @@
+# src/dedup.py
+import numpy as np
+import pandas as pd
+import re
+import sys
+import time
+from pathlib import Path
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config # 导入配置文件
+
+# 二手平台上同一台机器会被反复重新发布，描述只改几个字 (如 "急出"、"价格可小刀")。
+# 这里用字符 shingle 的 MinHash 签名 + LSH 分桶找出近似重复的帖子并聚类:
+#   1. 描述归一化 (小写、去掉空白和标点) 后取长度为 k 的字符 shingle
+#   2. 每条描述计算 num_perm 个 MinHash 值 (所有描述拼接成一个数组批量计算，无逐行 Python 循环)
+#   3. 签名切成 bands 段，同一段完全相同的帖子落入同一个桶，只有同桶的帖子才比较相似度
+#   4. 估计 Jaccard 相似度 >= 阈值且价格接近的候选对连边，连通分量即为一个重发簇
+_NON_WORD = re.compile(r'[\W_]+')
+_HASH_BASE = np.uint64(0x100000001B3)
+_BAND_BASE = np.uint64(0x9E3779B97F4A7C15)
+
+
+def normalize_text(descriptions):
+    """小写并去掉空白和标点；缺失值视为空字符串"""
+    return pd.Series(descriptions).fillna('').astype(str).str.lower().str.replace(_NON_WORD, '', regex=True)
+
+
+def _shingle_hashes(texts, k):
+    """把所有文本拼接后批量计算长度为 k 的字符 shingle 哈希，返回 (哈希数组, 每条文本的 shingle 起始偏移, shingle 数)"""
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    codes = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    counts = np.maximum(lengths - k + 1, 0)
+    text_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    # 每个 shingle 在拼接数组中的起点 (不跨越文本边界)
+    owner = np.repeat(np.arange(len(texts)), counts)
+    positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + text_starts[owner]
+    hashes = np.zeros(len(positions), dtype=np.uint64)
+    for j in range(k):
+        hashes = hashes * _HASH_BASE + codes[positions + j]
+    return hashes, np.cumsum(counts) - counts, counts
+
+
+def minhash_signatures(texts, num_perm=None, shingle_size=None, seed=None, chunk_size=None):
+    """计算 MinHash 签名 (n_texts, num_perm)，uint32；没有完整 shingle 的文本签名全为 0 (调用方应排除)
+
+    哈希族为 h(x) = (a * x + b) >> 32 (64 位乘法溢出取高位)，按文本分块避免一次占用过多内存。
+    """
+    num_perm = num_perm or config.DEDUP_NUM_PERM
+    shingle_size = shingle_size or config.DEDUP_SHINGLE_SIZE
+    chunk_size = chunk_size or config.DEDUP_CHUNK_SIZE
+    rng = np.random.default_rng(config.DEDUP_SEED if seed is None else seed)
+    a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+    shift = np.uint64(32)
+
+    signatures = np.zeros((len(texts), num_perm), dtype=np.uint32)
+    for chunk_start in range(0, len(texts), chunk_size):
+        chunk = texts[chunk_start:chunk_start + chunk_size]
+        hashes, offsets, counts = _shingle_hashes(chunk, shingle_size)
+        has_shingles = counts > 0
+        if not has_shingles.any():
+            continue
+        offsets = offsets[has_shingles]
+        rows = chunk_start + np.flatnonzero(has_shingles)
+        values = np.empty_like(hashes)
+        for p in range(num_perm):
+            # 原地运算，避免每个排列分配三个临时数组
+            np.multiply(hashes, a[p], out=values)
+            values += b[p]
+            values >>= shift
+            signatures[rows, p] = np.minimum.reduceat(values, offsets)
+    return signatures
+
+
+def _band_keys(signatures, bands):
+    rows_per_band = signatures.shape[1] // bands
+    keys = np.empty((len(signatures), bands), dtype=np.uint64)
+    for band in range(bands):
+        key = np.full(len(signatures), band, dtype=np.uint64)
+        for value in signatures[:, band * rows_per_band:(band + 1) * rows_per_band].T:
+            key = key * _BAND_BASE + value.astype(np.uint64)
+        keys[:, band] = key
+    return keys
+
+
+def candidate_pairs(signatures, bands=None):
+    """LSH: 每个 band 内按桶键排序，同桶成员与桶内第一个成员组成候选对 (星形连边，线性规模)"""
+    if len(signatures) < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    bands = bands or config.DEDUP_BANDS
+    keys = _band_keys(signatures, bands)
+    left, right = [], []
+    for band in range(bands):
+        order = np.argsort(keys[:, band], kind='stable')
+        sorted_keys = keys[order, band]
+        run_start = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+        leader = order[np.maximum.accumulate(np.where(run_start, np.arange(len(order)), 0))]
+        member = ~run_start
+        left.append(leader[member])
+        right.append(order[member])
+    if not left:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    # 多个 band 会产生相同的候选对，编码成一个 int64 后去重
+    n = len(signatures)
+    pairs = np.unique(np.concatenate(left).astype(np.int64) * n + np.concatenate(right))
+    return pairs // n, pairs % n
+
+
+def assign_duplicate_groups(descriptions, prices=None, threshold=None, price_tolerance=None):
+    """给每条帖子分配重发簇编号 (0..n_groups-1)；描述过短的帖子各自成簇"""
+    threshold = config.DEDUP_THRESHOLD if threshold is None else threshold
+    price_tolerance = config.DEDUP_PRICE_TOLERANCE if price_tolerance is None else price_tolerance
+    normalized = normalize_text(descriptions)
+
+    # 完全相同的描述只计算一次签名
+    text_codes, unique_texts = pd.factorize(normalized)
+    unique_texts = unique_texts.tolist()
+    unique_signatures = minhash_signatures(unique_texts)
+    usable_text = np.fromiter((len(t) >= config.DEDUP_SHINGLE_SIZE for t in unique_texts), dtype=bool, count=len(unique_texts))
+    signatures = unique_signatures[text_codes]
+    usable = usable_text[text_codes]
+
+    rows = np.flatnonzero(usable)
+    if len(rows) < 2:
+        # 可比较的描述不足两条 (如描述全部过短或为空)，每条帖子各自成簇
+        return np.arange(len(normalized))
+    left, right = candidate_pairs(signatures[rows])
+    left, right = rows[left], rows[right]
+    # 用签名估计 Jaccard 相似度，过滤 LSH 的假阳性
+    keep = (signatures[left] == signatures[right]).mean(axis=1) >= threshold
+    if prices is not None and price_tolerance is not None:
+        prices = np.asarray(prices, dtype=float)
+        gap = np.abs(prices[left] - prices[right]) / np.maximum(np.maximum(prices[left], prices[right]), 1.0)
+        keep &= ~(gap > price_tolerance) # 价格缺失时不作限制
+    left, right = left[keep], right[keep]
+
+    n = len(normalized)
+    graph = sparse.coo_matrix((np.ones(len(left), dtype=np.int8), (left, right)), shape=(n, n))
+    _, groups = connected_components(graph, directed=False)
+    return groups
+
+
+def deduplicate(df, mode=None):
+    """为数据添加 dup_group 列；mode='drop' 时每个重发簇只保留一条 (有 post_date 时保留最新的一条)"""
+    mode = mode or config.DEDUP_MODE
+    if 'description' not in df.columns:
+        print("数据中没有 description 字段，跳过近似重复检测。")
+        return df
+    start = time.perf_counter()
+    prices = df['actual_price'] if 'actual_price' in df.columns else None
+    df = df.assign(dup_group=assign_duplicate_groups(df['description'], prices))
+    n_groups = df['dup_group'].nunique()
+    print(f"近似重复检测完成，耗时 {time.perf_counter() - start:.2f}s: {len(df)} 条帖子 → {n_groups} 个簇 "
+          f"({len(df) - n_groups} 条重复)")
+    if mode == 'drop':
+        if 'post_date' in df.columns:
+            latest = pd.to_datetime(df['post_date'], errors='coerce')
+            df = df.assign(_posted=latest).sort_values('_posted', ascending=False, kind='stable').drop(columns='_posted')
+        df = df.drop_duplicates(subset='dup_group', keep='first').sort_index()
+    return df
+
+
+if __name__ == "__main__":
+    # 用法: python src/dedup.py [CSV 路径，默认 config.RAW_DATA_PATH]
+    data_path = sys.argv[1] if len(sys.argv) > 1 else config.RAW_DATA_PATH
+    df = deduplicate(pd.read_csv(data_path), mode='group')
+    if 'dup_group' in df.columns:
+        sizes = df['dup_group'].value_counts()
+        print(f"最大的重发簇 (共 {int((sizes > 1).sum())} 个簇包含重复):")
+        for group in sizes[sizes > 1].index[:5]:
+            print(df.loc[df['dup_group'] == group, ['actual_price', 'description']].head(5).to_string(index=False), "\n")
@@ -0,0 +1,321 @@
+# src/drift_monitor.py
+import numpy as np
+import pandas as pd
+import joblib
+import itertools
+import json
+import math
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config # 导入配置文件
+from src.utils import parse_ram, MISSING_CATEGORY # 导入辅助函数
+from src.ensemble import TIER_BINS, TIER_LABELS, DEFAULT_CPU_SCORE, DEFAULT_AGE
+
+CATEGORICAL_FIELDS = ['brand', 'gpu_type', 'storage_type', 'screen_condition', 'battery_health', 'performance_tier']
+RECORDED_CATEGORIES = CATEGORICAL_FIELDS[:-1] # 请求中的类别字段 (performance_tier 由 cpu_score 推导)
+NUMERIC_FIELDS = ['ram_size', 'cpu_score', 'release_year']
+UNSEEN_CATEGORY = '<未见类别>' # 训练时没有出现过的取值 (编码为 -1)
+
+# 环形缓冲区中每条采样记录的定长格式: 类别字段存为训练分布中类别的序号 (category_levels)，
+# 所用的类别表写在同名的 .levels.json 文件中，读取时据此还原
+RECORD_DTYPE = np.dtype([
+    ('seq', 'u8'), ('ts', 'f8'),
+    ('brand', 'i2'), ('gpu_type', 'i2'), ('storage_type', 'i2'),
+    ('screen_condition', 'i2'), ('battery_health', 'i2'),
+    ('ram_size', 'f4'), ('cpu_score', 'f4'), ('release_year', 'f4'),
+    ('prediction', 'f4'), ('cpu_score_default', '?'),
+])
+
+
+# --- 训练分布 (由 run_feature_engineering 保存) ---
+def _numeric_profile(values, n_bins):
+    values = pd.to_numeric(pd.Series(values), errors='coerce').dropna().to_numpy(dtype=float)
+    inner = np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1])) if len(values) else np.array([])
+    edges = np.concatenate([[-np.inf], inner, [np.inf]])
+    counts, _ = np.histogram(values, bins=edges)
+    return {'edges': edges, 'freq': counts / max(counts.sum(), 1)}
+
+
+def build_training_profile(df, n_bins=10):
+    """记录训练数据中各字段的分布，作为漂移监控的参照 (预测值的分布在训练后由 save_prediction_profile 补充)"""
+    profile = {'numeric': {}, 'categorical': {}, 'n_rows': len(df), 'created_at': datetime.now().isoformat()}
+    for col in NUMERIC_FIELDS:
+        if col in df.columns:
+            profile['numeric'][col] = _numeric_profile(df[col], n_bins)
+    for col in CATEGORICAL_FIELDS:
+        if col in df.columns:
+            profile['categorical'][col] = df[col].astype(str).value_counts(normalize=True).to_dict()
+    return profile
+
+
+def save_training_profile(df):
+    profile = build_training_profile(df, n_bins=config.DRIFT_HISTOGRAM_BINS)
+    joblib.dump(profile, config.TRAINING_PROFILE_PATH)
+    print(f"训练数据分布已保存到 {config.TRAINING_PROFILE_PATH}")
+
+
+def save_prediction_profile(predictions):
+    """用模型在留出集上的预测值作为预测漂移的参照 (线上记录的也是模型预测，而不是成交价)"""
+    profile = joblib.load(config.TRAINING_PROFILE_PATH)
+    profile['numeric']['prediction'] = _numeric_profile(predictions, config.DRIFT_HISTOGRAM_BINS)
+    joblib.dump(profile, config.TRAINING_PROFILE_PATH)
+    print(f"留出集预测值分布已保存到 {config.TRAINING_PROFILE_PATH} ({len(predictions)} 条)")
+
+
+def category_levels(profile):
+    """训练分布中各请求类别字段的取值 (环形缓冲区中类别序号的依据)"""
+    return {col: sorted(profile['categorical'].get(col, {})) for col in RECORDED_CATEGORIES}
+
+
+def load_category_levels(path=None):
+    """读取训练分布中的类别表；训练分布不存在时返回 None"""
+    try:
+        return category_levels(joblib.load(path or config.TRAINING_PROFILE_PATH))
+    except FileNotFoundError:
+        return None
+
+
+def _levels_path(ring_path):
+    return Path(ring_path).with_suffix('.levels.json')
+
+
+def _read_levels(ring_path):
+    try:
+        with open(_levels_path(ring_path), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+# --- API 端: 采样记录请求，异步写入环形缓冲区 ---
+class TrafficRecorder:
+    """按固定间隔采样请求，由后台线程写入 memmap 环形缓冲区文件
+
+    请求线程只做一次计数器自增和取模；命中采样时把 (data, prediction) 放入队列，
+    解析、类别编码 (levels 为 category_levels 的结果) 和写文件都在后台线程完成。每个 worker 进程写自己的文件 (traffic_<pid>.ring)；
+    新 worker 优先接管已退出进程留下的文件 (重启或 worker 回收后文件数不会增长，已采样的记录继续保留到被覆盖)。
+    """
+
+    def __init__(self, log_dir, capacity, sample_every, levels):
+        self.log_dir = Path(log_dir)
+        self.levels = {col: list(levels[col]) for col in RECORDED_CATEGORIES}
+        self._codes = {col: {value: i for i, value in enumerate(values)} for col, values in self.levels.items()}
+        self.capacity = int(capacity)
+        self.sample_every = max(int(sample_every), 1)
+        self._counter = itertools.count()
+        self._queue = queue.SimpleQueue()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def record(self, data, prediction):
+        if next(self._counter) % self.sample_every:
+            return
+        if self._pid != os.getpid(): # gunicorn fork 之后需要在子进程中重新启动写线程
+            self._start()
+        self._queue.put((time.time(), data, prediction))
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.SimpleQueue()
+            threading.Thread(target=self._writer, name='traffic-recorder', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _open_buffer(self):
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        path = self.log_dir / f'traffic_{self._pid}.ring'
+        if not path.exists():
+            _adopt_stale_buffer(self.log_dir, path)
+        # 类别表变化 (重新训练) 后旧记录的序号无法再解释，从头开始写
+        reusable = path.exists() and path.stat().st_size == self.capacity * RECORD_DTYPE.itemsize and _read_levels(path) == self.levels
+        mode = 'r+' if reusable else 'w+'
+        buffer = np.memmap(path, dtype=RECORD_DTYPE, mode=mode, shape=(self.capacity,))
+        with open(_levels_path(path), 'w', encoding='utf-8') as f:
+            json.dump(self.levels, f, ensure_ascii=False)
+        return buffer, int(buffer['seq'].max()) if mode == 'r+' else 0
+
+    def _writer(self):
+        buffer, seq = self._open_buffer()
+        pending = 0
+        while True:
+            ts, data, prediction = self._queue.get()
+            seq += 1
+            buffer[seq % self.capacity] = (seq, ts) + _record_fields(data, self._codes) + (prediction, _is_default_cpu_score(data))
+            pending += 1
+            if pending >= 100 or self._queue.empty():
+                buffer.flush()
+                pending = 0
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError: # 进程存在但属于其他用户
+        return True
+    return True
+
+
+def _adopt_stale_buffer(log_dir, path):
+    """把已退出的 worker 留下的环形缓冲区文件改名为 path；没有可接管的文件时返回 False"""
+    for stale in sorted(log_dir.glob('traffic_*.ring')):
+        try:
+            pid = int(stale.stem.split('_', 1)[1])
+        except ValueError:
+            continue
+        if _pid_alive(pid):
+            continue
+        try:
+            os.rename(stale, path) # 原子操作: 多个新 worker 同时接管时只有一个成功
+        except OSError:
+            continue
+        try:
+            os.rename(_levels_path(stale), _levels_path(path))
+        except OSError:
+            pass # 没有类别表的文件在 _open_buffer 中会被重新初始化
+        return True
+    return False
+
+
+def _is_default_cpu_score(data):
+    """cpu_score 是否为回退的默认值: 请求没有给出，或来自描述解析的默认分数"""
+    return _to_float(data.get('cpu_score', DEFAULT_CPU_SCORE)) == DEFAULT_CPU_SCORE
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _record_fields(data, codes):
+    """请求 → 环形缓冲区记录中的特征字段 (类别字段为 codes 中的序号，未见过的取值为 -1)"""
+    ram_desc = data.get('ram_desc')
+    return tuple(codes[col].get(str(data.get(col, MISSING_CATEGORY)), -1) for col in RECORDED_CATEGORIES) + (
+            float(parse_ram(ram_desc)) if ram_desc is not None else math.nan,
+            _to_float(data.get('cpu_score')), _to_float(data.get('release_year')))
+
+
+# --- 离线任务: 读取采样记录，计算 PSI 并判断是否需要重新训练 ---
+def load_traffic(log_dir, since=None):
+    """读取所有 worker 的环形缓冲区，返回按时间排序的 DataFrame (类别字段还原为字符串，未见过的取值为 UNSEEN_CATEGORY)"""
+    frames = []
+    for path in sorted(Path(log_dir).glob('traffic_*.ring')):
+        levels = _read_levels(path)
+        if levels is None:
+            print(f"警告: {path} 缺少类别表，已跳过。")
+            continue
+        records = np.fromfile(path, dtype=RECORD_DTYPE)
+        records = records[records['seq'] > 0]
+        if since is not None:
+            records = records[records['ts'] >= since]
+        frame = pd.DataFrame(records)
+        for col in RECORDED_CATEGORIES:
+            values = np.array(levels[col] + [UNSEEN_CATEGORY], dtype=object) # 序号 -1 对应最后一项
+            frame[col] = values[frame[col].to_numpy(dtype=np.int64)]
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=RECORD_DTYPE.names)
+    return pd.concat(frames, ignore_index=True).sort_values('ts', ignore_index=True)
+
+
+def population_stability_index(expected, actual, eps=1e-4):
+    expected = np.clip(np.asarray(expected, dtype=float), eps, None)
+    actual = np.clip(np.asarray(actual, dtype=float), eps, None)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def _histogram(values, edges, chunk_size=1_000_000):
+    """分块累计直方图，内存占用与样本量无关"""
+    counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    for begin in range(0, len(values), chunk_size):
+        chunk = values[begin:begin + chunk_size]
+        counts += np.histogram(chunk[~np.isnan(chunk)], bins=edges)[0]
+    return counts
+
+
+def compute_drift_report(profile, traffic):
+    """逐字段计算 PSI、未见过的类别比例以及 cpu_score 回退默认值的比例"""
+    report = {'n_samples': int(len(traffic)), 'features': {}, 'retrain_recommended': False, 'reasons': []}
+    if len(traffic) == 0:
+        return report
+
+    traffic = traffic.copy()
+    traffic['cpu_score'] = traffic['cpu_score'].fillna(DEFAULT_CPU_SCORE)
+    traffic['release_year'] = traffic['release_year'].fillna(datetime.now().year - DEFAULT_AGE)
+    traffic['performance_tier'] = pd.cut(traffic['cpu_score'], bins=TIER_BINS, labels=TIER_LABELS, right=False).astype(str)
+
+    for col, ref in profile['numeric'].items():
+        values = traffic[col].to_numpy(dtype=float)
+        counts = _histogram(values, ref['edges'])
+        actual = counts / max(counts.sum(), 1)
+        report['features'][col] = {'psi': population_stability_index(ref['freq'], actual)}
+
+    for col, ref in profile['categorical'].items():
+        actual = traffic[col].astype(str).value_counts(normalize=True)
+        categories = sorted(set(ref) | set(actual.index))
+        psi = population_stability_index([ref.get(c, 0.0) for c in categories], [actual.get(c, 0.0) for c in categories])
+        unseen = actual[~actual.index.isin(list(ref))]
+        report['features'][col] = {
+            'psi': psi,
+            'unseen_rate': float(unseen.sum()),
+            'unseen_values': unseen.head(10).to_dict(),
+        }
+
+    report['cpu_score_default_rate'] = float(traffic['cpu_score_default'].mean())
+
+    for col, stats in report['features'].items():
+        if stats['psi'] > config.DRIFT_PSI_THRESHOLD:
+            report['reasons'].append(f"{col} PSI={stats['psi']:.3f} > {config.DRIFT_PSI_THRESHOLD}")
+        if stats.get('unseen_rate', 0) > config.DRIFT_UNSEEN_RATE_THRESHOLD:
+            report['reasons'].append(f"{col} 未见类别占比 {stats['unseen_rate']:.1%}")
+    if report['cpu_score_default_rate'] > config.DRIFT_DEFAULT_RATE_THRESHOLD:
+        report['reasons'].append(f"cpu_score 回退默认值占比 {report['cpu_score_default_rate']:.1%}")
+    # 样本太少时 PSI 不稳定，只报告不告警
+    report['retrain_recommended'] = bool(report['reasons']) and len(traffic) >= config.DRIFT_MIN_SAMPLES
+    return report
+
+
+def run_drift_check(window_days=None):
+    print("开始漂移检测...")
+    try:
+        profile = joblib.load(config.TRAINING_PROFILE_PATH)
+    except FileNotFoundError:
+        print(f"错误: 训练数据分布未找到于 {config.TRAINING_PROFILE_PATH}，请先运行特征工程。")
+        return None
+    window_days = window_days or config.DRIFT_WINDOW_DAYS
+    traffic = load_traffic(config.DRIFT_LOG_DIR, since=time.time() - window_days * 86400)
+    print(f"读取到 {len(traffic)} 条采样请求 (最近 {window_days} 天)")
+
+    report = compute_drift_report(profile, traffic)
+    for col, stats in report['features'].items():
+        print(f"  {col:<18} PSI={stats['psi']:.3f}" + (f"  未见类别 {stats['unseen_rate']:.1%}" if 'unseen_rate' in stats else ''))
+    if report['n_samples']:
+        print(f"  cpu_score 回退默认值占比: {report['cpu_score_default_rate']:.1%}")
+    if report['retrain_recommended']:
+        print("建议重新训练: " + "; ".join(report['reasons']))
+    elif report['reasons']:
+        print(f"样本数不足 {config.DRIFT_MIN_SAMPLES}，暂不告警: " + "; ".join(report['reasons']))
+    else:
+        print("未发现显著漂移。")
+
+    with open(config.DRIFT_REPORT_PATH, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"漂移报告已保存到 {config.DRIFT_REPORT_PATH}")
+    return report
+
+
+if __name__ == "__main__":
+    run_drift_check()
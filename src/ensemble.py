@@ -0,0 +1,270 @@
+# src/ensemble.py
+import numpy as np
+import pandas as pd
+import joblib
+import xgboost as xgb
+from datetime import datetime
+from pathlib import Path
+
+import config # 导入配置文件
+from src.utils import parse_ram, DEFAULT_CPU_SCORE, DEFAULT_AGE, MISSING_CATEGORY # 辅助函数和缺失值策略
+from src.linear_fusion import predict_fused # 折叠后的线性组件
+from src.cascade import route, correction, cascade_blend # 级联推理的分段路由
+
+CATEGORICAL_FEATURES = ['brand', 'gpu_type', 'storage_type', 'screen_condition', 'battery_health', 'performance_tier']
+TIER_BINS = [-np.inf, 2000, 5000, 10000, np.inf]
+TIER_LABELS = ['low', 'mid', 'high', 'very_high']
+
+
+def _bundle_path(path, model_dir):
+    """model_dir 为空时使用配置中的路径，否则在 model_dir 下查找同名文件"""
+    return Path(path) if model_dir is None else Path(model_dir) / Path(path).name
+
+
+def _load_optional(path, model_dir):
+    try:
+        return joblib.load(_bundle_path(path, model_dir))
+    except FileNotFoundError:
+        return None
+
+
+def load_bundle(model_dir=None):
+    """加载一整套模型组件 (XGB/KNN/Decay/分位数/折叠线性组件/权重/特征名/scaler)
+
+    XGBoost、权重、特征名和 scaler 缺失时抛出 FileNotFoundError；
+    其余组件缺失时禁用对应模型，并重新归一化权重。
+    """
+    bundle = {
+        'xgb': joblib.load(_bundle_path(config.XGB_MODEL_PATH, model_dir)),
+        'weights': dict(joblib.load(_bundle_path(config.MODEL_WEIGHTS_PATH, model_dir))),
+        'feature_names': list(joblib.load(_bundle_path(config.FEATURE_NAMES_PATH, model_dir))),
+        'scaler': joblib.load(_bundle_path(config.SCALER_PATH, model_dir)),
+        'knn': _load_optional(config.KNN_MODEL_PATH, model_dir),
+        'knn_features': _load_optional(config.KNN_FEATURES_PATH, model_dir),
+        'knn_listings': _load_optional(config.KNN_LISTINGS_PATH, model_dir), # 解释用: KNN 训练样本的帖子信息
+        'decay': _load_optional(config.DECAY_MODEL_PATH, model_dir),
+        'decay_features': _load_optional(config.DECAY_FEATURES_PATH, model_dir),
+        'xgb_quantile': _load_optional(config.XGB_QUANTILE_MODEL_PATH, model_dir),
+        'interval_conformal': _load_optional(config.PRICE_INTERVAL_CONFORMAL_PATH, model_dir), # 分位数区间的共形校准
+        'fused_linear': _load_optional(config.FUSED_LINEAR_PATH, model_dir) or {},
+        'category_levels': _load_optional(config.CATEGORY_LEVELS_PATH, model_dir), # 仅紧凑特征模式存在
+        'cascade': _load_optional(config.CASCADE_PATH, model_dir), # 级联推理的分段路由 (config.CASCADE_ENABLED 时使用)
+    }
+    weights = bundle['weights']
+    for name in ('knn', 'decay'):
+        if bundle[name] is None:
+            weights[name] = 0 # 禁用权重
+
+    # 重新归一化权重（如果某个模型加载失败）
+    active_models_sum = sum(weights.get(k, 0) for k in ('xgb', 'knn', 'decay') if bundle[k] is not None)
+    if 0 < active_models_sum < 1.0:
+        scale_factor = 1.0 / active_models_sum
+        for k in weights:
+            weights[k] *= scale_factor
+    return bundle
+
+
+# --- 特征处理 (需要与 feature_engineering.py 中的逻辑严格一致!) ---
+def normalize_records(records, current_year=None):
+    """把请求记录 (dict 列表或 DataFrame) 转换为规范化的原始字段，批量处理
+
+    返回的列: 各类别字段、ram_size、release_year、cpu_score、age、age_factor、performance_tier，
+    以及输入中其余的原始列。
+    """
+    df = records.copy() if isinstance(records, pd.DataFrame) else pd.DataFrame(list(records))
+    current_year = current_year or datetime.now().year
+    default_year = current_year - DEFAULT_AGE
+
+    # 1. 解析/设置基本特征
+    if 'ram_size' not in df.columns or 'ram_desc' in df.columns:
+        df['ram_size'] = df['ram_desc'].map(parse_ram)
+    release_year = df['release_year'] if 'release_year' in df.columns else pd.Series(default_year, index=df.index)
+    df['release_year'] = pd.to_numeric(release_year, errors='coerce').fillna(default_year).astype(int)
+    cpu_score = df['cpu_score'] if 'cpu_score' in df.columns else pd.Series(DEFAULT_CPU_SCORE, index=df.index)
+    df['cpu_score'] = pd.to_numeric(cpu_score, errors='coerce').fillna(DEFAULT_CPU_SCORE)
+
+    # 2. 时间特征
+    df['age'] = (current_year - df['release_year']).clip(lower=0)
+    df['age_factor'] = 0.9 ** df['age']
+
+    # 3. 性能等级
+    df['performance_tier'] = pd.cut(df['cpu_score'], bins=TIER_BINS, labels=TIER_LABELS, right=False)
+
+    # 4. 类别字段统一为字符串 (与训练时的 astype(str) 一致)
+    for col in CATEGORICAL_FEATURES:
+        values = df[col] if col in df.columns else pd.Series(MISSING_CATEGORY, index=df.index)
+        df[col] = values.astype(str)
+    return df
+
+
+def encode_features(normalized_df, feature_names, category_levels=None):
+    """编码类别字段并对齐到训练时的特征列 (未标准化)
+
+    category_levels 为空时按 One-Hot 展开 (密集模式)；否则类别列按训练时的类别顺序
+    编码为 pandas category (紧凑模式)，训练时未出现的取值视为缺失。
+    """
+    if category_levels:
+        columns = {}
+        for name in feature_names:
+            if name in category_levels:
+                columns[name] = pd.Categorical(normalized_df[name], categories=category_levels[name])
+            else:
+                columns[name] = pd.to_numeric(normalized_df[name], errors='coerce').fillna(0).to_numpy(dtype=float)
+        return pd.DataFrame(columns, index=normalized_df.index)
+
+    n = len(normalized_df)
+    column_index = {name: i for i, name in enumerate(feature_names)}
+    values = np.zeros((n, len(feature_names)), dtype=float)
+
+    for name, i in column_index.items():
+        if name in normalized_df.columns and name not in CATEGORICAL_FEATURES:
+            values[:, i] = pd.to_numeric(normalized_df[name], errors='coerce').fillna(0).to_numpy(dtype=float)
+
+    rows = np.arange(n)
+    for col in CATEGORICAL_FEATURES:
+        dummy_names = (col + '_' + normalized_df[col]).to_numpy()
+        idx = np.array([column_index.get(name, -1) for name in dummy_names], dtype=int)
+        hit = idx >= 0
+        values[rows[hit], idx[hit]] = 1.0
+
+    return pd.DataFrame(values, columns=feature_names, index=normalized_df.index)
+
+
+def scale_features(raw_df, scaler):
+    """对 encode_features 的结果执行数值特征标准化"""
+    if scaler is None:
+        print("警告: Scaler未加载，未进行标准化。")
+        return raw_df
+    scaled_df = raw_df.copy()
+    numerical_features = [f for f in scaler.feature_names_in_ if f in scaled_df.columns]
+    scaled_df[numerical_features] = scaler.transform(scaled_df[numerical_features])
+    return scaled_df
+
+
+def xgb_contributions(model, features_df):
+    """XGBoost 原生的逐特征贡献 (pred_contribs)，形状 (n, 特征数 + 1)，最后一列为偏置；每行之和即预测值"""
+    try:
+        iteration_range = (0, model.best_iteration + 1) # 与 model.predict 一致: 早停时只用最佳轮数之前的树
+    except AttributeError:
+        iteration_range = (0, 0)
+    dmatrix = xgb.DMatrix(features_df, enable_categorical=True)
+    return model.get_booster().predict(dmatrix, pred_contribs=True, iteration_range=iteration_range)
+
+
+def knn_predict_with_neighbors(knn, X):
+    """一次近邻搜索同时得到 KNN 预测值和近邻 (结果与 KNeighborsRegressor.predict 相同)
+
+    返回 (预测值, 近邻在训练集中的位置, 距离, 权重)。
+    """
+    distances, indices = knn.kneighbors(X)
+    targets = np.asarray(knn._y, dtype=float)[indices] # 训练目标值 (单输出时为一维)
+    if knn.weights == 'distance':
+        with np.errstate(divide='ignore'):
+            weights = 1.0 / distances
+        exact = np.isinf(weights) # 与 sklearn 一致: 存在距离为 0 的近邻时只用这些近邻
+        exact_rows = exact.any(axis=1)
+        weights[exact_rows] = exact[exact_rows]
+    else:
+        weights = np.ones_like(distances)
+    return (targets * weights).sum(axis=1) / weights.sum(axis=1), indices, distances, weights
+
+
+def _predict_rows(predict, X, rows):
+    """只对 rows 为 True 的行调用 predict，其余行为 NaN (级联快速路径跳过的模型)"""
+    if rows.all():
+        return np.asarray(predict(X), dtype=float)
+    result = np.full(len(X), np.nan)
+    if rows.any():
+        result[rows] = predict(X[rows])
+    return result
+
+
+def widen_interval(lower, upper, conformal):
+    """按共形校准结果把分位数区间两端各外扩 scale × 区间宽度 (scale 为负时收窄，训练时保证不小于 -0.5)"""
+    if not conformal:
+        return lower, upper
+    margin = conformal['scale'] * np.maximum(upper - lower, 1.0)
+    return lower - margin, upper + margin
+
+
+def predict_batch(bundle, raw_df, explain=False, cascade=True):
+    """对一批已编码 (未标准化) 的特征行执行完整的混合模型预测
+
+    返回 dict: 各子模型预测、'final' 点估计以及 'low'/'high' 价格区间 (均为 numpy 数组)。
+    explain=True 时在同一次计算中附带解释所需的中间结果 (见 src/explain.py):
+    'xgb_contribs' (XGBoost 预测直接取贡献之和，不再单独预测)、'knn_neighbors' (近邻位置/距离/权重)、
+    'decay_contribs' 和 'decay_intercept' (标准化特征上的系数 × 特征值)。
+    启用级联推理 (config.CASCADE_ENABLED 且 cascade=True) 时，快速路径的行不运行 KNN/Decay
+    (对应预测为 NaN)，改加分段学到的近似修正项，并返回 'fast_path' (是否走快速路径的布尔数组)。
+    同时 explain=True 时所有模型仍对每一行运行 (解释需要完整的分解)，'final' 与区间仍按级联路由组合
+    (与不解释时的价格相同)，完整混合预测 (即解释各项之和) 另存为 'full_final'。
+    """
+    features_df = scale_features(raw_df, bundle['scaler'])
+    weights = bundle['weights']
+    preds = {}
+    final = np.zeros(len(raw_df), dtype=float)
+    routing = None
+    if cascade and config.CASCADE_ENABLED and bundle.get('cascade') is not None and bundle['xgb'] is not None:
+        routing = route(bundle['cascade'], raw_df)
+    skip = None if explain else routing # 跳过快速路径的行上的 KNN/Decay (解释时不跳过)
+
+    if bundle['xgb'] is not None:
+        if explain:
+            preds['xgb_contribs'] = xgb_contributions(bundle['xgb'], features_df)
+            preds['xgb'] = preds['xgb_contribs'].sum(axis=1)
+        else:
+            preds['xgb'] = bundle['xgb'].predict(features_df)
+        final += weights['xgb'] * preds['xgb']
+
+    if bundle['knn'] is not None:
+        # 确保只使用KNN训练时的特征
+        if explain and hasattr(bundle['knn'], 'kneighbors') and bundle['knn'].weights in ('uniform', 'distance'):
+            preds['knn'], *neighbors = knn_predict_with_neighbors(bundle['knn'], features_df[bundle['knn_features']])
+            preds['knn_neighbors'] = tuple(neighbors)
+        elif skip is not None:
+            preds['knn'] = _predict_rows(bundle['knn'].predict, features_df[bundle['knn_features']], skip['knn'])
+        else:
+            preds['knn'] = bundle['knn'].predict(features_df[bundle['knn_features']])
+        final += weights['knn'] * (preds['knn'] if skip is None else np.where(skip['knn'], preds['knn'], 0))
+
+    if bundle['decay'] is not None:
+        if explain:
+            # 线性模型的精确分解: 贡献 = 系数 × 标准化后的特征值，截距即训练集的平均价格
+            preds['decay_contribs'] = features_df[bundle['decay_features']].to_numpy(dtype=float) * np.ravel(bundle['decay'].coef_)
+            preds['decay_intercept'] = float(np.ravel(bundle['decay'].intercept_)[0])
+        if 'decay' in bundle['fused_linear']:
+            # 折叠路径: 在原始特征上一次点积，跳过 scaler 与 sklearn 的输入校验
+            predict_decay, decay_input = (lambda X: predict_fused(bundle['fused_linear']['decay'], X)), raw_df
+        else:
+            predict_decay, decay_input = bundle['decay'].predict, features_df[bundle['decay_features']]
+        if skip is not None:
+            preds['decay'] = _predict_rows(predict_decay, decay_input, skip['decay'])
+            final += weights['decay'] * np.where(skip['decay'], preds['decay'], 0)
+        else:
+            preds['decay'] = predict_decay(decay_input)
+            final += weights['decay'] * preds['decay']
+
+    if skip is not None:
+        # 快速路径: 跳过的模型的加权贡献用分段内的线性近似代替 (完整路径的行修正项为 0)
+        final += correction(skip, preds['xgb'])
+        preds['fast_path'] = skip['fast']
+
+    # 确保价格不为负
+    final = np.maximum(final, 0)
+    if explain and routing is not None:
+        # 解释: 完整混合预测用于分解，返回的价格与 /predict 一样取级联组合的结果
+        preds['full_final'] = final
+        final = cascade_blend(preds, weights, routing)
+        preds['fast_path'] = routing['fast']
+    preds['final'] = final
+
+    # 价格区间: 优先使用分位数模型 (经共形校准)，保证区间包含点估计
+    if bundle['xgb_quantile'] is not None:
+        quantiles = np.sort(np.asarray(bundle['xgb_quantile'].predict(features_df)).reshape(len(raw_df), -1), axis=1)
+        low, high = widen_interval(quantiles[:, 0], quantiles[:, -1], bundle.get('interval_conformal'))
+        preds['low'] = np.minimum(low, final)
+        preds['high'] = np.maximum(high, final)
+    else:
+        preds['low'] = final * config.PRICE_RANGE_FACTOR_LOW
+        preds['high'] = final * config.PRICE_RANGE_FACTOR_HIGH
+    return preds
@@ -0,0 +1,218 @@
+# src/etl.py
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config # 导入配置文件
+from src.parse_cache import get_parse_cache
+from src.utils import extract_text_fields # 与 API 的描述解析共用词表
+from src.feature_engineering import clean_raw_data
+from src.market_index import update_market_index
+
+# 爬虫输出 (basic_/selenium_scraped_data_*.csv) → 训练数据 (config.RAW_DATA_PATH) 的增量 ETL:
+#   1. 扫描 config.ETL_SOURCE_DIR 下匹配 ETL_SOURCE_PATTERN 的文件，与清单 (ETL_MANIFEST_PATH) 比较:
+#      mtime 和大小都没变的文件直接跳过；变了再算内容哈希，哈希相同也跳过 (只更新清单)
+#   2. 变化文件中不重复的描述分块交给进程池，用 utils.extract_text_fields 补全描述中实际提到的字段 (品牌、内存、存储)，
+#      爬虫已给出的字段 (非 'Unknown') 优先于解析结果；解析缓存 (src/parse_cache.py) 中已有的描述不再解析。
+#      描述和爬虫都没有给出的字段保持为空，由特征工程 (clean_raw_data) 在训练时按与 API 相同的缺失值策略补全
+#      (utils.MISSING_CATEGORY / DEFAULT_CPU_SCORE / DEFAULT_AGE)，同一段描述在训练和服务时得到相同的特征
+#   3. 每行带上 source_file；只有新文件时追加写入训练数据，已处理过的文件内容变化时替换它之前的行
+# 不是由 ETL 写入的行 (source_file 为空，如手工整理的数据) 始终保留；源文件被删除时它的行也保留。
+TRAINING_COLUMNS = ['brand', 'release_year', 'cpu_score', 'gpu_type', 'ram_desc', 'ram_size', 'storage_type',
+                    'screen_condition', 'battery_health', 'actual_price', 'post_date', 'description', 'location', 'source_file']
+PARSED_FIELDS = ['brand', 'release_year', 'cpu_score', 'gpu_type', 'ram_desc', 'storage_type', 'screen_condition', 'battery_health']
+MISSING_VALUES = ['', 'Unknown', 'N/A', 'nan', 'None']
+RELATIVE_DATE_PATTERN = r'(?P<n>\d+)\s*(?P<unit>分钟|小时|天)前|(?P<word>刚刚|今天|昨天|前天)'
+RELATIVE_UNITS = {'分钟': 'min', '小时': 'h', '天': 'D'}
+RELATIVE_WORDS = {'刚刚': 0, '今天': 0, '昨天': 1, '前天': 2}
+LISTING_PARSER_VERSION = 2 # 修改 extract_text_fields 的规则时必须递增 (解析缓存随之失效)
+
+
+# --- 1. 发现变化的文件 ---
+def file_digest(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path=None):
+    try:
+        with open(path or config.ETL_MANIFEST_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(manifest, path=None):
+    path = Path(path or config.ETL_MANIFEST_PATH)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def discover_changes(manifest, source_dir=None, pattern=None):
+    """返回 (需要处理的文件 {名称: 路径}, 新的文件状态 {名称: {mtime_ns, size, sha256}})"""
+    changed, states = {}, {}
+    for path in sorted(Path(source_dir or config.ETL_SOURCE_DIR or config.SCRAPER_OUTPUT_DIR).glob(pattern or config.ETL_SOURCE_PATTERN)):
+        stat = path.stat()
+        state = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+        previous = manifest.get(path.name)
+        if previous and previous['mtime_ns'] == state['mtime_ns'] and previous['size'] == state['size']:
+            continue # 快速路径: 不读文件内容
+        state['sha256'] = file_digest(path)
+        states[path.name] = state
+        if not previous or previous.get('sha256') != state['sha256']:
+            changed[path.name] = path
+    return changed, states
+
+
+# --- 2. 规整为训练数据的字段 ---
+def listing_parse_cache():
+    """extract_text_fields 的解析缓存 (与 API 的描述解析分开存储)"""
+    return get_parse_cache('listing', LISTING_PARSER_VERSION, extract_text_fields)
+
+
+def _parse_chunk(descriptions):
+    """进程池任务: 解析一批描述 (返回与输入等长的 extract_text_fields 结果列表)"""
+    return [extract_text_fields(text) for text in descriptions]
+
+
+def _parse_parallel(descriptions, n_workers, chunk_size):
+    chunks = [descriptions[i:i + chunk_size] for i in range(0, len(descriptions), chunk_size)]
+    if n_workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(chunks))) as executor:
+            return [row for rows in executor.map(_parse_chunk, chunks) for row in rows]
+    return _parse_chunk(descriptions) # 数据量小时不值得启动进程
+
+
+def parse_descriptions(descriptions, n_workers=None, chunk_size=None):
+    """并行解析不重复的描述，返回以描述为索引的 DataFrame (列为 PARSED_FIELDS，描述中没有提到的字段为 NaN)"""
+    unique = pd.unique(pd.Series(descriptions, dtype=object).fillna('').astype(str)).tolist()
+    chunk_size = chunk_size or config.ETL_CHUNK_SIZE
+    n_workers = n_workers or os.cpu_count() or 1
+    parse_missing = partial(_parse_parallel, n_workers=n_workers, chunk_size=chunk_size)
+    if config.PARSE_CACHE_ENABLED:
+        cache = listing_parse_cache()
+        misses = cache.stats['misses']
+        parsed = cache.parse_many(unique, parse_missing)
+        print(f"ETL: 解析缓存命中 {len(unique) - (cache.stats['misses'] - misses)}/{len(unique)} 条描述")
+    else:
+        parsed = parse_missing(unique)
+    return pd.DataFrame(parsed, index=unique).reindex(columns=PARSED_FIELDS)
+
+
+def normalize_post_dates(df, fallback_time):
+    """发布日期统一为 YYYY-MM-DD；'3天前'/'昨天' 等相对时间以抓取时间 (scrape_timestamp) 为基准"""
+    text = df['post_date'] if 'post_date' in df.columns else df.get('post_date_text', pd.Series(index=df.index, dtype=object))
+    text = text.astype(object).where(text.notna(), '').astype(str).str.strip()
+    scraped_at = pd.to_datetime(df['scrape_timestamp'], errors='coerce') if 'scrape_timestamp' in df.columns \
+        else pd.Series(pd.NaT, index=df.index)
+    scraped_at = scraped_at.fillna(pd.Timestamp(fallback_time))
+
+    dates = pd.to_datetime(text, errors='coerce', format='mixed')
+    relative = text.str.extract(RELATIVE_DATE_PATTERN)
+    amounts = pd.to_numeric(relative['n'], errors='coerce')
+    for unit, freq in RELATIVE_UNITS.items():
+        mask = relative['unit'] == unit
+        dates = dates.where(~mask, scraped_at - pd.to_timedelta(amounts.where(mask, 0), unit=freq))
+    days_ago = relative['word'].map(RELATIVE_WORDS)
+    dates = dates.where(days_ago.isna(), scraped_at - pd.to_timedelta(days_ago.fillna(0), unit='D'))
+    return dates.dt.strftime('%Y-%m-%d')
+
+
+def normalize_scraped(df, parsed, source_file, fallback_time):
+    """把一个爬虫输出文件规整为 TRAINING_COLUMNS (parsed 为 parse_descriptions 的结果)"""
+    out = pd.DataFrame(index=df.index)
+    descriptions = df['description'].fillna('').astype(str) if 'description' in df.columns else pd.Series('', index=df.index)
+    from_text = parsed.reindex(descriptions.to_numpy()).set_axis(df.index)
+    for field in PARSED_FIELDS:
+        scraped = df[field].astype(object) if field in df.columns else pd.Series(np.nan, index=df.index, dtype=object)
+        scraped = scraped.where(~scraped.astype(str).str.strip().isin(MISSING_VALUES))
+        out[field] = scraped.fillna(from_text[field]) # 爬虫给出的字段优先
+    # 爬虫的 ram_size 是纯数字 (GB)，统一成训练数据的 ram_desc 格式
+    if 'ram_size' in df.columns:
+        ram_size = pd.to_numeric(df['ram_size'], errors='coerce')
+        out['ram_desc'] = out['ram_desc'].where(ram_size.isna(), ram_size.map(lambda v: f"{v:.0f}GB"))
+    out['ram_size'] = pd.to_numeric(out['ram_desc'].astype(str).str.extract(r'(\d+)', expand=False), errors='coerce')
+    for field in ('release_year', 'cpu_score'):
+        out[field] = pd.to_numeric(out[field], errors='coerce').astype(float)
+    out['actual_price'] = pd.to_numeric(df['actual_price'], errors='coerce').astype(float)
+    out['post_date'] = normalize_post_dates(df, fallback_time)
+    out['description'] = descriptions
+    out['location'] = df['location'] if 'location' in df.columns else np.nan
+    out['source_file'] = source_file
+    return out[out['actual_price'] > 0].reindex(columns=TRAINING_COLUMNS)
+
+
+# --- 3. 合并到训练数据 ---
+def merge_into_store(new_rows, replaced_files, store_path=None):
+    """追加新行；replaced_files 中的文件之前写入的行会被替换 (需要重写整个文件)"""
+    store_path = Path(store_path or config.RAW_DATA_PATH)
+    if not store_path.exists():
+        new_rows.to_csv(store_path, index=False)
+        return len(new_rows), 0
+    header = pd.read_csv(store_path, nrows=0).columns.tolist()
+    if not replaced_files and set(TRAINING_COLUMNS) <= set(header):
+        new_rows.reindex(columns=header).to_csv(store_path, mode='a', header=False, index=False)
+        return len(new_rows), 0
+    store = pd.read_csv(store_path, low_memory=False)
+    removed = store['source_file'].isin(replaced_files) if 'source_file' in store.columns else pd.Series(False, index=store.index)
+    columns = header + [c for c in TRAINING_COLUMNS if c not in header]
+    merged = pd.concat([store[~removed], new_rows], ignore_index=True).reindex(columns=columns)
+    tmp_path = store_path.with_suffix('.tmp')
+    merged.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, store_path)
+    return len(new_rows), int(removed.sum())
+
+
+def run_etl(source_dir=None, store_path=None, manifest_path=None, n_workers=None):
+    """处理新增或变化的爬虫文件，返回写入训练数据的新行 (没有变化时为空 DataFrame)"""
+    start = time.perf_counter()
+    manifest = load_manifest(manifest_path)
+    changed, states = discover_changes(manifest, source_dir)
+    if not changed:
+        manifest.update({name: dict(manifest[name], **state) for name, state in states.items()})
+        save_manifest(manifest, manifest_path)
+        print("ETL: 没有新增或变化的爬虫文件。")
+        return pd.DataFrame(columns=TRAINING_COLUMNS)
+
+    frames = {name: pd.read_csv(path, dtype=str, keep_default_na=False, na_values=['']) for name, path in changed.items()}
+    descriptions = [df['description'] for df in frames.values() if 'description' in df.columns]
+    parsed = parse_descriptions(pd.concat(descriptions), n_workers or config.ETL_WORKERS) if descriptions \
+        else pd.DataFrame(columns=PARSED_FIELDS) # 没有描述列时只使用爬虫给出的字段
+    new_rows = pd.concat([normalize_scraped(df, parsed, name, pd.Timestamp(states[name]['mtime_ns'], unit='ns'))
+                          for name, df in frames.items()], ignore_index=True)
+
+    replaced = [name for name in changed if name in manifest]
+    added, removed = merge_into_store(new_rows, replaced, store_path)
+    # 清单在训练数据写入成功之后才更新，中途失败时下次会重新处理这些文件
+    for name, state in states.items():
+        manifest[name] = dict(state, rows=int((new_rows['source_file'] == name).sum())) if name in changed \
+            else dict(manifest[name], **state)
+    save_manifest(manifest, manifest_path)
+    print(f"ETL: 处理 {len(changed)} 个文件 (其中 {len(replaced)} 个内容有变化)，解析 {len(parsed)} 条不重复描述，"
+          f"写入 {added} 行，替换旧行 {removed} 行，耗时 {time.perf_counter() - start:.2f} 秒")
+
+    # 新帖子立即计入市场指数，API 的市场系数无需等到重新训练 (已计入的帖子按行哈希跳过)
+    if config.MARKET_INDEX_ENABLED and not new_rows.empty:
+        update_market_index(clean_raw_data(new_rows.copy()))
+    return new_rows
+
+
+if __name__ == "__main__":
+    # 用法: python src/etl.py [爬虫输出目录，默认 config.ETL_SOURCE_DIR，为空时为 config.SCRAPER_OUTPUT_DIR]
+    run_etl(sys.argv[1] if len(sys.argv) > 1 else None)
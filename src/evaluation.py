@@ -0,0 +1,193 @@
+# src/evaluation.py
+import numpy as np
+import pandas as pd
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from scipy import sparse # scikit-learn 的依赖，无需额外安装
+
+import config # 导入配置文件
+
+METRICS = ['smape', 'mae', 'hit_rate', 'coverage']
+AGE_BINS = [-np.inf, 1, 3, 5, 8, np.inf]
+AGE_LABELS = ['<1年', '1-3年', '3-5年', '5-8年', '8年以上']
+
+
+def decode_category(X, field):
+    """从特征矩阵还原类别字段: 紧凑模式直接读 category 列，密集模式取 One-Hot 列中为 1 的那一列"""
+    if field in X.columns:
+        return X[field].astype(str).to_numpy()
+    prefix = field + '_'
+    columns = [c for c in X.columns if c.startswith(prefix)]
+    if not columns:
+        return np.full(len(X), 'Unknown', dtype=object)
+    onehot = X[columns].to_numpy(dtype=float)
+    labels = np.array([c[len(prefix):] for c in columns] + ['Unknown'], dtype=object)
+    picked = np.where(onehot.max(axis=1) > 0, onehot.argmax(axis=1), len(columns))
+    return labels[picked]
+
+
+def build_segments(X_raw, y_true):
+    """构造分段维度: 品牌、性能等级、机龄段、价格段 (X_raw 为未标准化的特征)"""
+    price_bands = config.EVAL_PRICE_BANDS
+    price_labels = [f"{int(lo)}-{int(hi)}" if np.isfinite(hi) else f"{int(lo)}+" for lo, hi in zip(price_bands[:-1], price_bands[1:])]
+    return pd.DataFrame({
+        'brand': decode_category(X_raw, 'brand'),
+        'performance_tier': decode_category(X_raw, 'performance_tier'),
+        'age_bucket': pd.cut(X_raw['age'], bins=AGE_BINS, labels=AGE_LABELS, right=False).astype(str).to_numpy()
+            if 'age' in X_raw.columns else 'Unknown',
+        'price_band': pd.cut(np.asarray(y_true, dtype=float), bins=price_bands, labels=price_labels, right=False).astype(str),
+    })
+
+
+def row_metrics(y_true, y_pred, low, high):
+    """逐行计算各指标，之后按分段取均值即为该分段的指标"""
+    y_true = np.asarray(y_true, dtype=float)
+    y_pred = np.asarray(y_pred, dtype=float)
+    denominator = (np.abs(y_true) + np.abs(y_pred)) / 2
+    abs_error = np.abs(y_pred - y_true)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        smape = np.where(denominator == 0, 0, abs_error / denominator) * 100
+    hit = (y_true >= y_pred * config.PRICE_RANGE_FACTOR_LOW) & (y_true <= y_pred * config.PRICE_RANGE_FACTOR_HIGH)
+    covered = (y_true >= np.asarray(low, dtype=float)) & (y_true <= np.asarray(high, dtype=float))
+    return np.column_stack([smape, abs_error, hit * 100.0, covered * 100.0])
+
+
+def _poisson_table(size=65536):
+    """Poisson(1) 的离散分位数表: 用均匀 uint16 随机数查表生成权重，比 rng.poisson 快得多"""
+    k = np.arange(20)
+    pmf = np.exp(-1.0) / np.cumprod(np.r_[1, k[1:]])
+    return np.searchsorted(np.cumsum(pmf), (np.arange(size) + 0.5) / size).astype(np.float32)
+
+
+def _bootstrap_worker(args):
+    """泊松自助法: 每次重采样给每行一个 Poisson(1) 权重，返回每个单元格的 (权重和, 各指标加权和)
+
+    单元格 = 所有分段维度的组合。把 [1, 指标...] 按单元格写成一个稀疏矩阵，
+    一批重采样的权重矩阵 W (n_rows, batch) 只需一次稀疏矩阵乘法即可得到所有单元格的加权和。
+    """
+    cells, n_cells, values, seed, n_reps, batch_size = args
+    n_rows, n_metrics = values.shape
+    stacked = np.column_stack([np.ones(n_rows, dtype=np.float32), values])
+    rows = (np.arange(n_metrics + 1)[:, None] * n_cells + cells[None, :]).ravel()
+    cols = np.tile(np.arange(n_rows), n_metrics + 1)
+    indicator = sparse.csr_matrix((stacked.T.ravel(), (rows, cols)), shape=((n_metrics + 1) * n_cells, n_rows))
+
+    rng = np.random.default_rng(seed)
+    table = _poisson_table()
+    sums = np.empty((n_reps, n_metrics + 1, n_cells))
+    for offset in range(0, n_reps, batch_size):
+        batch = min(batch_size, n_reps - offset)
+        weights = table[rng.integers(0, len(table), (n_rows, batch), dtype=np.uint16)]
+        sums[offset:offset + batch] = (indicator @ weights).T.reshape(batch, n_metrics + 1, n_cells)
+    return sums
+
+
+def bootstrap_cell_sums(cells, n_cells, values, n_reps, n_workers=None, seed=42, batch_size=16):
+    """把自助重采样分给多个进程并行计算，返回 (n_reps, 1 + n_metrics, n_cells) 的单元格加权和"""
+    n_workers = n_workers or os.cpu_count() or 1
+    n_workers = max(1, min(n_workers, n_reps))
+    reps_per_worker = [n_reps // n_workers + (i < n_reps % n_workers) for i in range(n_workers)]
+    seeds = np.random.SeedSequence(seed).spawn(n_workers)
+    values = values.astype(np.float32)
+    jobs = [(cells, n_cells, values, s, r, batch_size) for s, r in zip(seeds, reps_per_worker)]
+    if len(jobs) == 1:
+        return _bootstrap_worker(jobs[0])
+    with ProcessPoolExecutor(max_workers=len(jobs)) as executor:
+        return np.concatenate(list(executor.map(_bootstrap_worker, jobs)), axis=0)
+
+
+def evaluate_segments(y_true, y_pred, low, high, segments, n_bootstrap=None, n_workers=None, alpha=0.05):
+    """按各分段维度计算 sMAPE/MAE/命中率/区间覆盖率，并给出自助法置信区间
+
+    先按所有维度的组合 (单元格) 聚合一次，各维度的分段结果由单元格再汇总得到，
+    自助法也只需在单元格层面计算，行数再多也只扫描数据一次/每批重采样。
+    """
+    n_bootstrap = config.EVAL_BOOTSTRAP_REPS if n_bootstrap is None else n_bootstrap
+    values = row_metrics(y_true, y_pred, low, high)
+    dimensions = ['overall'] + list(segments.columns)
+
+    codes_by_dim, labels_by_dim = [np.zeros(len(segments), dtype=np.int64)], [np.array(['all'])]
+    for dim in dimensions[1:]:
+        codes, labels = pd.factorize(segments[dim], sort=True)
+        codes_by_dim.append(codes.astype(np.int64))
+        labels_by_dim.append(labels)
+    combined = np.zeros(len(segments), dtype=np.int64)
+    for codes, labels in zip(codes_by_dim, labels_by_dim):
+        combined = combined * len(labels) + codes
+    cell_keys, cells = np.unique(combined, return_inverse=True)
+    n_cells = len(cell_keys)
+
+    # 每个单元格属于各维度的哪个分段
+    cell_groups, remainder = [], cell_keys
+    for labels in reversed(labels_by_dim):
+        cell_groups.append(remainder % len(labels))
+        remainder = remainder // len(labels)
+    cell_groups.reverse()
+
+    cell_counts = np.bincount(cells, minlength=n_cells)
+    cell_sums = np.stack([np.bincount(cells, weights=values[:, m], minlength=n_cells) for m in range(len(METRICS))])
+
+    boot_sums = None
+    if n_bootstrap > 0:
+        boot_sums = bootstrap_cell_sums(cells, n_cells, values, n_bootstrap,
+                                        n_workers=n_workers or config.EVAL_BOOTSTRAP_WORKERS, seed=config.EVAL_BOOTSTRAP_SEED)
+
+    report = {}
+    for d, dim in enumerate(dimensions):
+        groups, n_groups = cell_groups[d], len(labels_by_dim[d])
+        counts = np.bincount(groups, weights=cell_counts, minlength=n_groups)
+        means = np.stack([np.bincount(groups, weights=cell_sums[m], minlength=n_groups) for m in range(len(METRICS))], axis=1) \
+            / np.maximum(counts, 1)[:, None]
+        if boot_sums is not None:
+            # (n_reps, 1 + n_metrics, n_groups): 把单元格的加权和汇总到分段，再除以权重和得到加权均值
+            group_boot = np.stack([np.bincount(groups, weights=w, minlength=n_groups)
+                                   for w in boot_sums.reshape(-1, n_cells)]).reshape(len(boot_sums), len(METRICS) + 1, n_groups)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                boot_means = group_boot[:, 1:, :] / group_boot[:, :1, :]
+            ci_low = np.nanpercentile(boot_means, 100 * alpha / 2, axis=0)
+            ci_high = np.nanpercentile(boot_means, 100 * (1 - alpha / 2), axis=0)
+        rows = []
+        for g, label in enumerate(labels_by_dim[d]):
+            row = {'segment': str(label), 'n': int(counts[g])}
+            for m, metric in enumerate(METRICS):
+                row[metric] = float(means[g, m])
+                if boot_sums is not None:
+                    row[metric + '_ci'] = [float(ci_low[m, g]), float(ci_high[m, g])]
+            rows.append(row)
+        report[dim] = sorted(rows, key=lambda r: -r['n'])
+    return report
+
+
+def write_evaluation_report(report, path=None, extra=None):
+    path = path or config.EVALUATION_REPORT_PATH
+    payload = {'created_at': datetime.now().isoformat(timespec='seconds'), 'metrics': METRICS, 'segments': report}
+    if extra:
+        payload.update(extra)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    print(f"分段评估报告已保存到 {path}")
+
+
+def print_segment_summary(report, top=5):
+    """打印每个维度中 sMAPE 最差的几个分段 (样本数不少于 config.EVAL_MIN_SEGMENT_SIZE)"""
+    for dim, rows in report.items():
+        if dim == 'overall':
+            continue
+        rows = [r for r in rows if r['n'] >= config.EVAL_MIN_SEGMENT_SIZE]
+        print(f"\n按 {dim} 分段 (sMAPE 最差的 {min(top, len(rows))} 个):")
+        for r in sorted(rows, key=lambda r: -r['smape'])[:top]:
+            ci = f" [{r['smape_ci'][0]:.1f}, {r['smape_ci'][1]:.1f}]" if 'smape_ci' in r else ''
+            print(f"  {r['segment']:<12} n={r['n']:<7} sMAPE={r['smape']:.2f}%{ci}  MAE={r['mae']:.0f}  "
+                  f"命中率={r['hit_rate']:.1f}%  覆盖率={r['coverage']:.1f}%")
+
+
+def run_segment_evaluation(X_raw, y_true, y_pred, low, high):
+    start = time.perf_counter()
+    report = evaluate_segments(y_true, y_pred, low, high, build_segments(X_raw, y_true))
+    print(f"分段评估完成，耗时 {time.perf_counter() - start:.2f}s ({len(y_true)} 行)")
+    print_segment_summary(report)
+    write_evaluation_report(report)
+    return report
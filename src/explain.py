@@ -0,0 +1,170 @@
+# src/explain.py
+import numpy as np
+import pandas as pd
+import joblib
+import json
+import threading
+from collections import OrderedDict
+
+import config # 导入配置文件
+from src.ensemble import CATEGORICAL_FEATURES, normalize_records, encode_features, predict_batch
+from src.evaluation import decode_category
+from src.linear_fusion import unscale_features
+
+# 价格解释: 把混合模型的预测拆成 "基准价 + 各字段贡献 + 相似成交的贡献"，各项之和等于模型价格。
+# - XGBoost: 原生 pred_contribs (TreeSHAP)，偏置项为训练集的平均预测
+# - Decay (线性回归): 系数 × 标准化后的特征值 (相对训练集平均值的精确贡献)，截距为平均价格
+# - KNN: 没有逐特征的分解，整体作为 "相似成交" 一项 (相对 KNN 训练集平均价格)，并列出近邻帖子
+# 各子模型的贡献按混合权重加权后相加；One-Hot 列合并回原始字段，age_factor 合并到 age。
+# 解释与预测在 predict_batch(explain=True) 的同一次批量计算中得到 (XGBoost 预测直接取贡献之和)。
+# 启用级联推理时返回的价格与 /predict 相同 (快速路径的行用近似修正项代替 KNN/Decay)，而分解的是完整混合预测:
+# 解释中的 model_price 为完整混合预测 (各项之和)，fast_path 标记该请求的价格是否来自快速路径的近似。
+FEATURE_GROUPS = {'age_factor': 'age'}
+
+
+def save_knn_listings(X_train, y_train, scaler):
+    """保存 KNN 训练样本的帖子信息 (顺序与 KNN 训练集一致)，供解释时展示近邻"""
+    X_raw = unscale_features(X_train, scaler) if scaler is not None else X_train
+    listings = pd.DataFrame({'brand': decode_category(X_train, 'brand')}, index=X_train.index)
+    for field in ('cpu_score', 'ram_size', 'age'):
+        if field in X_raw.columns:
+            listings[field] = X_raw[field].to_numpy(dtype=float).round(2)
+    # 文本字段不在特征矩阵中，按行号从原始数据中取 (特征工程保留了原始数据的行索引)
+    try:
+        text = pd.read_csv(config.RAW_DATA_PATH, usecols=lambda c: c in ('description', 'post_date'))
+        listings = listings.join(text.reindex(X_train.index))
+    except (FileNotFoundError, ValueError):
+        pass
+    listings['price'] = np.asarray(y_train, dtype=float).round(2)
+    listings = listings.reset_index(drop=True)
+    joblib.dump(listings, config.KNN_LISTINGS_PATH)
+    print(f"KNN 近邻帖子信息已保存到 {config.KNN_LISTINGS_PATH} ({len(listings)} 条)")
+
+
+def feature_group(name):
+    """特征列 → 对外展示的字段名 (One-Hot 列合并回原始字段)"""
+    for field in CATEGORICAL_FEATURES:
+        if name.startswith(field + '_'):
+            return field
+    return FEATURE_GROUPS.get(name, name)
+
+
+def _group_matrix(feature_names):
+    """特征列到字段的 0/1 聚合矩阵，返回 (字段名列表, 矩阵)"""
+    groups = [feature_group(name) for name in feature_names]
+    fields = list(dict.fromkeys(groups))
+    matrix = np.zeros((len(feature_names), len(fields)))
+    matrix[np.arange(len(feature_names)), [fields.index(g) for g in groups]] = 1.0
+    return fields, matrix
+
+
+def build_explanations(bundle, preds, normalized, top_n=None):
+    """由 predict_batch(explain=True) 的结果构造每行的解释 (dict 列表)"""
+    top_n = top_n or config.EXPLAIN_TOP_FEATURES
+    weights = bundle['weights']
+    feature_names = bundle['feature_names']
+    n = len(preds['final'])
+    model_price = preds.get('full_final', preds['final']) # 级联推理时 'final' 是快速路径的近似，分解对应完整混合预测
+    base = np.zeros(n)
+    contribs = np.zeros((n, len(feature_names)))
+
+    if 'xgb_contribs' in preds:
+        base += weights['xgb'] * preds['xgb_contribs'][:, -1]
+        contribs += weights['xgb'] * preds['xgb_contribs'][:, :-1]
+    if 'decay_contribs' in preds:
+        base += weights['decay'] * preds['decay_intercept']
+        columns = [feature_names.index(f) for f in bundle['decay_features']]
+        contribs[:, columns] += weights['decay'] * preds['decay_contribs']
+    similar = None
+    if 'knn' in preds:
+        knn_mean = float(np.mean(bundle['knn']._y))
+        base += weights['knn'] * knn_mean
+        similar = weights['knn'] * (preds['knn'] - knn_mean)
+
+    fields, matrix = _group_matrix(feature_names)
+    field_contribs = contribs @ matrix
+    listings = bundle.get('knn_listings')
+    explanations = []
+    for i in range(n):
+        order = np.argsort(-np.abs(field_contribs[i]))[:top_n]
+        item = {
+            'base_price': round(float(base[i]), 2),
+            'model_price': round(float(model_price[i]), 2),
+            'contributions': [
+                {'feature': fields[j], 'value': _display_value(normalized, fields[j], i), 'contribution': round(float(field_contribs[i, j]), 2)}
+                for j in order],
+            'other_features': round(float(field_contribs[i].sum() - field_contribs[i, order].sum()), 2),
+        }
+        if similar is not None:
+            item['similar_listings'] = {'contribution': round(float(similar[i]), 2), 'knn_price': round(float(preds['knn'][i]), 2)}
+            if 'knn_neighbors' in preds:
+                item['similar_listings']['neighbors'] = _neighbors(preds['knn_neighbors'], listings, bundle['knn']._y, i)
+        if 'fast_path' in preds:
+            item['fast_path'] = bool(preds['fast_path'][i])
+        if model_price[i] == 0 and base[i] + field_contribs[i].sum() + (similar[i] if similar is not None else 0) < 0:
+            item['clipped_to_zero'] = True # 各项之和为负，预测值被截断为 0
+        explanations.append(item)
+    return explanations
+
+
+def _display_value(normalized, field, i):
+    if field not in normalized.columns:
+        return None
+    value = normalized[field].iloc[i]
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _neighbors(knn_neighbors, listings, targets, i):
+    indices, distances, weights = knn_neighbors
+    share = weights[i] / weights[i].sum()
+    result = []
+    for position, distance, w in zip(indices[i], distances[i], share):
+        row = listings.iloc[position].dropna().to_dict() if listings is not None else {'price': float(targets[position])}
+        row.update(distance=round(float(distance), 4), weight=round(float(w), 4))
+        result.append({k: (v.item() if isinstance(v, np.generic) else v) for k, v in row.items()})
+    return result
+
+
+class ExplanationCache:
+    """请求 → (预测, 解释) 的 LRU 缓存；未命中的请求在一次 predict_batch(explain=True) 中批量计算"""
+
+    def __init__(self, bundle, maxsize=None):
+        self.bundle = bundle
+        self.maxsize = config.EXPLAIN_CACHE_SIZE if maxsize is None else maxsize
+        self.stats = {'hits': 0, 'misses': 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(data):
+        return json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+
+    def explain(self, records):
+        """返回与 records 等长的 [(final, low, high, 解释)]"""
+        keys = [self.key(r) for r in records]
+        results, missing = {}, {}
+        with self._lock:
+            for key, record in zip(keys, records):
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    results[key] = self._entries[key]
+                else:
+                    missing.setdefault(key, record)
+        self.stats['hits'] += len(keys) - sum(1 for k in keys if k in missing)
+        self.stats['misses'] += len(missing)
+        if missing:
+            normalized = normalize_records(list(missing.values()))
+            raw_df = encode_features(normalized, self.bundle['feature_names'], self.bundle['category_levels'])
+            preds = predict_batch(self.bundle, raw_df, explain=True)
+            explanations = build_explanations(self.bundle, preds, normalized)
+            computed = {key: (float(preds['final'][i]), float(preds['low'][i]), float(preds['high'][i]), explanations[i])
+                        for i, key in enumerate(missing)}
+            results.update(computed)
+            with self._lock:
+                self._entries.update(computed)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return [results[key] for key in keys]
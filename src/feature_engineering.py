@@ -0,0 +1,167 @@
+# src/feature_engineering.py
+import pandas as pd
+import numpy as np
+from datetime import datetime
+import re
+from sklearn.preprocessing import StandardScaler
+import joblib
+import sys
+from pathlib import Path
+
+# 添加src目录到Python路径，以便导入utils
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.utils import parse_ram # 导入辅助函数
+from src.drift_monitor import save_training_profile # 漂移监控的训练分布
+from src.dedup import deduplicate # 近似重复帖子检测
+from src.market_index import update_market_index, normalize_to_reference # 市场价格指数
+from src.utils import DEFAULT_CPU_SCORE, DEFAULT_AGE, MISSING_CATEGORY # 与 API 相同的缺失值策略
+from src.profiling import stage, set_profile_meta # 分阶段性能分析 (--profile)
+import config # 导入配置文件
+
+CATEGORICAL_FEATURES = ['brand', 'gpu_type', 'storage_type', 'screen_condition', 'battery_health', 'performance_tier']
+TARGET = 'actual_price'
+
+
+def clean_raw_data(df):
+    """清洗原始数据并生成派生特征 (age, age_factor, performance_tier)，类别字段统一为字符串"""
+    # --- 2. 清洗与预处理 (同之前步骤二的代码) ---
+    # ... (填充缺失值，类型转换等) ...
+    # 默认内存取已有 ram_size 的中位数 (只计算一次，而不是每行重新计算)
+    with stage('ram_parsing'):
+        default_ram = df['ram_size'].median() if 'ram_size' in df.columns and not df['ram_size'].isnull().all() else 8
+        df['ram_size'] = df['ram_desc'].map(lambda x: parse_ram(x, default_ram=default_ram))
+    # ... (其他清洗步骤) ...
+    # 移除没有价格的行；发布年份和 CPU 分数缺失时 (如 ETL 写入的、描述中没有提到的字段) 按 API 的默认值补全
+    df.dropna(subset=[TARGET], inplace=True)
+
+
+    # --- 3. 特征工程 (同之前步骤二的代码) ---
+    current_year = datetime.now().year
+    # 机龄按发布帖子时计算 (两年前的帖子对应的是当时的机龄)，没有发布日期时按当前年份
+    if 'post_date' in df.columns:
+        listing_year = pd.to_datetime(df['post_date'], errors='coerce').dt.year.fillna(current_year).clip(upper=current_year)
+    else:
+        listing_year = current_year
+    # 缺失的发布年份按发帖时的默认机龄补全 (与 API 对缺失 release_year 的处理一致)，不随 ETL 运行的年份变化
+    df['release_year'] = pd.to_numeric(df['release_year'], errors='coerce').fillna(listing_year - DEFAULT_AGE).astype(int)
+    df['age'] = (listing_year - df['release_year']).astype(int)
+    df['age'] = df['age'].clip(lower=0) # 年龄不能为负
+    df['age_factor'] = 0.9 ** df['age']
+
+    df['cpu_score'] = pd.to_numeric(df['cpu_score'], errors='coerce').fillna(DEFAULT_CPU_SCORE)
+    bins = [-np.inf, 2000, 5000, 10000, np.inf]
+    labels = ['low', 'mid', 'high', 'very_high']
+    df['performance_tier'] = pd.cut(df['cpu_score'], bins=bins, labels=labels, right=False)
+
+    for col in CATEGORICAL_FEATURES:
+        df[col] = df[col].astype(str).fillna(MISSING_CATEGORY) # 确保是字符串并填充
+    return df
+
+
+def encode_and_scale(df, mode='dense'):
+    """编码类别特征并标准化数值特征，返回 (X, y, scaler, category_levels)
+
+    mode='dense': 类别字段 One-Hot 展开 (bool 列)，与原有行为一致。
+    mode='compact': 类别字段保留为 pandas category (供 XGBoost 原生类别支持)，
+                    数值特征标准化后存为 float32；category_levels 记录各字段的类别顺序。
+    """
+    # --- 4. 准备特征列表和目标变量 ---
+    # 移除原始列、中间列和非输入特征 (文本列如 description/location 不能直接作为特征)
+    original_cols_to_remove = ['ram_desc', 'post_date', 'dup_group', TARGET] + CATEGORICAL_FEATURES
+    numerical_features = [col for col in df.select_dtypes(include=np.number).columns if col not in original_cols_to_remove]
+    y = df[TARGET]
+    category_levels = None
+
+    if mode == 'compact':
+        with stage('categories'):
+            category_levels = {col: sorted(df[col].unique()) for col in CATEGORICAL_FEATURES}
+            X = df[numerical_features].astype(np.float32)
+            for col in CATEGORICAL_FEATURES:
+                X[col] = pd.Categorical(df[col], categories=category_levels[col])
+    else:
+        with stage('dummies'):
+            df_encoded = pd.get_dummies(df[numerical_features + CATEGORICAL_FEATURES], columns=CATEGORICAL_FEATURES, dummy_na=False)
+            X = df_encoded.copy()
+
+    # --- 5. 数值特征标准化 (只处理真正的数值列，One-Hot 列和类别列不参与) ---
+    scaler = None
+    if numerical_features:
+        with stage('scaling'):
+            scaler = StandardScaler()
+            scaled = scaler.fit_transform(X[numerical_features])
+            X[numerical_features] = scaled.astype(np.float32) if mode == 'compact' else scaled
+    return X, y, scaler, category_levels
+
+
+def run_feature_engineering(mode=None):
+    """返回 (X, y, groups)；groups 为每行的重发簇编号 (未做近似重复检测时为 None)，供训练时按簇划分数据集"""
+    mode = mode or config.FEATURE_ENGINEERING_MODE
+    print(f"开始特征工程 (mode={mode})...")
+    # --- 1. 加载数据 ---
+    try:
+        with stage('load_csv'):
+            df = pd.read_csv(config.RAW_DATA_PATH)
+        print(f"原始数据加载成功，行数: {len(df)}")
+        set_profile_meta(raw_rows=len(df))
+    except FileNotFoundError:
+        print(f"错误: 原始数据文件未找到于 {config.RAW_DATA_PATH}")
+        return None, None, None # 返回None表示失败
+
+    # 同一台机器的重发帖子会让 KNN 偏向它们，并在训练/测试集之间泄漏
+    if config.DEDUP_ENABLED:
+        with stage('dedup'):
+            df = deduplicate(df)
+
+    with stage('clean'):
+        df = clean_raw_data(df)
+
+    # 把不同时间发布的帖子价格换算到同一市场水平 (指数状态增量更新，已计入的帖子不会重复累加)
+    if config.MARKET_INDEX_ENABLED and 'post_date' in df.columns:
+        with stage('market_index'):
+            df = normalize_to_reference(df, update_market_index(df))
+
+    # 保存训练分布，供线上漂移监控对比
+    with stage('training_profile'):
+        save_training_profile(df)
+
+    with stage('encode'):
+        X, y, scaler, category_levels = encode_and_scale(df, mode)
+
+    # 检查特征列表是否为空
+    if X.shape[1] == 0:
+        print("错误：没有可用的特征列。请检查特征工程步骤。")
+        return None, None, None
+
+    if scaler is not None:
+        # 保存标准化器
+        joblib.dump(scaler, config.SCALER_PATH)
+        print(f"标准化器已保存到 {config.SCALER_PATH}")
+    else:
+        print("警告：未找到数值特征进行标准化。")
+
+    # 紧凑模式需要保存类别顺序，保证预测时的类别编码与训练一致；密集模式删除旧文件
+    if category_levels is not None:
+        joblib.dump(category_levels, config.CATEGORY_LEVELS_PATH)
+        print(f"类别顺序已保存到 {config.CATEGORY_LEVELS_PATH}")
+    else:
+        Path(config.CATEGORY_LEVELS_PATH).unlink(missing_ok=True)
+
+
+    # --- 6. 保存处理结果 ---
+    # 保存特征名称列表 (非常重要，保证训练和预测时列顺序一致)
+    joblib.dump(list(X.columns), config.FEATURE_NAMES_PATH)
+    print(f"特征名称列表已保存到 {config.FEATURE_NAMES_PATH}")
+
+    # (可选) 保存处理后的数据帧
+    # data_to_save = pd.concat([X, y], axis=1)
+    # data_to_save.to_csv(config.PROCESSED_DATA_PATH, index=False)
+    # print(f"处理后的数据已保存到 {config.PROCESSED_DATA_PATH}")
+
+    print(f"特征工程完成，特征矩阵占用内存 {X.memory_usage(deep=True).sum() / 1024 ** 2:.1f} MB。")
+    groups = df['dup_group'] if 'dup_group' in df.columns else None
+    return X, y, groups # 返回处理好的数据给训练脚本直接使用 (或者让训练脚本自行加载)
+
+
+if __name__ == "__main__":
+    run_feature_engineering()
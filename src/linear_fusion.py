@@ -0,0 +1,54 @@
+# src/linear_fusion.py
+import numpy as np
+
+
+def is_linear_model(model):
+    """判断模型是否为可折叠的线性模型 (具有 coef_ 和 intercept_ 属性)"""
+    return model is not None and hasattr(model, 'coef_') and hasattr(model, 'intercept_')
+
+
+def fuse_linear_model(model, features, scaler=None):
+    """将 StandardScaler 与线性模型折叠为原始特征上的一组系数和截距
+
+    scaler 对 x 做 (x - mean) / scale，模型再计算 coef · x_scaled + b，
+    两者都是仿射变换，可以合并为 coef' · x_raw + b'。
+    未被 scaler 处理的特征 (如 one-hot 列) 系数保持不变。
+    """
+    coef = np.asarray(model.coef_, dtype=float).ravel().copy()
+    intercept = float(np.ravel(model.intercept_)[0])
+    if len(coef) != len(features):
+        raise ValueError(f"系数个数 ({len(coef)}) 与特征个数 ({len(features)}) 不一致")
+
+    if scaler is not None:
+        scaled_index = {name: i for i, name in enumerate(scaler.feature_names_in_)}
+        for i, name in enumerate(features):
+            j = scaled_index.get(name)
+            if j is None:
+                continue
+            coef[i] = coef[i] / scaler.scale_[j]
+            intercept -= coef[i] * scaler.mean_[j]
+
+    return {'features': list(features), 'coef': coef, 'intercept': intercept}
+
+
+def fuse_linear_components(models, feature_lists, scaler=None):
+    """对集成中所有线性组件执行折叠，返回 {模型名: 折叠结果}"""
+    fused = {}
+    for name, model in models.items():
+        if is_linear_model(model) and name in feature_lists:
+            fused[name] = fuse_linear_model(model, feature_lists[name], scaler)
+    return fused
+
+
+def predict_fused(fused, X_raw):
+    """在原始 (未标准化) 特征上用一次点积计算线性组件的预测值"""
+    values = np.asarray(X_raw[fused['features']], dtype=float)
+    return values @ fused['coef'] + fused['intercept']
+
+
+def unscale_features(X, scaler):
+    """把已标准化的特征还原为原始尺度 (用于训练时的一致性校验)"""
+    X_raw = X.copy()
+    cols = list(scaler.feature_names_in_)
+    X_raw[cols] = scaler.inverse_transform(X_raw[cols])
+    return X_raw
@@ -0,0 +1,209 @@
+# src/market_index.py
+import numpy as np
+import pandas as pd
+import bisect
+import joblib
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config # 导入配置文件
+from src.ensemble import TIER_BINS, TIER_LABELS, DEFAULT_CPU_SCORE
+
+# 市场价格指数: 二手价格整体会随时间涨跌 (新品发布、促销季、内存涨价等)。
+# 按分段 (默认 performance_tier) 和周统计 "折旧调整后的对数价格" log(price / 0.9^age) 的均值，
+# 用滚动窗口平滑得到指数水平 L(segment, week)。
+# - 训练: 每条帖子的价格按 exp(L(参考周) - L(发布周)) 换算到参考周 (训练时最新的一周)
+# - 服务: 预测价格乘以 exp(L(当前) - L(参考周))，训练后新爬取的数据会让这个系数偏离 1.0
+# 状态只保存每个 (分段, 周) 的计数和对数价格之和，新数据到达时增量累加，无需重算历史。
+OVERALL = '*'
+PRICE_COLUMN = 'actual_price'
+ROW_KEY_COLUMNS = ['brand', 'release_year', 'cpu_score', 'ram_desc', 'actual_price', 'post_date', 'description']
+NUMERIC_KEY_COLUMNS = ['release_year', 'cpu_score', 'actual_price']
+
+
+def listing_weeks(post_dates):
+    """发布日期 → 自 1970-01-01 起的周序号 (无法解析的日期为 -1)"""
+    days = pd.to_datetime(post_dates, errors='coerce').to_numpy(dtype='datetime64[D]')
+    weeks = np.full(len(days), -1, dtype=np.int64)
+    valid = ~np.isnat(days)
+    weeks[valid] = days[valid].astype(np.int64) // 7
+    return weeks
+
+
+def adjusted_log_price(df):
+    """折旧调整后的对数价格 (df 需要已有 age 列，见 clean_raw_data)"""
+    return np.log(np.maximum(df[PRICE_COLUMN].to_numpy(dtype=float), 1.0)) - df['age'].to_numpy(dtype=float) * np.log(0.9)
+
+
+def _row_hashes(df):
+    # 数值列统一为浮点、缺失值统一为空串，保证同一帖子从 CSV 重新读入 (如 ETL 写入后再训练) 时哈希不变
+    keys = pd.DataFrame({c: pd.to_numeric(df[c], errors='coerce').astype(float) if c in NUMERIC_KEY_COLUMNS else df[c]
+                         for c in ROW_KEY_COLUMNS if c in df.columns})
+    return pd.util.hash_pandas_object(keys.astype(object).where(keys.notna(), '').astype(str), index=False).to_numpy()
+
+
+def load_state(path=None):
+    try:
+        return joblib.load(path or config.MARKET_INDEX_STATE_PATH)
+    except FileNotFoundError:
+        return {'aggregates': pd.DataFrame({'segment': pd.Series(dtype=str), 'week': pd.Series(dtype=np.int64),
+                                            'n': pd.Series(dtype=np.int64), 'sum_log': pd.Series(dtype=float)}),
+                'seen': np.empty(0, dtype=np.uint64)}
+
+
+def update_market_index(df, path=None):
+    """把新数据累加进指数状态 (已计入过的帖子按行哈希跳过)，返回更新后的状态
+
+    df 需要包含 post_date、actual_price、age 和分段字段 (即 clean_raw_data 的输出)。
+    """
+    path = path or config.MARKET_INDEX_STATE_PATH
+    state = load_state(path)
+    hashes = _row_hashes(df)
+    new = ~np.isin(hashes, state['seen'])
+    weeks = listing_weeks(df['post_date'])
+    usable = new & (weeks >= 0)
+    if usable.any():
+        frame = pd.DataFrame({
+            'segment': df[config.MARKET_INDEX_SEGMENT].astype(str).to_numpy()[usable],
+            'week': weeks[usable],
+            'sum_log': adjusted_log_price(df)[usable],
+        })
+        added = frame.groupby(['segment', 'week'], as_index=False).agg(n=('sum_log', 'size'), sum_log=('sum_log', 'sum'))
+        state['aggregates'] = pd.concat([state['aggregates'], added]).groupby(['segment', 'week'], as_index=False)[['n', 'sum_log']].sum()
+        state['seen'] = np.union1d(state['seen'], hashes[new])
+        joblib.dump(state, path)
+    print(f"市场指数已更新: 新增 {int(usable.sum())} 条帖子 (跳过已计入 {int((~new).sum())} 条，"
+          f"缺少发布日期 {int((new & (weeks < 0)).sum())} 条)，共 {len(state['aggregates'])} 个 (分段, 周) 单元")
+    return state
+
+
+def index_levels(aggregates, window=None, min_count=None):
+    """计算指数水平的宽表 (行: 连续的周序号, 列: 各分段和总体 '*')
+
+    每个单元取最近 window 周的滚动均值；滚动样本数不足 min_count 的单元为 NaN，
+    之后按周向前填充 (没有新数据的周沿用上一次的指数水平)。
+    """
+    window = window or config.MARKET_INDEX_WINDOW_WEEKS
+    min_count = config.MARKET_INDEX_MIN_COUNT if min_count is None else min_count
+    if aggregates.empty:
+        return pd.DataFrame(dtype=float)
+    overall = aggregates.groupby('week', as_index=False)[['n', 'sum_log']].sum().assign(segment=OVERALL)
+    frame = pd.concat([aggregates, overall])
+    weeks = np.arange(frame['week'].min(), frame['week'].max() + 1)
+    n = frame.pivot(index='week', columns='segment', values='n').reindex(weeks).fillna(0)
+    sum_log = frame.pivot(index='week', columns='segment', values='sum_log').reindex(weeks).fillna(0)
+    rolling_n = n.rolling(window, min_periods=1).sum()
+    levels = sum_log.rolling(window, min_periods=1).sum() / rolling_n
+    return levels.where(rolling_n >= min_count).ffill()
+
+
+def _segment_deltas(levels, segments, weeks, target_row):
+    """每行的对数调整量 L(target_row) - L(week)；分段指数不足时用总体指数，仍不足时为 0"""
+    values = levels.to_numpy()
+    week_rows = weeks - levels.index[0]
+    valid_week = (weeks >= 0) & (week_rows < len(levels))
+    week_rows = np.clip(week_rows, 0, len(levels) - 1)
+
+    def delta_for(columns):
+        found = columns >= 0
+        columns = np.where(found, columns, 0)
+        delta = values[target_row, columns] - values[week_rows, columns]
+        return np.where(found & valid_week, delta, np.nan)
+
+    delta = delta_for(levels.columns.get_indexer(segments))
+    overall = delta_for(np.full(len(weeks), levels.columns.get_loc(OVERALL)))
+    delta = np.where(np.isnan(delta), overall, delta)
+    limit = config.MARKET_INDEX_MAX_LOG_ADJUSTMENT
+    return np.clip(np.nan_to_num(delta, nan=0.0), -limit, limit)
+
+
+def normalize_to_reference(df, state):
+    """把训练数据的价格换算到参考周 (状态中最新的一周) 的市场水平，并保存参考水平供服务时使用"""
+    levels = index_levels(state['aggregates'])
+    if levels.empty:
+        print("市场指数为空，跳过价格归一化。")
+        return df
+    reference_row = len(levels) - 1
+    delta = _segment_deltas(levels, df[config.MARKET_INDEX_SEGMENT].astype(str).to_numpy(),
+                            listing_weeks(df['post_date']), reference_row)
+    df = df.copy()
+    df[PRICE_COLUMN] = df[PRICE_COLUMN] * np.exp(delta)
+    reference = {'week': int(levels.index[reference_row]), 'levels': levels.iloc[reference_row].to_dict()}
+    joblib.dump(reference, config.MARKET_INDEX_REFERENCE_PATH)
+    reference_date = np.datetime64(reference['week'] * 7, 'D')
+    print(f"训练价格已换算到参考周 {reference_date} 的市场水平 (调整幅度: 中位数 {np.median(np.abs(delta)):.3f}, "
+          f"最大 {np.max(np.abs(delta)):.3f})，参考水平已保存到 {config.MARKET_INDEX_REFERENCE_PATH}")
+    return df
+
+
+def current_factors(state_path=None, reference_path=None):
+    """当前市场水平相对训练参考周的系数 {分段: 系数}，总体系数的键为 '*'"""
+    try:
+        reference = joblib.load(reference_path or config.MARKET_INDEX_REFERENCE_PATH)
+    except FileNotFoundError:
+        return {}
+    levels = index_levels(load_state(state_path)['aggregates'])
+    if levels.empty:
+        return {}
+    latest = levels.iloc[-1]
+    limit = config.MARKET_INDEX_MAX_LOG_ADJUSTMENT
+    factors = {}
+    for segment, reference_level in reference['levels'].items():
+        current = latest.get(segment, np.nan)
+        if np.isfinite(current) and np.isfinite(reference_level):
+            factors[segment] = float(np.exp(np.clip(current - reference_level, -limit, limit)))
+    return factors
+
+
+# --- 服务端: 系数缓存在进程内，状态文件修改后 (如爬虫增量更新) 按间隔重新计算 ---
+_cache = {'factors': {}, 'mtime': None, 'checked': float('-inf')}
+_cache_lock = threading.Lock()
+
+
+def _cached_factors():
+    now = time.monotonic()
+    if now - _cache['checked'] >= config.MARKET_INDEX_RELOAD_INTERVAL:
+        with _cache_lock:
+            _cache['checked'] = now
+            try:
+                mtime = (os.stat(config.MARKET_INDEX_STATE_PATH).st_mtime, os.stat(config.MARKET_INDEX_REFERENCE_PATH).st_mtime)
+            except FileNotFoundError:
+                mtime = None
+            if mtime != _cache['mtime']:
+                _cache['factors'] = current_factors() if mtime else {}
+                _cache['mtime'] = mtime
+    return _cache['factors']
+
+
+def request_segment(data):
+    if config.MARKET_INDEX_SEGMENT != 'performance_tier':
+        return str(data.get(config.MARKET_INDEX_SEGMENT, 'Unknown'))
+    try:
+        cpu_score = float(data.get('cpu_score', DEFAULT_CPU_SCORE))
+    except (TypeError, ValueError):
+        cpu_score = DEFAULT_CPU_SCORE
+    return TIER_LABELS[bisect.bisect_right(TIER_BINS[1:-1], cpu_score)]
+
+
+def get_market_factor(data):
+    """单个请求的市场系数 (分段系数缺失时用总体系数，都没有时为 1.0)"""
+    factors = _cached_factors()
+    return factors.get(request_segment(data), factors.get(OVERALL, 1.0))
+
+
+if __name__ == "__main__":
+    # 用法: python src/market_index.py [新爬取的 CSV ...]  增量累加新数据并打印当前系数
+    from src.feature_engineering import clean_raw_data
+    for data_path in sys.argv[1:]:
+        update_market_index(clean_raw_data(pd.read_csv(data_path)))
+    levels = index_levels(load_state()['aggregates'])
+    if not levels.empty:
+        print("最近 8 周的指数水平 (折旧调整后的对数价格):")
+        print(levels.tail(8).set_axis([str(np.datetime64(int(w) * 7, 'D')) for w in levels.index[-8:]]).round(3).to_string())
+    print(f"当前市场系数 (相对训练参考周): {current_factors()}")
@@ -0,0 +1,211 @@
+# src/parse_cache.py
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import msgspec
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config # 导入配置文件
+from src.utils import PARSER_VERSION, parse_description, parse_description_fields, with_time_defaults
+
+# 描述解析结果的持久化缓存，ETL/训练与各 API worker 共享同一个 SQLite 文件 (config.PARSE_CACHE_PATH):
+#   - 键为 (解析器名称, 解析器版本, 描述文本的 SHA-1)；修改解析规则并递增版本号后旧结果自动失效
+#     API 的解析器为 'description' (utils.parse_description_fields，版本 utils.PARSER_VERSION)，
+#     ETL 的解析器为 'listing' (utils.extract_text_fields，版本 etl.LISTING_PARSER_VERSION)
+#   - 只缓存只取决于文本的字段；API 的 release_year 默认值随当前年份变化，由 parse_description_cached 在读取后补上
+#   - WAL 模式: 读不阻塞写，多个进程可以同时读；写入用 INSERT OR IGNORE，多个进程写同一条描述也没有问题
+#   - 数据库被锁超过 PARSE_CACHE_TIMEOUT 或无法打开时跳过缓存直接解析 (缓存只影响速度，不影响结果)
+# 单条解析 (parse) 前面还有一层进程内的 LRU；批量解析 (parse_many) 直接批量查询数据库，只解析未命中的描述。
+SCHEMA = """CREATE TABLE IF NOT EXISTS parse_results (
+    parser TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    digest BLOB NOT NULL,
+    fields TEXT NOT NULL,
+    PRIMARY KEY (parser, version, digest)
+) WITHOUT ROWID"""
+QUERY_CHUNK_SIZE = 900 # 每条 SELECT ... IN 的参数个数 (SQLite 默认上限 999)
+SCAN_FRACTION = 0.25 # 批量查询的描述数不少于已缓存条数的这个比例时，顺序读出当前版本的全部条目比逐块 IN 查询快约 3 倍
+WRITE_CHUNK_SIZE = 5000 # 每个写事务的行数，批量写入时不长时间占用写锁
+
+_encoder = msgspec.json.Encoder()
+_decoder = msgspec.json.Decoder(dict)
+_caches = {} # 解析器名称 → 当前进程共享的 ParseCache
+
+
+def text_digest(text):
+    return hashlib.sha1(text.encode('utf-8')).digest()
+
+
+class ParseCache:
+    def __init__(self, parser='description', version=PARSER_VERSION, parse_func=parse_description_fields,
+                 path=None, memory_size=None, timeout=None):
+        self.parser = parser
+        self.version = version
+        self.parse_func = parse_func # 描述 → 字段 dict (结果只能取决于文本)
+        self.path = Path(path or config.PARSE_CACHE_PATH)
+        self.memory_size = config.PARSE_CACHE_MEMORY_SIZE if memory_size is None else memory_size
+        self.timeout = config.PARSE_CACHE_TIMEOUT if timeout is None else timeout
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'errors': 0}
+        self._memory = OrderedDict() # 描述哈希 → 字段 dict
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._disabled = False
+
+    def _connection(self):
+        """当前进程的数据库连接 (fork 出的 worker 不复用父进程的连接)，无法使用时返回 None"""
+        if self._disabled:
+            return None
+        if self._conn is None or self._pid != os.getpid():
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA synchronous=NORMAL') # WAL 模式下不必每次提交都 fsync，断电最多丢失最近的缓存条目
+                conn.execute(SCHEMA)
+            except (sqlite3.Error, OSError) as e:
+                print(f"警告: 无法打开解析缓存 {self.path} ({e})，将直接解析描述。")
+                self._disabled = True
+                return None
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _select(self, digests):
+        """批量查询数据库，返回 {描述哈希: 字段 dict}"""
+        found = {}
+        key = (self.parser, self.version)
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return found
+            try:
+                if len(digests) > QUERY_CHUNK_SIZE and len(digests) >= SCAN_FRACTION * conn.execute(
+                        "SELECT COUNT(*) FROM parse_results WHERE parser = ? AND version = ?", key).fetchone()[0]:
+                    wanted = set(digests)
+                    rows = conn.execute("SELECT digest, fields FROM parse_results WHERE parser = ? AND version = ?", key)
+                    found.update((digest, _decoder.decode(fields)) for digest, fields in rows if digest in wanted)
+                    return found
+                for i in range(0, len(digests), QUERY_CHUNK_SIZE):
+                    chunk = digests[i:i + QUERY_CHUNK_SIZE]
+                    rows = conn.execute("SELECT digest, fields FROM parse_results WHERE parser = ? AND version = ? "
+                                        f"AND digest IN ({','.join('?' * len(chunk))})", [*key, *chunk])
+                    found.update((digest, _decoder.decode(fields)) for digest, fields in rows)
+            except sqlite3.Error:
+                self.stats['errors'] += 1
+        return found
+
+    def _insert(self, items):
+        """写入 [(描述哈希, 字段 dict)]；数据库被锁时放弃 (下次未命中时再写)"""
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                for i in range(0, len(items), WRITE_CHUNK_SIZE):
+                    with conn: # 每块一个事务
+                        conn.execute('BEGIN')
+                        conn.executemany("INSERT OR IGNORE INTO parse_results (parser, version, digest, fields) VALUES (?, ?, ?, ?)",
+                                         [(self.parser, self.version, digest, _encoder.encode(fields).decode('utf-8'))
+                                          for digest, fields in items[i:i + WRITE_CHUNK_SIZE]])
+            except sqlite3.Error:
+                self.stats['errors'] += 1
+
+    def parse(self, text):
+        """单条描述 → 字段 dict (返回新的 dict，调用方可以修改)"""
+        digest = text_digest(text)
+        with self._lock:
+            fields = self._memory.get(digest)
+            if fields is not None:
+                self._memory.move_to_end(digest)
+                self.stats['memory_hits'] += 1
+                return dict(fields)
+        fields = self._select([digest]).get(digest)
+        if fields is not None:
+            self.stats['disk_hits'] += 1
+        else:
+            self.stats['misses'] += 1
+            fields = self.parse_func(text)
+            self._insert([(digest, fields)])
+        with self._lock:
+            self._memory[digest] = fields
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+        return dict(fields)
+
+    def parse_many(self, texts, parse_missing=None):
+        """不重复的描述列表 → 等长的字段 dict 列表；只解析数据库中没有的描述
+
+        parse_missing: 解析未命中描述的函数 (描述列表 → parse_func 结果列表)，
+        ETL 用它把未命中的部分交给进程池；默认在当前进程逐条解析。
+        """
+        digests = [text_digest(text) for text in texts]
+        found = self._select(digests)
+        missing = [i for i, digest in enumerate(digests) if digest not in found]
+        self.stats['disk_hits'] += len(texts) - len(missing)
+        self.stats['misses'] += len(missing)
+        if missing:
+            texts_missing = [texts[i] for i in missing]
+            parsed = parse_missing(texts_missing) if parse_missing else [self.parse_func(t) for t in texts_missing]
+            computed = [(digests[i], fields) for i, fields in zip(missing, parsed)]
+            self._insert(computed)
+            found.update(computed)
+        return [dict(found[digest]) for digest in digests]
+
+    def prune(self):
+        """删除本解析器其他版本的条目，返回删除的行数"""
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return 0
+            with conn:
+                conn.execute('BEGIN')
+                return conn.execute("DELETE FROM parse_results WHERE parser = ? AND version != ?",
+                                    (self.parser, self.version)).rowcount
+
+    def summary(self):
+        """各 (解析器, 版本) 的条目数"""
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return {}
+            rows = conn.execute("SELECT parser, version, COUNT(*) FROM parse_results GROUP BY parser, version ORDER BY parser, version")
+            return {(parser, version): count for parser, version, count in rows}
+
+
+def get_parse_cache(parser='description', version=PARSER_VERSION, parse_func=parse_description_fields):
+    """当前进程中该解析器共享的 ParseCache (第一次使用时才打开数据库)"""
+    if parser not in _caches:
+        _caches[parser] = ParseCache(parser, version, parse_func)
+    return _caches[parser]
+
+
+def parse_description_cached(text):
+    """与 parse_description 结果相同，优先读缓存；PARSE_CACHE_ENABLED=False 时直接解析"""
+    if not config.PARSE_CACHE_ENABLED:
+        return parse_description(text)
+    return with_time_defaults(get_parse_cache().parse(text))
+
+
+if __name__ == "__main__":
+    # 用法: python src/parse_cache.py [--prune]
+    import argparse
+    from src.etl import listing_parse_cache
+    parser = argparse.ArgumentParser(description="查看或清理描述解析缓存")
+    parser.add_argument('--prune', action='store_true', help="删除旧解析器版本的条目")
+    args = parser.parse_args()
+    caches = [get_parse_cache(), listing_parse_cache()]
+    if args.prune:
+        print(f"删除旧版本条目 {sum(cache.prune() for cache in caches)} 条")
+    current = {(cache.parser, cache.version) for cache in caches}
+    path = caches[0].path
+    size = sum(p.stat().st_size for p in path.parent.glob(path.name + '*')) / 1024 ** 2 if path.exists() else 0.0
+    print(f"{path} ({size:.1f} MB)")
+    for (name, version), count in caches[0].summary().items():
+        print(f"  {name} 版本 {version}: {count} 条" + (" (当前)" if (name, version) in current else ""))
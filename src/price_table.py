@@ -0,0 +1,186 @@
+# src/price_table.py
+import numpy as np
+import pandas as pd
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config # 导入配置文件
+from src.utils import parse_ram # 导入辅助函数
+from src.ensemble import load_bundle, normalize_records, encode_features, predict_batch, DEFAULT_CPU_SCORE, TIER_BINS
+from src.drift_monitor import load_traffic # 线上采样请求 (统计查找表对真实流量的命中率)
+
+# 查找表的维度顺序 (与 config.PRICE_TABLE_GRID 的键对应，age 在构建时换算为 release_year)
+TABLE_AXES = ['brand', 'gpu_type', 'storage_type', 'screen_condition', 'battery_health', 'ram_size', 'cpu_score', 'release_year']
+TABLE_OUTPUTS = ['final', 'low', 'high']
+CPU_AXIS = TABLE_AXES.index('cpu_score')
+
+
+def _tier_index(values):
+    """性能等级的序号 (与 normalize_records 中 pd.cut(..., right=False) 的分箱一致)"""
+    return np.searchsorted(TIER_BINS[1:-1], values, side='right')
+
+
+def snap_cpu_scores(values, grid_points, tolerance=None):
+    """把连续的 cpu_score 吸附到最近的网格点，返回网格点数组 (无法吸附的为 NaN)
+
+    只在相对偏差不超过 tolerance 且性能等级相同时吸附 (跨等级会改变 performance_tier 特征，误差不可控)。
+    """
+    tolerance = config.PRICE_TABLE_CPU_TOLERANCE if tolerance is None else tolerance
+    values = np.asarray(values, dtype=float).reshape(-1)
+    points = np.asarray(grid_points, dtype=float)
+    deviation = np.abs(values[:, None] - points[None, :]) / points[None, :]
+    deviation[_tier_index(values)[:, None] != _tier_index(points)[None, :]] = np.inf
+    nearest = np.argmin(deviation, axis=1)
+    within = deviation[np.arange(len(values)), nearest] <= tolerance + 1e-12 # NaN 的偏差为 NaN，不会吸附
+    return np.where(within, points[nearest], np.nan)
+
+
+def _grid_axes(grid, build_year):
+    axes = []
+    for name in TABLE_AXES:
+        if name == 'release_year':
+            axes.append([int(build_year - age) for age in grid['age']])
+        else:
+            axes.append(list(grid[name]))
+    return axes
+
+
+def _make_index(axes):
+    return [{value: i for i, value in enumerate(values)} for values in axes]
+
+
+def build_price_table(bundle, grid, batch_size=50000, build_year=None):
+    """在枚举网格上分批向量化地评估完整的混合模型，返回查找表"""
+    build_year = build_year or datetime.now().year
+    axes = _grid_axes(grid, build_year)
+    shape = tuple(len(values) for values in axes)
+    total = int(np.prod(shape))
+    values = np.empty((total, len(TABLE_OUTPUTS)), dtype=np.float32)
+    axis_arrays = [np.asarray(v, dtype=object) for v in axes]
+
+    print(f"构建价格查找表: {total} 个网格点, 维度 {dict(zip(TABLE_AXES, shape))}")
+    start = time.perf_counter()
+    for begin in range(0, total, batch_size):
+        flat = np.arange(begin, min(begin + batch_size, total))
+        coords = np.unravel_index(flat, shape)
+        chunk = pd.DataFrame({name: axis_arrays[i][coords[i]] for i, name in enumerate(TABLE_AXES)})
+        normalized = normalize_records(chunk, current_year=build_year)
+        # 查表本身已是 O(1)，表中存完整混合模型的结果，不使用级联的近似
+        preds = predict_batch(bundle, encode_features(normalized, bundle['feature_names'], bundle['category_levels']), cascade=False)
+        values[flat] = np.column_stack([preds[k] for k in TABLE_OUTPUTS])
+    print(f"价格查找表构建完成，耗时 {time.perf_counter() - start:.2f}s")
+
+    return {
+        'axes': axes,
+        'index': _make_index(axes),
+        'values': values.reshape(shape + (len(TABLE_OUTPUTS),)),
+        'build_year': build_year,
+    }
+
+
+def save_price_table(table, path):
+    meta = {'axes': table['axes'], 'build_year': table['build_year'], 'outputs': TABLE_OUTPUTS}
+    np.savez(path, values=table['values'], meta=np.array(json.dumps(meta, ensure_ascii=False)))
+
+
+def load_price_table(path):
+    """加载查找表；文件不存在时返回 None"""
+    try:
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            values = data['values']
+    except FileNotFoundError:
+        return None
+    return {'axes': meta['axes'], 'index': _make_index(meta['axes']), 'values': values, 'build_year': meta['build_year']}
+
+
+def record_key(data, current_year=None):
+    """从单条请求中取出查找表的键 (与 normalize_records 的默认值一致)，无法确定时返回 None"""
+    current_year = current_year or datetime.now().year
+    try:
+        cpu_score = data.get('cpu_score', DEFAULT_CPU_SCORE)
+        cpu_score = DEFAULT_CPU_SCORE if cpu_score is None else float(cpu_score)
+        release_year = data.get('release_year', current_year - 2)
+        release_year = current_year - 2 if release_year is None else int(float(release_year))
+        ram_size = data['ram_size'] if 'ram_size' in data and 'ram_desc' not in data else parse_ram(data['ram_desc'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return (str(data.get('brand', 'Unknown')), str(data.get('gpu_type', 'Unknown')),
+            str(data.get('storage_type', 'Unknown')), str(data.get('screen_condition', 'Unknown')),
+            str(data.get('battery_health', 'Unknown')), ram_size, cpu_score, release_year)
+
+
+def lookup_price(table, data, tolerance=None):
+    """O(1) 查表: 命中时返回 (point, low, high)，未命中 (网格外或表已过期) 返回 None
+
+    cpu_score 按 snap_cpu_scores 吸附到最近的网格点，其余字段精确匹配。
+    """
+    current_year = datetime.now().year
+    if table is None or table['build_year'] != current_year:
+        return None
+    key = record_key(data, current_year)
+    if key is None:
+        return None
+    key = list(key)
+    key[CPU_AXIS] = snap_cpu_scores([key[CPU_AXIS]], table['axes'][CPU_AXIS], tolerance)[0]
+    position = []
+    for value, index in zip(key, table['index']):
+        i = index.get(value)
+        if i is None:
+            return None
+        position.append(i)
+    return tuple(float(v) for v in table['values'][tuple(position)])
+
+
+def table_coverage(table, normalized_df, tolerance=None):
+    """向量化计算一批规范化记录中能命中查找表的比例 (与 lookup_price 相同的匹配规则)"""
+    if table is None or len(normalized_df) == 0:
+        return 0.0
+    hit = np.ones(len(normalized_df), dtype=bool)
+    for name, values in zip(TABLE_AXES, table['axes']):
+        if name == 'cpu_score':
+            hit &= ~np.isnan(snap_cpu_scores(normalized_df[name], values, tolerance))
+        else:
+            hit &= normalized_df[name].isin(values).to_numpy()
+    return float(hit.mean())
+
+
+def traffic_coverage(table, log_dir=None, window_days=None):
+    """查找表对最近采样的线上请求的命中率，返回 (命中率, 请求数)；没有采样记录时为 (None, 0)"""
+    window_days = window_days or config.DRIFT_WINDOW_DAYS
+    traffic = load_traffic(log_dir or config.DRIFT_LOG_DIR, since=time.time() - window_days * 86400)
+    if traffic.empty:
+        return None, 0
+    return table_coverage(table, normalize_records(traffic, current_year=table['build_year'])), len(traffic)
+
+
+def rebuild_price_table(model_dir=None):
+    """用最新的模型组件重建查找表，并报告其对训练数据和线上采样请求的命中率"""
+    bundle = load_bundle(model_dir)
+    table = build_price_table(bundle, config.PRICE_TABLE_GRID, batch_size=config.PRICE_TABLE_BATCH_SIZE)
+    path = config.PRICE_TABLE_PATH if model_dir is None else Path(model_dir) / Path(config.PRICE_TABLE_PATH).name
+    save_price_table(table, path)
+    print(f"价格查找表已保存到 {path} ({table['values'].nbytes / 1024:.1f} KB)")
+
+    try:
+        df = pd.read_csv(config.RAW_DATA_PATH)
+        coverage = table_coverage(table, normalize_records(df))
+        print(f"查找表对 {config.RAW_DATA_PATH} 的覆盖率: {coverage * 100:.2f}%")
+    except FileNotFoundError:
+        print("未找到原始数据，跳过覆盖率统计。")
+    coverage, n_requests = traffic_coverage(table)
+    if n_requests:
+        print(f"查找表对最近 {config.DRIFT_WINDOW_DAYS} 天 {n_requests} 条采样请求的命中率: {coverage * 100:.2f}%")
+    else:
+        print(f"{config.DRIFT_LOG_DIR} 中没有采样请求，跳过线上命中率统计。")
+    return table
+
+
+if __name__ == "__main__":
+    rebuild_price_table()
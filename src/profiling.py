@@ -0,0 +1,257 @@
+# src/profiling.py
+import cProfile
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config # 导入配置文件
+
+# 训练流水线的分阶段性能分析 (python src/train_model.py --profile):
+# 特征工程和训练代码用 `with stage('名称'):` 标出各阶段 (未启用时是空操作)，每个阶段记录:
+#   - 墙钟时间和进程 CPU 时间 (包含 XGBoost/KNN 的工作线程，cpu_s / wall_s > 1 表示并行)
+#   - tracemalloc 峰值: 阶段内相对开始时多分配的内存峰值 (Python 对象和 numpy/pandas 数组，不含 XGBoost 内部内存)
+#   - RSS: 后台线程按 config.PROFILE_SAMPLE_INTERVAL 采样的常驻内存峰值 (仅 Linux)
+# 阶段可以嵌套，名称按路径记录 (如 feature_engineering/load_csv)；同一阶段多次进入时累加时间、取最大峰值。
+# dump='cprofile' 为每个阶段保存一个 .prof (只包含不属于子阶段的调用)；
+# dump='stacks' 按采样间隔记录主线程调用栈，写成 flamegraph.pl / speedscope 可读的折叠格式 (stacks.folded)。
+MB = 1024 ** 2
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+SKIPPED_FILES = {__file__, getattr(sys.modules.get('contextlib'), '__file__', None)}
+
+_profiler = None
+
+
+def read_rss():
+    """当前进程的常驻内存 (字节)，非 Linux 返回 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _Frame:
+    """一次进入阶段时的状态"""
+    __slots__ = ('path', 'alloc_start', 'alloc_peak', 'rss_start', 'rss_peak', 'profile')
+
+    def __init__(self, path):
+        self.path = path
+        self.alloc_start = self.alloc_peak = 0
+        self.rss_start = self.rss_peak = read_rss()
+        self.profile = None
+
+
+class StageProfiler:
+    def __init__(self, dump=None, trace_memory=True, sample_interval=None):
+        self.dump = dump # None / 'cprofile' / 'stacks'
+        self.trace_memory = trace_memory
+        self.sample_interval = sample_interval or config.PROFILE_SAMPLE_INTERVAL
+        self.meta = {}
+        self.stages = {} # 路径 → 汇总 (按首次进入的顺序)
+        self.profiles = {} # 路径 → cProfile.Profile
+        self.stacks = Counter() # 折叠后的调用栈 → 采样次数
+        self._stack = []
+        self._lock = threading.Lock()
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._started_tracemalloc = False
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._start_time = (time.perf_counter(), time.process_time())
+        self._sampler = threading.Thread(target=self._sample, name='stage-profiler', daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+        wall, cpu = time.perf_counter() - self._start_time[0], time.process_time() - self._start_time[1]
+        self.meta.update(wall_s=round(wall, 4), cpu_s=round(cpu, 4),
+                         max_rss_MB=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)) # Linux 上单位为 KB
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    def _sample(self):
+        while not self._stop.wait(self.sample_interval):
+            rss = read_rss()
+            with self._lock:
+                if not self._stack:
+                    continue
+                if rss is not None:
+                    for frame in self._stack:
+                        frame.rss_peak = max(frame.rss_peak, rss)
+                if self.dump == 'stacks':
+                    top = sys._current_frames().get(self._thread_id)
+                    if top is not None:
+                        self.stacks[self._fold(self._stack[-1].path, top)] += 1
+
+    @staticmethod
+    def _fold(path, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            if code.co_filename not in SKIPPED_FILES:
+                names.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ';'.join(path.split('/') + names[::-1]).replace(' ', '_')
+
+    @contextmanager
+    def stage(self, name):
+        parent = self._stack[-1] if self._stack else None
+        frame = _Frame(f"{parent.path}/{name}" if parent else name)
+        entry = self.stages.setdefault(frame.path, {'stage': frame.path, 'depth': frame.path.count('/'), 'calls': 0,
+                                                    'wall_s': 0.0, 'cpu_s': 0.0, 'peak_alloc_MB': None,
+                                                    'rss_start_MB': None, 'rss_peak_MB': None, 'rss_growth_MB': None})
+        if parent is not None:
+            if parent.profile is not None:
+                parent.profile.disable() # 父阶段的 .prof 只记录不属于子阶段的调用
+            if self.trace_memory:
+                parent.alloc_peak = max(parent.alloc_peak, tracemalloc.get_traced_memory()[1])
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            frame.alloc_start = frame.alloc_peak = tracemalloc.get_traced_memory()[0]
+        with self._lock:
+            self._stack.append(frame)
+        if self.dump == 'cprofile':
+            frame.profile = self.profiles.setdefault(frame.path, cProfile.Profile())
+            frame.profile.enable()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            if frame.profile is not None:
+                frame.profile.disable()
+            with self._lock:
+                self._stack.pop()
+            if self.trace_memory:
+                frame.alloc_peak = max(frame.alloc_peak, tracemalloc.get_traced_memory()[1])
+            self._record(entry, frame, wall, cpu)
+            if parent is not None:
+                if self.trace_memory:
+                    # 子阶段重置过峰值，父阶段的峰值至少包含子阶段的峰值
+                    parent.alloc_peak = max(parent.alloc_peak, frame.alloc_peak)
+                    tracemalloc.reset_peak()
+                if parent.profile is not None:
+                    parent.profile.enable()
+
+    def _record(self, entry, frame, wall, cpu):
+        entry['calls'] += 1
+        entry['wall_s'] += wall
+        entry['cpu_s'] += cpu
+        if self.trace_memory:
+            entry['peak_alloc_MB'] = max(entry['peak_alloc_MB'] or 0.0, (frame.alloc_peak - frame.alloc_start) / MB)
+        rss_end = read_rss()
+        if rss_end is not None:
+            rss_peak = max(frame.rss_peak, rss_end)
+            if entry['rss_start_MB'] is None:
+                entry['rss_start_MB'] = frame.rss_start / MB
+            entry['rss_peak_MB'] = max(entry['rss_peak_MB'] or 0.0, rss_peak / MB)
+            entry['rss_growth_MB'] = max(entry['rss_growth_MB'] or 0.0, (rss_peak - frame.rss_start) / MB)
+
+    def summary(self):
+        stages = [dict(entry) for entry in self.stages.values()]
+        top_level_wall = sum(entry['wall_s'] for entry in stages if entry['depth'] == 0) or 1.0
+        for entry in stages:
+            entry['cpu_util'] = entry['cpu_s'] / entry['wall_s'] if entry['wall_s'] else None
+            entry['share'] = entry['wall_s'] / top_level_wall
+            for key, value in entry.items():
+                if isinstance(value, float):
+                    entry[key] = round(value, 4)
+        meta = dict(self.meta, created_at=datetime.now().isoformat(timespec='seconds'), python=platform.python_version(),
+                    cpu_count=os.cpu_count(), trace_memory=self.trace_memory, dump=self.dump)
+        return {'meta': meta, 'stages': stages}
+
+    def write(self, output_dir=None):
+        """写入 summary.json (以及 .prof 或 stacks.folded)，返回输出目录"""
+        rows = self.meta.get('rows', 'unknown')
+        output_dir = Path(output_dir or config.PROFILE_DIR) / f"{datetime.now():%Y%m%d_%H%M%S}_{rows}rows"
+        output_dir.mkdir(parents=True, exist_ok=True)
+        with open(output_dir / 'summary.json', 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        for path, profile in self.profiles.items():
+            profile.dump_stats(output_dir / f"{path.replace('/', '.')}.prof")
+        if self.stacks:
+            with open(output_dir / 'stacks.folded', 'w', encoding='utf-8') as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+        return output_dir
+
+
+# --- 模块级接口 (训练代码只需要 stage / set_profile_meta) ---
+def enable_profiling(dump=None, trace_memory=True, sample_interval=None):
+    global _profiler
+    _profiler = StageProfiler(dump, trace_memory, sample_interval)
+    _profiler.start()
+    return _profiler
+
+
+def disable_profiling():
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+
+def stage(name):
+    """标出一个阶段；未启用性能分析时为空操作"""
+    return _profiler.stage(name) if _profiler is not None else nullcontext()
+
+
+def set_profile_meta(**meta):
+    """记录数据规模等信息 (写入 summary.json 的 meta)，未启用时忽略"""
+    if _profiler is not None:
+        _profiler.meta.update(meta)
+
+
+def format_summary(summary):
+    df = pd.DataFrame(summary['stages'])
+    names = ['  ' * depth + path.rsplit('/', 1)[-1] for depth, path in zip(df['depth'], df['stage'])]
+    df['stage'] = [name.ljust(max(map(len, names))) for name in names] # 左对齐以显示嵌套层级
+    columns = ['stage', 'calls', 'wall_s', 'cpu_s', 'cpu_util', 'share', 'peak_alloc_MB', 'rss_peak_MB', 'rss_growth_MB']
+    return df.reindex(columns=columns).to_string(index=False, na_rep='-', float_format=lambda v: f"{v:.2f}")
+
+
+def compare_summaries(paths, value='wall_s'):
+    """多个 summary.json 按阶段对齐比较 (列为各次运行的数据行数)"""
+    columns, order = {}, {}
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            summary = json.load(f)
+        label = f"{summary['meta'].get('rows', '?')} rows"
+        if label in columns:
+            label = f"{label} ({Path(path).parent.name})"
+        columns[label] = pd.Series({entry['stage']: entry[value] for entry in summary['stages']})
+        order.update(dict.fromkeys(columns[label].index))
+    return pd.DataFrame(columns).reindex(list(order)) # 保持流水线中的阶段顺序
+
+
+if __name__ == "__main__":
+    # 用法: python src/profiling.py [--value wall_s|cpu_s|peak_alloc_MB|rss_peak_MB ...] summary.json [summary.json ...]
+    import argparse
+    parser = argparse.ArgumentParser(description="比较不同数据规模下训练各阶段的耗时和内存")
+    parser.add_argument('summaries', nargs='+')
+    parser.add_argument('--value', default='wall_s')
+    args = parser.parse_args()
+    if len(args.summaries) == 1:
+        with open(args.summaries[0], encoding='utf-8') as f:
+            print(format_summary(json.load(f)))
+    else:
+        print(compare_summaries(args.summaries, args.value).to_string(na_rep='-', float_format=lambda v: f"{v:.2f}"))
@@ -0,0 +1,151 @@
+# src/region.py
+import numpy as np
+import pandas as pd
+import joblib
+import ipaddress
+import re
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config # 导入配置文件
+
+DEFAULT_COEFFICIENT = 1.0
+
+
+def normalize_region(location):
+    """把 location 字段 (如 '北京市 朝阳区'、'浙江|杭州') 归一化为地区名"""
+    if not isinstance(location, str) or not location.strip():
+        return None
+    first = re.split(r'[\s|/,，\-]+', location.strip())[0]
+    return re.sub(r'(省|市|自治区|特别行政区)$', '', first) or None
+
+
+def _ip_to_int(value):
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(ipaddress.IPv4Address(str(value).strip()))
+
+
+def load_region_index(ip_ranges_path=None, coefficients_path=None):
+    """加载 IP 段→地区表和地区→系数表，构建按起始 IP 排序的 NumPy 数组
+
+    IP 段表字段: start_ip, end_ip, region (IP 可以是点分十进制或整数)
+    系数表字段: region, coefficient
+    任一文件缺失时返回 None (所有请求使用默认系数 1.0)。
+    """
+    try:
+        ranges = pd.read_csv(ip_ranges_path or config.REGION_IP_RANGES_PATH)
+        coefficients = pd.read_csv(coefficients_path or config.REGION_COEFFICIENTS_PATH)
+    except FileNotFoundError:
+        return None
+
+    regions = sorted(set(ranges['region'].astype(str)) | set(coefficients['region'].astype(str)))
+    region_code = {name: i for i, name in enumerate(regions)}
+    coef_by_region = np.full(len(regions), DEFAULT_COEFFICIENT, dtype=np.float32)
+    for name, coef in zip(coefficients['region'].astype(str), coefficients['coefficient']):
+        coef_by_region[region_code[name]] = coef
+
+    starts = np.array([_ip_to_int(v) for v in ranges['start_ip']], dtype=np.uint32)
+    order = np.argsort(starts, kind='stable')
+    return {
+        'starts': starts[order],
+        'ends': np.array([_ip_to_int(v) for v in ranges['end_ip']], dtype=np.uint32)[order],
+        'codes': np.array([region_code[r] for r in ranges['region'].astype(str)], dtype=np.int32)[order],
+        'regions': regions,
+        'coefficients': coef_by_region,
+    }
+
+
+@lru_cache(maxsize=1)
+def _default_index():
+    return load_region_index()
+
+
+def lookup_region(index, ip_address):
+    """O(log n) 二分查找 IP 所在地区，返回 (地区名, 系数)；查不到时返回 (None, 1.0)"""
+    if index is None or not ip_address:
+        return None, DEFAULT_COEFFICIENT
+    try:
+        ip = _ip_to_int(ip_address)
+    except ValueError: # IPv6 或非法地址
+        return None, DEFAULT_COEFFICIENT
+    i = int(np.searchsorted(index['starts'], ip, side='right')) - 1
+    if i < 0 or ip > index['ends'][i]:
+        return None, DEFAULT_COEFFICIENT
+    code = index['codes'][i]
+    return index['regions'][code], float(index['coefficients'][code])
+
+
+@lru_cache(maxsize=config.REGION_IP_CACHE_SIZE)
+def get_region_coefficient(ip_address):
+    """按客户端 IP 返回地区价格系数 (热门 IP 结果缓存在 LRU 中)"""
+    return lookup_region(_default_index(), ip_address)[1]
+
+
+# --- 离线任务: 根据带 location 的成交数据推导地区系数 ---
+def save_holdout_predictions(index, actual, predicted):
+    """训练时保存测试集 (模型未在其上训练) 的实际价格和混合模型预测，附带原始数据中的 location
+
+    actual 为训练目标 (已按市场指数换算到参考周)，与 predicted 处于同一价格尺度；
+    特征工程保留了原始数据的行索引，location 按行号从原始数据中取。
+    """
+    holdout = pd.DataFrame({'actual_price': np.asarray(actual, dtype=float), 'predicted': np.asarray(predicted, dtype=float)}, index=index)
+    try:
+        location = pd.read_csv(config.RAW_DATA_PATH, usecols=lambda c: c == 'location')
+        holdout = holdout.join(location.reindex(index))
+    except (FileNotFoundError, ValueError):
+        pass
+    if 'location' not in holdout.columns:
+        holdout['location'] = np.nan
+    joblib.dump(holdout, config.REGION_HOLDOUT_PATH)
+    print(f"测试集预测已保存到 {config.REGION_HOLDOUT_PATH} ({len(holdout)} 条，其中 {int(holdout['location'].notna().sum())} 条有 location)")
+
+
+def derive_region_coefficients(df, predicted, shrinkage=None, min_count=None):
+    """地区系数 = 实际价格/模型预测价格 的中位数，并按样本量向 1.0 收缩
+
+    predicted 必须是样本外预测 (模型训练时未见过这些帖子)，且与 actual_price 处于同一价格尺度
+    (市场指数归一化后)；样本内预测几乎复现训练价格，比值会被压向 1.0。
+    coefficient = (n * median_ratio + k * 1.0) / (n + k)，k 为收缩强度，
+    样本少的地区系数接近 1.0，避免被个别报价带偏。
+    """
+    shrinkage = config.REGION_SHRINKAGE if shrinkage is None else shrinkage
+    min_count = config.REGION_MIN_COUNT if min_count is None else min_count
+    frame = pd.DataFrame({
+        'region': df['location'].map(normalize_region),
+        'ratio': np.asarray(df['actual_price'], dtype=float) / np.maximum(np.asarray(predicted, dtype=float), 1.0),
+    }).dropna()
+    stats = frame.groupby('region')['ratio'].agg(['median', 'count']).reset_index()
+    stats = stats[stats['count'] >= min_count]
+    stats['coefficient'] = (stats['count'] * stats['median'] + shrinkage) / (stats['count'] + shrinkage)
+    return stats.rename(columns={'count': 'n_listings', 'median': 'median_ratio'})[['region', 'coefficient', 'n_listings', 'median_ratio']]
+
+
+def run_region_calibration(holdout_path=None):
+    """用训练时保存的测试集预测 (样本外、市场归一化后的价格尺度) 推导并保存地区系数表"""
+    holdout_path = holdout_path or config.REGION_HOLDOUT_PATH
+    print(f"推导地区价格系数 (测试集预测: {holdout_path})...")
+    try:
+        df = joblib.load(holdout_path)
+    except FileNotFoundError:
+        print("错误: 未找到测试集预测，请先运行 src/train_model.py。")
+        return None
+    df = df.dropna(subset=['location', 'actual_price', 'predicted'])
+    if df.empty:
+        print("错误: 训练数据中没有 location 字段，无法推导地区系数。")
+        return None
+
+    coefficients = derive_region_coefficients(df, df['predicted'])
+    coefficients.to_csv(config.REGION_COEFFICIENTS_PATH, index=False)
+    print(coefficients.sort_values('n_listings', ascending=False).head(20).to_string(index=False))
+    print(f"地区系数已保存到 {config.REGION_COEFFICIENTS_PATH} ({len(coefficients)} 个地区)")
+    return coefficients
+
+
+if __name__ == "__main__":
+    # 可选参数: 测试集预测文件 (默认 config.REGION_HOLDOUT_PATH，由 train_model.py 生成)
+    run_region_calibration(sys.argv[1] if len(sys.argv) > 1 else None)
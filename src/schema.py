@@ -0,0 +1,106 @@
+# src/schema.py
+import msgspec
+from datetime import datetime
+from typing import Annotated, Optional, Union
+
+import config # 导入配置文件
+from src.parse_cache import parse_description_cached # 与 parse_description 相同，结果在 worker 之间共享缓存
+
+# /predict 与 /explain 的请求结构: 由 msgspec 直接把 JSON 字节解码为 Struct 并按类型和取值范围校验，
+# 在任何 pandas 处理之前用精确的 400 错误拒绝无效输入 (如 "Expected `int`, got `str` - at `$.release_year`")。
+# strict=False: 兼容以字符串传数字的旧客户端 ("2021" → 2021)，但 "abc" 这样的值会被拒绝而不是静默回退到默认值。
+# 未知字段忽略；值为 null 的字段视为未提供。
+# release_year 的上限 (明年) 随时间变化，不能写进类型注解 (进程跨年运行时会拒绝合法的新机型)，由 check_release_year 按请求检查。
+ShortText = Annotated[str, msgspec.Meta(max_length=64)]
+Year = Annotated[int, msgspec.Meta(ge=1980)]
+CpuScore = Annotated[float, msgspec.Meta(ge=0, le=100000)]
+RamSize = Annotated[float, msgspec.Meta(gt=0, le=1024)]
+Description = Annotated[str, msgspec.Meta(max_length=config.REQUEST_MAX_DESCRIPTION_LENGTH)]
+
+
+class PredictRequest(msgspec.Struct):
+    brand: Optional[ShortText] = None
+    release_year: Optional[Year] = None
+    cpu_score: Optional[CpuScore] = None
+    gpu_type: Optional[ShortText] = None
+    ram_desc: Optional[ShortText] = None
+    ram_size: Optional[RamSize] = None
+    storage_type: Optional[ShortText] = None
+    screen_condition: Optional[ShortText] = None
+    battery_health: Optional[ShortText] = None
+    description: Optional[Description] = None
+
+
+class RequestError(ValueError):
+    """请求体无法解码或不符合 PredictRequest，返回 400"""
+
+
+REQUEST_FIELDS = PredictRequest.__struct_fields__
+_request_decoder = msgspec.json.Decoder(PredictRequest, strict=False)
+_batch_decoder = msgspec.json.Decoder(Union[PredictRequest, list[PredictRequest]], strict=False)
+_encoder = msgspec.json.Encoder()
+
+
+def canonical_record(req):
+    """Struct → 模型输入字段 (只构造一次 dict)
+
+    有描述时，解析结果只填补请求中没有给出的字段；请求给出 ram_size 时不再用描述中的内存覆盖它。
+    """
+    data = {name: value for name in REQUEST_FIELDS if (value := getattr(req, name)) is not None}
+    if req.description is not None:
+        print("解析文本描述...")
+        parsed = parse_description_cached(req.description)
+        if 'ram_size' in data:
+            parsed.pop('ram_desc', None)
+        for name in REQUEST_FIELDS:
+            if name not in data and parsed.get(name) is not None:
+                data[name] = parsed[name]
+    if 'ram_desc' not in data and 'ram_size' not in data:
+        raise RequestError("缺少内存信息: 需要 ram_desc、ram_size 或 description 之一")
+    return data
+
+
+def check_release_year(req, path='$'):
+    """release_year 不能晚于明年 (按处理请求时的日期)，错误信息与 msgspec 的格式一致"""
+    max_year = datetime.now().year + 1
+    if req.release_year is not None and req.release_year > max_year:
+        raise RequestError(f"请求字段无效: Expected `int` <= {max_year} - at `{path}.release_year`")
+
+
+def decode_request(body):
+    """JSON 字节 → 模型输入字段 dict，无效时抛出 RequestError"""
+    try:
+        req = _request_decoder.decode(body)
+    except msgspec.ValidationError as e:
+        raise RequestError(f"请求字段无效: {e}") from None
+    except msgspec.DecodeError as e:
+        raise RequestError(f"请求体不是有效的 JSON: {e}") from None
+    check_release_year(req)
+    return canonical_record(req)
+
+
+def decode_batch(body, max_batch):
+    """单个请求或请求列表 → (字段 dict 列表, 是否为列表)"""
+    try:
+        decoded = _batch_decoder.decode(body)
+    except msgspec.ValidationError as e:
+        raise RequestError(f"请求字段无效: {e}") from None
+    except msgspec.DecodeError as e:
+        raise RequestError(f"请求体不是有效的 JSON: {e}") from None
+    is_list = isinstance(decoded, list)
+    requests = decoded if is_list else [decoded]
+    if not 1 <= len(requests) <= max_batch:
+        raise RequestError(f"请求列表应包含 1-{max_batch} 个对象")
+    records = []
+    for i, req in enumerate(requests):
+        check_release_year(req, f'$[{i}]' if is_list else '$')
+        try:
+            records.append(canonical_record(req))
+        except RequestError as e:
+            raise RequestError(f"{e} - at `$[{i}]`" if is_list else str(e)) from None
+    return records, is_list
+
+
+def encode_response(obj):
+    """响应对象 → JSON 字节 (UTF-8，不转义中文)"""
+    return _encoder.encode(obj)
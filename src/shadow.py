@@ -0,0 +1,181 @@
+# src/shadow.py
+import numpy as np
+import pandas as pd
+import itertools
+import os
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config # 导入配置文件
+from src.ensemble import normalize_records, encode_features, predict_batch
+
+# 影子模式: API 在主模型之外加载一个候选模型组件 (config.SHADOW_MODEL_DIR)，
+# 对采样的请求在响应发送之后由后台线程批量用候选模型打分，两者的预测写入定长二进制日志，
+# 离线运行 `python src/shadow.py` 比较，再决定是否把候选模型替换为主模型。
+SHADOW_DTYPE = np.dtype([
+    ('ts', 'f8'),
+    ('primary', 'f4'), ('primary_low', 'f4'), ('primary_high', 'f4'),
+    ('candidate', 'f4'), ('candidate_low', 'f4'), ('candidate_high', 'f4'),
+    ('candidate_ms', 'f4'), # 批量打分时为该批的平均每条耗时
+    ('brand', 'U24'), ('performance_tier', 'U12'),
+    ('cpu_score', 'f4'), ('release_year', 'f4'), ('ram_size', 'f4'),
+])
+
+
+class ShadowScorer:
+    """用候选模型组件异步给采样请求打分，结果追加到每个 worker 各自的 shadow_{pid}.bin
+
+    请求线程只做计数器取模和一次入队；后台线程把积压的请求攒成一批 (最多 batch_size 条，
+    最多等待 batch_wait 秒) 一次调用 predict_batch，批量打分的开销远小于逐条打分。
+    后台线程以最低调度优先级运行，候选模型只用单线程预测，积压超过 max_pending 时直接丢弃，
+    保证候选模型变慢或出错都不会影响主模型的响应。
+    """
+
+    def __init__(self, candidate_bundle, log_dir, sample_every=1, workers=1, max_pending=1000, batch_size=64, batch_wait=0.05):
+        self.bundle = _single_threaded(candidate_bundle)
+        self.log_dir = Path(log_dir)
+        self.sample_every = max(int(sample_every), 1)
+        self.workers = max(int(workers), 1)
+        self.max_pending = int(max_pending)
+        self.batch_size = int(batch_size)
+        self.batch_wait = float(batch_wait)
+        self.stats = {'submitted': 0, 'scored': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+        self._counter = itertools.count()
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+
+    def submit(self, data, primary, low, high):
+        """提交一次影子打分 (应在响应发送之后调用，如 Flask 的 response.call_on_close)"""
+        if next(self._counter) % self.sample_every:
+            return
+        if self._pid != os.getpid(): # gunicorn fork 之后需要在子进程中重启后台线程和日志文件
+            self._start()
+        if self._queue.qsize() >= self.max_pending:
+            self.stats['dropped'] += 1
+            return
+        self.stats['submitted'] += 1
+        self._queue.put((time.time(), dict(data), primary, low, high))
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.log_dir.mkdir(parents=True, exist_ok=True)
+            self._queue = queue.SimpleQueue()
+            self._file = open(self.log_dir / f'shadow_{os.getpid()}.bin', 'ab', buffering=0)
+            for i in range(self.workers):
+                threading.Thread(target=self._worker, name=f'shadow-{i}', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19) # Linux 下只降低本线程的优先级
+        except (AttributeError, OSError):
+            pass
+        while True:
+            batch = self._next_batch()
+            try:
+                self._score(batch)
+            except Exception as e:
+                self.stats['failed'] += len(batch)
+                print(f"影子模型打分失败: {e}")
+
+    def _score(self, batch):
+        start = time.perf_counter()
+        normalized = normalize_records([item[1] for item in batch])
+        preds = predict_batch(self.bundle, encode_features(normalized, self.bundle['feature_names'], self.bundle['category_levels']))
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(batch)
+        records = np.zeros(len(batch), dtype=SHADOW_DTYPE)
+        records['ts'] = [item[0] for item in batch]
+        records['primary'] = [item[2] for item in batch]
+        records['primary_low'] = [item[3] for item in batch]
+        records['primary_high'] = [item[4] for item in batch]
+        records['candidate'], records['candidate_low'], records['candidate_high'] = preds['final'], preds['low'], preds['high']
+        records['candidate_ms'] = elapsed_ms
+        records['brand'] = normalized['brand'].str.slice(0, 24).to_numpy()
+        records['performance_tier'] = normalized['performance_tier'].astype(str).to_numpy()
+        for column in ('cpu_score', 'release_year', 'ram_size'):
+            records[column] = pd.to_numeric(normalized[column], errors='coerce').to_numpy(dtype=float)
+        with self._lock:
+            self._file.write(records.tobytes()) # 无缓冲的单次追加写
+            self.stats['scored'] += len(batch)
+            self.stats['batches'] += 1
+
+
+def _single_threaded(bundle):
+    """候选模型预测时只用一个线程，避免与主模型争抢 CPU"""
+    for name in ('xgb', 'xgb_quantile', 'knn'):
+        model = bundle.get(name)
+        if model is not None and 'n_jobs' in model.get_params():
+            model.set_params(n_jobs=1)
+    return bundle
+
+
+# --- 离线任务: 比较主模型与候选模型的预测 ---
+def load_shadow_log(log_dir=None):
+    frames = [pd.DataFrame(np.fromfile(path, dtype=SHADOW_DTYPE)) for path in sorted(Path(log_dir or config.SHADOW_LOG_DIR).glob('shadow_*.bin'))]
+    if not frames:
+        return pd.DataFrame(np.empty(0, dtype=SHADOW_DTYPE))
+    df = pd.concat(frames, ignore_index=True).sort_values('ts', ignore_index=True)
+    df['ts'] = pd.to_datetime(df['ts'], unit='s')
+    return df
+
+
+def compare_shadow(df):
+    """汇总候选模型相对主模型的差异 (整体和按品牌/性能等级)"""
+    relative = (df['candidate'] - df['primary']) / df['primary'].clip(lower=1.0)
+    df = df.assign(relative_diff=relative, abs_relative_diff=relative.abs(),
+                   width_ratio=(df['candidate_high'] - df['candidate_low']) / (df['primary_high'] - df['primary_low']).clip(lower=1.0))
+    summary = {
+        'n': len(df),
+        'mean_relative_diff': float(df['relative_diff'].mean()),
+        'median_abs_relative_diff': float(df['abs_relative_diff'].median()),
+        'share_diff_over_10pct': float((df['abs_relative_diff'] > 0.1).mean()),
+        'mean_interval_width_ratio': float(df['width_ratio'].mean()),
+        'candidate_ms_p50': float(df['candidate_ms'].quantile(0.5)),
+        'candidate_ms_p99': float(df['candidate_ms'].quantile(0.99)),
+    }
+    by_segment = {
+        column: df.groupby(column).agg(n=('primary', 'size'), mean_relative_diff=('relative_diff', 'mean'),
+                                       median_abs_relative_diff=('abs_relative_diff', 'median')).sort_values('n', ascending=False)
+        for column in ('brand', 'performance_tier')
+    }
+    return summary, by_segment
+
+
+if __name__ == "__main__":
+    # 用法: python src/shadow.py [影子日志目录，默认 config.SHADOW_LOG_DIR]
+    shadow_df = load_shadow_log(sys.argv[1] if len(sys.argv) > 1 else None)
+    if shadow_df.empty:
+        print("没有影子模式记录。请设置 OCV_SHADOW_MODEL_DIR 启动 API 并等待流量。")
+        sys.exit(0)
+    summary, by_segment = compare_shadow(shadow_df)
+    print(f"影子模式记录 {summary['n']} 条 ({shadow_df['ts'].min()} ~ {shadow_df['ts'].max()})")
+    print(f"候选/主模型 平均相对差异: {summary['mean_relative_diff']:+.2%}，绝对相对差异中位数: {summary['median_abs_relative_diff']:.2%}，"
+          f"差异超过 10% 的比例: {summary['share_diff_over_10pct']:.2%}")
+    print(f"价格区间宽度比 (候选/主): {summary['mean_interval_width_ratio']:.3f}，"
+          f"候选模型耗时 p50 {summary['candidate_ms_p50']:.1f} ms / p99 {summary['candidate_ms_p99']:.1f} ms")
+    for column, table in by_segment.items():
+        print(f"\n按 {column}:")
+        print(table.head(10).to_string(float_format=lambda v: f"{v:.4f}"))
@@ -0,0 +1,328 @@
+# src/train_model.py
+import pandas as pd
+import numpy as np
+import xgboost as xgb
+from sklearn.neighbors import KNeighborsRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import train_test_split, GroupShuffleSplit
+import joblib
+import argparse
+import sys
+from pathlib import Path
+
+# 添加src目录到Python路径
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.utils import smape # 导入评估指标
+from src.ensemble import widen_interval # 分位数区间的共形校准
+from src.linear_fusion import fuse_linear_components, predict_fused, unscale_features # 线性组件折叠
+from src.price_table import rebuild_price_table # 预计算价格查找表
+from src.evaluation import run_segment_evaluation # 分段评估报告
+from src.explain import save_knn_listings # /explain 展示的近邻帖子
+from src.region import save_holdout_predictions # 地区系数用的样本外预测
+from src.drift_monitor import save_prediction_profile # 预测漂移的参照分布
+from src.cascade import train_cascade # 级联推理
+from src.feature_engineering import run_feature_engineering # 可以直接调用特征工程
+from src.profiling import stage, set_profile_meta, enable_profiling, disable_profiling, format_summary # 分阶段性能分析
+import config # 导入配置文件
+
+
+def fit_interval_conformal(lower, upper, y, coverage):
+    """分割共形校准 (按区间宽度缩放的 CQR)
+
+    在分位数模型训练时未见过的校准集上，求使 [lower - scale×宽度, upper + scale×宽度] 覆盖率
+    不低于 coverage 的最小 scale (含有限样本修正)。返回保存到 PRICE_INTERVAL_CONFORMAL_PATH 的 dict。
+    """
+    scores = np.maximum(lower - y, y - upper) / np.maximum(upper - lower, 1.0)
+    n = len(scores)
+    level = min(1.0, np.ceil((n + 1) * coverage) / n)
+    scale = max(float(np.quantile(scores, level, method='higher')), -0.5) # 不小于 -0.5，收窄后上下界不交叉
+    return {'scale': scale, 'coverage': coverage, 'calibration_size': n}
+
+
+def train_and_evaluate():
+    print("开始模型训练...")
+    # --- 1. 获取数据 ---
+    # 可以直接调用特征工程函数获取X, y
+    with stage('feature_engineering'):
+        X, y, groups = run_feature_engineering()
+    if X is None or y is None:
+        print("错误：特征工程失败，无法进行训练。")
+        return
+
+    # 或者加载之前保存的处理后数据
+    # try:
+    #     processed_data = pd.read_csv(config.PROCESSED_DATA_PATH)
+    #     feature_names = joblib.load(config.FEATURE_NAMES_PATH)
+    #     X = processed_data[feature_names]
+    #     y = processed_data['actual_price']
+    # except FileNotFoundError:
+    #     print(f"错误: 处理后的数据或特征名文件未找到。请先运行 feature_engineering.py")
+    #     return
+
+    feature_names = list(X.columns) # 获取最新的特征名
+    set_profile_meta(rows=len(X), features=X.shape[1], mode=config.FEATURE_ENGINEERING_MODE)
+
+    # --- 2. 数据集划分 ---
+    with stage('split'):
+        if groups is not None and groups.nunique() < len(groups):
+            # 保留了重发帖子 (DEDUP_MODE='group')：同一簇的帖子必须落在同一侧，避免测试集泄漏
+            train_idx, test_idx = next(GroupShuffleSplit(n_splits=1, test_size=0.2, random_state=42).split(X, y, groups))
+            X_train, X_test, y_train, y_test = X.iloc[train_idx], X.iloc[test_idx], y.iloc[train_idx], y.iloc[test_idx]
+            groups_train = groups.iloc[train_idx]
+            print(f"按重发簇划分数据集 ({groups.nunique()} 个簇)")
+        else:
+            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+            groups_train = None
+    print(f"训练集大小: {X_train.shape}, 测试集大小: {X_test.shape}")
+
+    # --- 3. 训练各模型 (同之前步骤三的代码) ---
+    models = {}
+    predictions = {}
+    smapes = {}
+
+    # XGBoost
+    print("训练 XGBoost...")
+    xgb_params = dict(config.XGB_PARAMS) # 使用配置文件中的参数
+    if any(isinstance(dtype, pd.CategoricalDtype) for dtype in X_train.dtypes):
+        # 紧凑特征模式: 类别列直接交给 XGBoost 原生类别支持
+        xgb_params.update(enable_categorical=True, tree_method='hist')
+    xgb_model = xgb.XGBRegressor(**xgb_params)
+    # eval_metric 和 early_stopping_rounds 通过 config.XGB_PARAMS 传入构造函数 (xgboost>=2.0 已不再接受 fit 参数)
+    with stage('xgb_fit'):
+        xgb_model.fit(X_train, y_train, eval_set=[(X_test, y_test)], verbose=False)
+    models['xgb'] = xgb_model
+    with stage('xgb_predict'):
+        predictions['xgb'] = xgb_model.predict(X_test)
+    smapes['xgb'] = smape(y_test, predictions['xgb'])
+    print(f"XGBoost Test sMAPE: {smapes['xgb']:.2f}%")
+    joblib.dump(xgb_model, config.XGB_MODEL_PATH)
+    print(f"XGBoost 模型已保存到 {config.XGB_MODEL_PATH}")
+
+    # XGBoost 分位数模型 (一个模型同时输出上下分位数，用于价格区间)
+    print("训练 XGBoost 分位数模型...")
+    q_low, q_high = config.PRICE_INTERVAL_QUANTILES
+    quantile_params = {k: v for k, v in xgb_params.items() if k not in ('objective', 'eval_metric', 'early_stopping_rounds')}
+    quantile_params.update(objective='reg:quantileerror', quantile_alpha=np.array([q_low, q_high]))
+    interval_conformal = None
+    try:
+        # 训练集中再留出一部分作为共形校准集 (分位数模型不在其上训练)；保留重发帖子时按簇留出
+        calibration_fraction = config.PRICE_INTERVAL_CALIBRATION_FRACTION
+        if calibration_fraction <= 0:
+            fit_idx, calibration_idx = np.arange(len(X_train)), None
+        elif groups_train is not None:
+            fit_idx, calibration_idx = next(GroupShuffleSplit(n_splits=1, test_size=calibration_fraction, random_state=42)
+                                            .split(X_train, y_train, groups_train))
+        else:
+            fit_idx, calibration_idx = train_test_split(np.arange(len(X_train)), test_size=calibration_fraction, random_state=42)
+        xgb_quantile_model = xgb.XGBRegressor(**quantile_params)
+        with stage('xgb_quantile_fit'):
+            xgb_quantile_model.fit(X_train.iloc[fit_idx], y_train.iloc[fit_idx], verbose=False)
+        models['xgb_quantile'] = xgb_quantile_model
+        with stage('xgb_quantile_predict'):
+            predictions['xgb_quantile'] = np.sort(xgb_quantile_model.predict(X_test), axis=1) # 防止分位数交叉
+        if calibration_idx is not None:
+            calibration_pred = np.sort(xgb_quantile_model.predict(X_train.iloc[calibration_idx]), axis=1)
+            interval_conformal = fit_interval_conformal(calibration_pred[:, 0], calibration_pred[:, 1],
+                                                        y_train.iloc[calibration_idx].to_numpy(dtype=float), q_high - q_low)
+            print(f"分位数区间共形校准: 校准集 {interval_conformal['calibration_size']} 条，两端各外扩 {interval_conformal['scale']:+.3f} × 区间宽度")
+        joblib.dump(xgb_quantile_model, config.XGB_QUANTILE_MODEL_PATH)
+        if interval_conformal is not None:
+            joblib.dump(interval_conformal, config.PRICE_INTERVAL_CONFORMAL_PATH)
+        else:
+            Path(config.PRICE_INTERVAL_CONFORMAL_PATH).unlink(missing_ok=True)
+        print(f"XGBoost 分位数模型 (q={q_low}/{q_high}) 已保存到 {config.XGB_QUANTILE_MODEL_PATH}")
+    except Exception as e:
+        # 旧版本 xgboost (<2.0) 不支持 reg:quantileerror，回退到固定比例区间
+        print(f"警告: 分位数模型训练失败 ({e})，价格区间将使用固定比例。")
+        models['xgb_quantile'] = None
+        # 删除上次训练留下的分位数模型和校准结果，否则 API 仍会加载旧模型
+        Path(config.XGB_QUANTILE_MODEL_PATH).unlink(missing_ok=True)
+        Path(config.PRICE_INTERVAL_CONFORMAL_PATH).unlink(missing_ok=True)
+
+    # KNN
+    print("训练 KNN...")
+    # 确保使用了正确的、存在于当前特征中的 knn 特征名
+    knn_features_potential = ['cpu_score', 'ram_size', 'age'] # 示例核心特征
+    # 从配置文件或动态确定哪些特征是one-hot编码后的存储类型等
+    # knn_features_potential.extend([f for f in feature_names if 'storage_type_' in f]) # 添加one-hot编码特征示例
+    knn_features = [f for f in knn_features_potential if f in feature_names]
+
+    if knn_features:
+        knn_model = KNeighborsRegressor(n_neighbors=config.KNN_K, weights='distance', n_jobs=-1)
+        with stage('knn_fit'):
+            knn_model.fit(X_train[knn_features], y_train)
+        models['knn'] = knn_model
+        with stage('knn_predict'):
+            predictions['knn'] = knn_model.predict(X_test[knn_features])
+        smapes['knn'] = smape(y_test, predictions['knn'])
+        print(f"KNN (k={config.KNN_K}) Test sMAPE: {smapes['knn']:.2f}%")
+        joblib.dump(knn_model, config.KNN_MODEL_PATH)
+        joblib.dump(knn_features, config.KNN_FEATURES_PATH) # 保存KNN使用的特征
+        print(f"KNN 模型及特征列表已保存。")
+        with stage('knn_listings'):
+            save_knn_listings(X_train, y_train, joblib.load(config.SCALER_PATH) if Path(config.SCALER_PATH).exists() else None)
+    else:
+        print("警告: KNN所需特征不足，跳过KNN训练。")
+        models['knn'] = None
+
+    # Decay Model (Linear Regression)
+    print("训练 Decay Model...")
+    decay_features_potential = ['age_factor', 'age'] # 示例
+    decay_features = [f for f in decay_features_potential if f in feature_names]
+    if decay_features:
+        decay_model = LinearRegression()
+        with stage('decay_fit'):
+            decay_model.fit(X_train[decay_features], y_train)
+        models['decay'] = decay_model
+        with stage('decay_predict'):
+            predictions['decay'] = decay_model.predict(X_test[decay_features])
+        smapes['decay'] = smape(y_test, predictions['decay'])
+        print(f"Decay Model Test sMAPE: {smapes['decay']:.2f}%")
+        joblib.dump(decay_model, config.DECAY_MODEL_PATH)
+        joblib.dump(decay_features, config.DECAY_FEATURES_PATH) # 保存Decay模型使用的特征
+        print(f"Decay 模型及特征列表已保存。")
+    else:
+        print("警告: Decay模型所需特征不足，跳过训练。")
+        models['decay'] = None
+
+    # --- 3.5 线性组件折叠 (scaler + 线性模型 -> 原始特征上的一次点积) ---
+    print("折叠线性组件...")
+    try:
+        scaler = joblib.load(config.SCALER_PATH)
+    except FileNotFoundError:
+        scaler = None
+        print("警告: 未找到标准化器，线性组件将按原始系数折叠。")
+    feature_lists = {'knn': knn_features, 'decay': decay_features}
+    with stage('fuse_linear'):
+        fused_linear = fuse_linear_components(models, feature_lists, scaler)
+    if fused_linear:
+        # 一致性校验: 折叠结果必须与 sklearn 路径 (scaler.transform + model.predict) 一致
+        X_test_raw = unscale_features(X_test, scaler) if scaler is not None else X_test
+        for name, component in list(fused_linear.items()):
+            fused_pred = predict_fused(component, X_test_raw)
+            max_diff = np.max(np.abs(fused_pred - predictions[name]))
+            print(f"{name} 折叠模型与 sklearn 路径最大偏差: {max_diff:.6f}")
+            if not np.allclose(fused_pred, predictions[name], rtol=1e-6, atol=1e-3):
+                print(f"警告: {name} 折叠结果与原模型不一致，已放弃折叠。")
+                del fused_linear[name]
+    # 没有可折叠的组件时也要保存空 dict，覆盖上次训练的折叠结果 (否则 API 会用旧系数)
+    joblib.dump(fused_linear, config.FUSED_LINEAR_PATH)
+    print(f"折叠后的线性组件已保存到 {config.FUSED_LINEAR_PATH}: {list(fused_linear)}")
+
+    # --- 4. 混合模型评估与权重保存 ---
+    print("评估混合模型...")
+    with stage('blend'):
+        weights = config.MODEL_WEIGHTS.copy() # 从配置加载权重
+        final_pred_test = np.zeros_like(y_test, dtype=float)
+        active_weight_sum = 0
+
+        # 检查模型是否训练成功并累加预测
+        if models['xgb']:
+            final_pred_test += weights['xgb'] * predictions['xgb']
+            active_weight_sum += weights['xgb']
+        else: weights['xgb'] = 0 # 如果失败则权重置零
+
+        if models['knn']:
+            final_pred_test += weights['knn'] * predictions['knn']
+            active_weight_sum += weights['knn']
+        else: weights['knn'] = 0
+
+        if models['decay']:
+            final_pred_test += weights['decay'] * predictions['decay']
+            active_weight_sum += weights['decay']
+        else: weights['decay'] = 0
+
+        # 归一化权重，如果部分模型失败
+        if active_weight_sum > 0 and active_weight_sum < 1.0:
+            scale = 1.0 / active_weight_sum
+            for key in weights:
+                weights[key] *= scale
+            # 重新计算最终预测
+            final_pred_test = np.zeros_like(y_test, dtype=float)
+            if models['xgb']: final_pred_test += weights['xgb'] * predictions['xgb']
+            if models['knn']: final_pred_test += weights['knn'] * predictions['knn']
+            if models['decay']: final_pred_test += weights['decay'] * predictions['decay']
+
+
+    final_smape = smape(y_test, final_pred_test)
+    print(f"\nHybrid Model Test sMAPE: {final_smape:.2f}%")
+    save_holdout_predictions(X_test.index, y_test, final_pred_test)
+    save_prediction_profile(final_pred_test)
+
+    # 级联推理: 按分段学习何时可以跳过 KNN/Decay，报告快速路径占比和精度变化
+    X_test_raw = unscale_features(X_test, scaler) if scaler is not None else X_test
+    if models['xgb'] and (models['knn'] or models['decay']):
+        print("\n学习级联推理路由 (测试集一半校准、一半评估)...")
+        with stage('cascade'):
+            train_cascade(X_test_raw, {name: predictions[name] for name in ('xgb', 'knn', 'decay') if models[name]}, weights, y_test)
+    else:
+        Path(config.CASCADE_PATH).unlink(missing_ok=True)
+
+    # 固定比例区间 (基线)
+    fixed_low = final_pred_test * config.PRICE_RANGE_FACTOR_LOW
+    fixed_high = final_pred_test * config.PRICE_RANGE_FACTOR_HIGH
+    fixed_hit_rate = np.mean((y_test >= fixed_low) & (y_test <= fixed_high)) * 100
+    print(f"Fixed-Factor Range Hit Rate: {fixed_hit_rate:.2f}% (平均相对宽度 {np.mean((fixed_high - fixed_low) / np.maximum(final_pred_test, 1)):.3f})")
+
+    if models['xgb_quantile']:
+        # 分位数区间 (经共形校准，与 API 相同): 与点估计同一批次计算，并保证区间包含点估计
+        target_coverage = (q_high - q_low) * 100
+        raw_low, raw_high = predictions['xgb_quantile'][:, 0], predictions['xgb_quantile'][:, 1]
+        if interval_conformal is not None:
+            raw_hit_rate = np.mean((y_test >= np.minimum(raw_low, final_pred_test)) & (y_test <= np.maximum(raw_high, final_pred_test))) * 100
+            print(f"Uncalibrated Quantile Interval Coverage: {raw_hit_rate:.2f}%")
+        widened_low, widened_high = widen_interval(raw_low, raw_high, interval_conformal)
+        lower_bound = np.minimum(widened_low, final_pred_test)
+        upper_bound = np.maximum(widened_high, final_pred_test)
+        hit_rate = np.mean((y_test >= lower_bound) & (y_test <= upper_bound)) * 100
+        print(f"Quantile Interval Coverage: {hit_rate:.2f}% (目标 {target_coverage:.0f}%, 平均相对宽度 {np.mean((upper_bound - lower_bound) / np.maximum(final_pred_test, 1)):.3f})")
+    else:
+        lower_bound, upper_bound = fixed_low, fixed_high
+        hit_rate = fixed_hit_rate
+    print(f"Price Range Hit Rate: {hit_rate:.2f}%")
+
+    # 分段评估: 按品牌/性能等级/机龄/价格段拆分指标，并写入 config.EVALUATION_REPORT_PATH
+    print("\n分段评估混合模型...")
+    with stage('segment_evaluation'):
+        run_segment_evaluation(X_test_raw, y_test, final_pred_test, lower_bound, upper_bound)
+
+    # 保存最终使用的权重
+    joblib.dump(weights, config.MODEL_WEIGHTS_PATH)
+    print(f"模型权重已保存到 {config.MODEL_WEIGHTS_PATH}")
+
+    # --- 5. 特征重要性分析 (XGBoost) ---
+    if models['xgb']:
+        feature_importances = pd.DataFrame({
+            'feature': feature_names, # 使用训练时的特征名
+            'importance': models['xgb'].feature_importances_
+        }).sort_values('importance', ascending=False)
+        print("\nTop 10 Feature Importances (XGBoost):")
+        print(feature_importances.head(10))
+
+    # --- 6. 用新模型重建价格查找表 ---
+    if config.PRICE_TABLE_ENABLED:
+        print("\n重建价格查找表...")
+        with stage('price_table'):
+            rebuild_price_table()
+
+    print("模型训练和评估完成。")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="训练并评估混合模型")
+    parser.add_argument('--profile', action='store_true', help="记录各阶段的耗时、CPU 时间和内存峰值 (写入 config.PROFILE_DIR)")
+    parser.add_argument('--profile-dump', choices=['cprofile', 'stacks'], help="另外保存每个阶段的 cProfile 结果或折叠调用栈 (火焰图)")
+    parser.add_argument('--no-tracemalloc', action='store_true', help="不用 tracemalloc 统计分配峰值 (它会拖慢纯 Python 的阶段)，只采样 RSS")
+    args = parser.parse_args()
+
+    if args.profile or args.profile_dump:
+        enable_profiling(args.profile_dump, trace_memory=not args.no_tracemalloc)
+    try:
+        train_and_evaluate()
+    finally:
+        profiler = disable_profiling()
+        if profiler is not None:
+            output_dir = profiler.write()
+            print(f"\n各阶段性能 (总耗时 {profiler.meta['wall_s']:.2f} 秒, CPU {profiler.meta['cpu_s']:.2f} 秒, 最大 RSS {profiler.meta['max_rss_MB']:.0f} MB):")
+            print(format_summary(profiler.summary()))
+            print(f"性能分析结果已保存到 {output_dir}")
@@ -2,6 +2,28 @@
 import numpy as np
 import re
 from datetime import datetime
+from functools import lru_cache
+
+# 解析规则的版本号: 修改 parse_description_fields / extract_text_fields 的规则时必须递增，持久化的解析缓存 (src/parse_cache.py) 随之失效
+PARSER_VERSION = 3
+
+# API 与训练共用的缺失值策略: 请求/帖子没有给出的字段
+DEFAULT_CPU_SCORE = 3000
+DEFAULT_AGE = 2 # 没有 release_year 时假设为 2 年前发布
+MISSING_CATEGORY = 'Unknown' # 类别字段 (feature_engineering.clean_raw_data 与 ensemble.normalize_records 填充的值)
+DESCRIPTION_CATEGORIES = ('brand', 'gpu_type', 'storage_type', 'screen_condition', 'battery_health')
+
+# 描述中的关键词 → 字段取值 (API 的 parse_description 与 ETL 共用)，按顺序取第一个命中的；英文关键词不区分大小写
+BRAND_KEYWORDS = [
+    ('ThinkPad', ('thinkpad',)), # 训练数据中 ThinkPad 与 Lenovo 是不同的品牌
+    ('Lenovo', ('联想', 'lenovo')),
+    ('Dell', ('戴尔', 'dell')),
+    ('Apple', ('苹果', 'macbook', 'apple')),
+]
+STORAGE_KEYWORDS = [
+    ('SSD', ('ssd', '固态')),
+    ('HDD', ('hdd', '机械硬盘')),
+]
 
 def smape(y_true, y_pred):
     """计算对称平均绝对百分比误差 (sMAPE)"""
@@ -12,6 +34,7 @@ def smape(y_true, y_pred):
     ratio = np.where(denominator == 0, 0, numerator / denominator)
     return np.mean(ratio) * 100
 
+@lru_cache(maxsize=4096) # ram_desc 的取值很少 ('8GB'、'16GB' ...)，训练时逐行解析的结果大多可以复用
 def parse_ram(desc, default_ram=8):
     """从文本描述解析内存大小 (GB)"""
     if isinstance(desc, (int, float)) and not pd.isna(desc):
@@ -24,36 +47,52 @@ def parse_ram(desc, default_ram=8):
 
 def parse_description(text):
     """从文本描述提取关键硬件信息 (简化版)"""
-    # (将之前 app.py 中的解析逻辑移到这里)
-    info = {}
-    # ... (CPU, RAM, 存储, 品牌等解析逻辑) ...
-    cpu_match = re.search(r'(i[3579]\s?-\s?\d{4,5}[A-Za-z]*)', text, re.IGNORECASE)
-    if cpu_match: info['cpu_raw'] = cpu_match.group(1)
-    else: info['cpu_raw'] = None
+    return with_time_defaults(parse_description_fields(text))
+
+
+def with_time_defaults(info):
+    """补上随当前时间变化的默认值 (不能缓存的部分)"""
+    info.setdefault('release_year', datetime.now().year - DEFAULT_AGE)
+    return info
 
+
+def _match_keywords(text, lower, keywords):
+    for value, words in keywords:
+        if any(word in lower if word.isascii() else word in text for word in words):
+            return value
+    return None
+
+
+def extract_text_fields(text):
+    """描述中实际提到的字段 (ram_desc/brand/storage_type)，没有提到的字段不出现在结果中 (ETL 直接使用)"""
+    fields = {}
     ram_match = re.search(r'(\d+)\s*G[B]?\s*(内存)?', text, re.IGNORECASE)
-    if ram_match: info['ram_desc'] = f"{ram_match.group(1)}GB"
-    else: info['ram_desc'] = 'Unknown' # 或者根据上下文推断
-
-    # ... 其他解析规则 ...
-    if '联想' in text: info['brand'] = 'Lenovo'
-    elif '戴尔' in text: info['brand'] = 'Dell'
-    elif '苹果' in text or 'MacBook' in text: info['brand'] = 'Apple'
-    else: info['brand'] = 'Other'
-
-    # 假设默认值或尝试从文本提取其他字段
-    info.setdefault('storage_type', 'Unknown')
-    info.setdefault('screen_condition', '良好') # 假设默认
-    info.setdefault('battery_health', '良好') # 假设默认
-    info.setdefault('gpu_type', 'Integrated') # 假设默认
-    info.setdefault('release_year', datetime.now().year - 2) # 假设默认2年前
-    info.setdefault('cpu_score', 3000) # 假设默认分数
+    if ram_match: fields['ram_desc'] = f"{ram_match.group(1)}GB"
+
+    lower = text.lower()
+    brand = _match_keywords(text, lower, BRAND_KEYWORDS)
+    if brand: fields['brand'] = brand
+    storage_type = _match_keywords(text, lower, STORAGE_KEYWORDS)
+    if storage_type: fields['storage_type'] = storage_type
+    return fields
 
+
+def parse_description_fields(text):
+    """parse_description 中只取决于文本本身的部分 (结果可以按文本缓存)
+
+    描述中提到的字段与 ETL 相同 (extract_text_fields)，没有提到的字段按训练时的缺失值策略填充。
+    """
+    info = extract_text_fields(text)
+    cpu_match = re.search(r'(i[3579]\s?-\s?\d{4,5}[A-Za-z]*)', text, re.IGNORECASE)
+    info['cpu_raw'] = cpu_match.group(1) if cpu_match else None
+    info.setdefault('ram_desc', 'Unknown') # parse_ram 解析失败时使用默认内存
+    for field in DESCRIPTION_CATEGORIES:
+        info.setdefault(field, MISSING_CATEGORY)
+    info.setdefault('cpu_score', DEFAULT_CPU_SCORE)
     return info
 
-# 可以添加 get_region_coefficient, get_calibration_factor 等函数的占位符或实现
-# def get_region_coefficient(ip_address): return 1.0
-# def get_calibration_factor(data): return 1.0
+# 地区价格系数: get_region_coefficient 见 src/region.py
+# 人工校准系数: get_calibration_factor 见 src/calibration.py
 
 # 确保导入pandas以处理NaN（如果在parse_ram等函数中使用了pd.isna）
 try:
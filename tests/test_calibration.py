@@ -0,0 +1,89 @@
+# tests/test_calibration.py
+import json
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config
+from src import calibration
+from src.calibration import CalibrationEngine, request_frame
+
+RULES = [
+    {'id': 'x1-battery', 'brand': 'Lenovo', 'description_regex': 'X1', 'battery_health': '较差', 'factor': 0.92},
+    {'id': 'apple-m', 'brand': 'Apple', 'description_regex': 'M[1-4]', 'factor': 1.05},
+    {'id': 'big-ram', 'ram_size': [32, None], 'factor': 1.03},
+    {'id': 'old-low', 'performance_tier': ['low', 'mid'], 'release_year': [None, 2018], 'factor': 0.9},
+    {'id': 'dell-high', 'brand': ['Dell', 'HP'], 'performance_tier': 'high', 'cpu_score': [6000, 8000], 'factor': 1.1},
+    {'id': 'expired', 'factor': 0.5, 'valid_until': '2000-01-01'},
+]
+
+
+def random_records(n, seed=0):
+    rng = random.Random(seed)
+    records = []
+    for _ in range(n):
+        data = {'brand': rng.choice(['Lenovo', 'Apple', 'Dell', 'HP', 'Asus'])}
+        if rng.random() < 0.8:
+            data['cpu_score'] = rng.choice([1500, 3000, 5000, 6500, 7999, 8000, 12000])
+        if rng.random() < 0.7:
+            data['release_year'] = rng.randint(2014, 2025)
+        if rng.random() < 0.5:
+            data['ram_desc'] = rng.choice(['8G', '16GB', '32G', '64G', '未知'])
+        elif rng.random() < 0.5:
+            data['ram_size'] = rng.choice([8, 16, 32])
+        if rng.random() < 0.5:
+            data['battery_health'] = rng.choice(['良好', '较差'])
+        if rng.random() < 0.6:
+            data['description'] = rng.choice(['ThinkPad X1 Carbon', 'MacBook Air m2', 'MacBook Pro Intel', '普通笔记本'])
+        records.append(data)
+    return records
+
+
+@pytest.fixture
+def engine(tmp_path):
+    path = tmp_path / 'calibration_rules.json'
+    path.write_text(json.dumps(RULES, ensure_ascii=False), encoding='utf-8')
+    return CalibrationEngine(path)
+
+
+def test_batch_factors_match_single_requests(engine):
+    records = random_records(500)
+    factors, applied = engine.batch_factors(request_frame(records))
+    expected = [engine.match(data) for data in records]
+    np.testing.assert_allclose(factors, [f for f, _ in expected])
+    hits = {}
+    for rule, positions in applied:
+        for i in positions:
+            hits.setdefault(int(i), set()).add(rule['id'])
+    assert hits == {i: set(ids) for i, (_, ids) in enumerate(expected) if ids}
+
+
+def test_batch_factors_without_rules(tmp_path):
+    engine = CalibrationEngine(tmp_path / 'missing.json')
+    factors, applied = engine.batch_factors(request_frame(random_records(5)))
+    assert list(factors) == [1.0] * 5 and applied == []
+
+
+def test_get_calibration_factors_audits_each_applied_rule(engine, tmp_path, monkeypatch):
+    audit_path = tmp_path / 'audit.jsonl'
+    monkeypatch.setattr(config, 'CALIBRATION_AUDIT_LOG_PATH', audit_path)
+    monkeypatch.setattr(calibration, '_engine', engine)
+    for handler in list(calibration.audit_logger.handlers):
+        calibration.audit_logger.removeHandler(handler)
+    records = [{'brand': 'Lenovo', 'battery_health': '较差', 'description': 'ThinkPad X1', 'ram_desc': '32G'},
+               {'brand': 'Asus', 'ram_desc': '8G'}]
+    try:
+        factors = calibration.get_calibration_factors(records, np.array([1000.0, 2000.0]))
+    finally:
+        for handler in list(calibration.audit_logger.handlers):
+            handler.close()
+            calibration.audit_logger.removeHandler(handler)
+    np.testing.assert_allclose(factors, [0.92 * 1.03, 1.0])
+    entries = [json.loads(line) for line in audit_path.read_text(encoding='utf-8').splitlines()]
+    assert sorted(e['rule'] for e in entries) == ['big-ram', 'x1-battery']
+    assert all(e['prediction'] == 1000.0 and e['calibrated_prediction'] == pytest.approx(1000.0 * 0.92 * 1.03) for e in entries)
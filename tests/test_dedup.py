@@ -0,0 +1,42 @@
+# tests/test_dedup.py
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.dedup import assign_duplicate_groups, candidate_pairs, deduplicate
+
+
+def test_candidate_pairs_without_signatures():
+    for n in (0, 1):
+        left, right = candidate_pairs(np.zeros((n, 64), dtype=np.uint32))
+        assert left.dtype == right.dtype == np.int64
+        assert len(left) == len(right) == 0
+
+
+def test_short_descriptions_form_singleton_groups():
+    descriptions = pd.Series(['', None, 'ab', '好', 'x'])
+    groups = assign_duplicate_groups(descriptions, prices=[1000, 1000, 1200, 900, 800])
+    assert list(groups) == [0, 1, 2, 3, 4]
+
+
+def test_single_usable_description():
+    groups = assign_duplicate_groups(pd.Series(['联想小新 16G 512G', 'ab', '']))
+    assert len(set(groups)) == 3
+
+
+def test_deduplicate_keeps_rows_with_short_descriptions():
+    df = pd.DataFrame({'description': ['', 'ok', None], 'actual_price': [1000.0, 2000.0, 3000.0]})
+    result = deduplicate(df, mode='drop')
+    assert len(result) == 3
+    assert result['dup_group'].nunique() == 3
+
+
+def test_reposts_still_grouped():
+    text = '联想小新Pro14 16G内存 512G固态 99新 无划痕 送电脑包'
+    groups = assign_duplicate_groups(pd.Series([text, text + ' 急出', '戴尔 XPS13 8G 256G 成色一般 电池健康85%']),
+                                     prices=[4000, 3950, 2500])
+    assert groups[0] == groups[1] != groups[2]
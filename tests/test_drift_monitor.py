@@ -0,0 +1,78 @@
+# tests/test_drift_monitor.py
+# 环形缓冲区按训练分布的类别表存序号，读取时还原；预测漂移的参照来自留出集的模型预测
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config
+from src import drift_monitor
+from src.drift_monitor import (RECORD_DTYPE, UNSEEN_CATEGORY, TrafficRecorder, build_training_profile, category_levels,
+                               compute_drift_report, load_traffic, save_prediction_profile)
+
+TRAINING = pd.DataFrame({
+    'brand': ['Lenovo', 'Dell', 'Apple', 'Unknown'], 'gpu_type': ['Integrated', 'Dedicated', 'Integrated', 'Unknown'],
+    'storage_type': ['SSD', 'HDD', 'SSD', 'Unknown'], 'screen_condition': ['良好', '完美', '较差', 'Unknown'],
+    'battery_health': ['良好', '良好', '较差', 'Unknown'], 'performance_tier': ['low', 'mid', 'high', 'mid'],
+    'ram_size': [8, 16, 16, 8], 'cpu_score': [1500, 3000, 7000, 3000], 'release_year': [2018, 2020, 2022, 2021],
+})
+
+
+def record_all(recorder, requests, log_dir, expected_brands=None):
+    """记录请求并等待后台线程写入 (expected_brands 为空时只检查条数)"""
+    for data, prediction in requests:
+        recorder.record(data, prediction)
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        traffic = load_traffic(log_dir)
+        if len(traffic) == len(requests) and expected_brands in (None, traffic['brand'].tolist()):
+            return traffic
+        time.sleep(0.02)
+    raise AssertionError("采样记录没有在 5 秒内写入")
+
+
+def test_categories_are_stored_as_codes(tmp_path):
+    levels = category_levels(build_training_profile(TRAINING))
+    recorder = TrafficRecorder(tmp_path, 16, 1, levels)
+    traffic = record_all(recorder, [({'brand': 'Dell', 'gpu_type': 'Dedicated', 'ram_desc': '16GB', 'cpu_score': 7000}, 5000.0),
+                                    ({'brand': 'Framework', 'storage_type': 'SSD'}, 3000.0)], tmp_path)
+
+    assert RECORD_DTYPE['brand'].itemsize == 2
+    raw = np.fromfile(next(tmp_path.glob('traffic_*.ring')), dtype=RECORD_DTYPE)
+    assert sorted(raw['brand'][raw['seq'] > 0]) == [-1, levels['brand'].index('Dell')]
+    assert traffic['brand'].tolist() == ['Dell', UNSEEN_CATEGORY]
+    assert traffic['gpu_type'].tolist() == ['Dedicated', 'Unknown'] # 没有给出的字段按缺失值记录
+    assert traffic['storage_type'].tolist() == ['Unknown', 'SSD']
+
+    report = compute_drift_report(build_training_profile(TRAINING), traffic)
+    assert report['features']['brand']['unseen_rate'] == 0.5
+
+
+def test_buffer_is_reset_when_levels_change(tmp_path):
+    levels = category_levels(build_training_profile(TRAINING))
+    record_all(TrafficRecorder(tmp_path, 16, 1, levels), [({'brand': 'Dell'}, 1.0)], tmp_path)
+
+    retrained = dict(levels, brand=['Acer'] + levels['brand']) # 重新训练后序号整体偏移
+    # 同一进程的新 recorder 写同一个文件: 类别表不同，旧记录被丢弃而不是按新表错误地解释
+    traffic = record_all(TrafficRecorder(tmp_path, 16, 1, retrained), [({'brand': 'Acer'}, 2.0)], tmp_path, ['Acer'])
+    assert drift_monitor._read_levels(next(tmp_path.glob('traffic_*.ring')))['brand'][0] == 'Acer'
+
+
+def test_prediction_baseline_comes_from_holdout_predictions(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'TRAINING_PROFILE_PATH', tmp_path / 'training_profile.pkl')
+    drift_monitor.save_training_profile(TRAINING.assign(actual_price=[100.0, 200.0, 300.0, 400.0]))
+    assert 'prediction' not in joblib.load(config.TRAINING_PROFILE_PATH)['numeric']
+
+    predictions = np.random.default_rng(0).normal(3000, 300, 1000)
+    save_prediction_profile(predictions)
+    profile = joblib.load(config.TRAINING_PROFILE_PATH)
+    edges = profile['numeric']['prediction']['edges']
+    assert 2500 < edges[1] and edges[-2] < 3500
+    traffic = pd.DataFrame({'prediction': predictions[:500], 'cpu_score': 3000.0, 'release_year': 2020.0, 'ram_size': 8.0,
+                            'cpu_score_default': False, **{col: TRAINING[col][0] for col in drift_monitor.RECORDED_CATEGORIES}})
+    assert compute_drift_report(profile, traffic)['features']['prediction']['psi'] < 0.05
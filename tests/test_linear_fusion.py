@@ -0,0 +1,74 @@
+# tests/test_linear_fusion.py
+# fuse_linear_model 折叠后的系数在原始特征上的预测应与 "先标准化再预测" 相同
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import StandardScaler
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.ensemble import scale_features
+from src.linear_fusion import fuse_linear_model, fuse_linear_components, predict_fused, unscale_features
+
+NUMERICAL = ['release_year', 'cpu_score', 'ram_size', 'age_factor']
+
+
+def raw_features(n, seed=0, dtype=float):
+    """与特征工程输出相同结构的原始特征: 尺度差别很大的数值列 + One-Hot 列"""
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({
+        'release_year': rng.integers(2012, 2026, n),
+        'cpu_score': rng.uniform(500, 20000, n),
+        'ram_size': rng.choice([4, 8, 16, 32, 64], n),
+        'age_factor': rng.uniform(0.3, 1.0, n),
+    }).astype(dtype)
+    brand = rng.choice(['Apple', 'Dell', 'Lenovo'], n)
+    for value in ['Apple', 'Dell', 'Lenovo']:
+        X[f'brand_{value}'] = brand == value
+    return X
+
+
+def fit_scaled(X_raw, dtype=float):
+    scaler = StandardScaler().fit(X_raw[NUMERICAL])
+    X = X_raw.copy()
+    X[NUMERICAL] = scaler.transform(X_raw[NUMERICAL]).astype(dtype)
+    y = 3000 + 0.4 * X_raw['cpu_score'] + 120 * X_raw['ram_size'] + 800 * X['brand_Apple'] \
+        + np.random.default_rng(1).normal(0, 200, len(X))
+    return scaler, LinearRegression().fit(X, y)
+
+
+def test_dense_fusion_matches_scaled_prediction():
+    X_raw = raw_features(2000)
+    scaler, model = fit_scaled(X_raw)
+    fused = fuse_linear_model(model, list(X_raw.columns), scaler)
+
+    expected = model.predict(scale_features(X_raw, scaler))
+    np.testing.assert_allclose(predict_fused(fused, X_raw), expected, rtol=1e-9, atol=1e-6)
+    np.testing.assert_allclose(predict_fused(fused, unscale_features(scale_features(X_raw, scaler), scaler)), expected,
+                               rtol=1e-9, atol=1e-6)
+
+
+def test_compact_float32_fusion_matches_scaled_prediction():
+    X_raw = raw_features(2000, seed=2, dtype=np.float32)
+    scaler, model = fit_scaled(X_raw, dtype=np.float32)
+    fused = fuse_linear_model(model, list(X_raw.columns), scaler)
+
+    X_scaled = X_raw.copy()
+    X_scaled[NUMERICAL] = scaler.transform(X_raw[NUMERICAL]).astype(np.float32)
+    expected = model.predict(X_scaled)
+    # float32 的标准化结果有约 1e-7 的相对误差，折叠后在 float64 上计算
+    np.testing.assert_allclose(predict_fused(fused, X_raw), expected, rtol=1e-5, atol=1e-2)
+
+
+def test_components_skip_non_linear_models():
+    X_raw = raw_features(200, seed=3)
+    scaler, model = fit_scaled(X_raw)
+    fused = fuse_linear_components({'ridge': model, 'knn': object()},
+                                   {'ridge': list(X_raw.columns), 'knn': list(X_raw.columns)}, scaler)
+    assert list(fused) == ['ridge']
+    with pytest.raises(ValueError):
+        fuse_linear_model(model, list(X_raw.columns)[:-1], scaler)
@@ -0,0 +1,73 @@
+# tests/test_parse_parity.py
+# 同一段描述经 ETL + 特征工程 (训练) 和 schema.decode_request + ensemble (服务) 两条路径后编码结果应相同
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config
+from src import etl
+from src.ensemble import normalize_records, encode_features, scale_features
+from src.feature_engineering import clean_raw_data, encode_and_scale
+from src.schema import decode_request
+from src.utils import extract_text_fields, parse_description
+
+DESCRIPTIONS = [
+    'ThinkPad X1 Carbon 16G 512G固态',
+    'dell xps 8GB SSD 轻薄本',
+    '联想小新 32G内存 机械硬盘',
+    'MacBook Air 16g',
+    '普通笔记本 16G内存', # 没有提到品牌和存储
+]
+
+
+@pytest.fixture(autouse=True)
+def no_parse_cache(monkeypatch):
+    monkeypatch.setattr(config, 'PARSE_CACHE_ENABLED', False)
+
+
+def training_rows():
+    scraped = pd.DataFrame({'description': DESCRIPTIONS,
+                            'actual_price': [str(3000 + 500 * i) for i in range(len(DESCRIPTIONS))],
+                            'post_date': datetime.now().strftime('%Y-%m-%d')})
+    parsed = etl.parse_descriptions(scraped['description'], n_workers=1)
+    rows = etl.normalize_scraped(scraped, parsed, 'fixture.csv', datetime.now())
+    return clean_raw_data(rows.drop(columns=['description', 'location', 'source_file']))
+
+
+def serving_rows():
+    records = [decode_request(json.dumps({'description': text}).encode('utf-8')) for text in DESCRIPTIONS]
+    return normalize_records(records)
+
+
+def test_parsers_agree_on_mentioned_fields():
+    for text in DESCRIPTIONS:
+        mentioned = extract_text_fields(text)
+        parsed = parse_description(text)
+        assert {k: parsed[k] for k in mentioned} == mentioned
+    assert parse_description(DESCRIPTIONS[0])['brand'] == 'ThinkPad'
+    assert parse_description(DESCRIPTIONS[1])['brand'] == 'Dell'
+    assert parse_description(DESCRIPTIONS[-1])['brand'] == 'Unknown'
+
+
+def test_dense_features_match():
+    X, _, scaler, _ = encode_and_scale(training_rows(), mode='dense')
+    served = scale_features(encode_features(serving_rows(), list(X.columns)), scaler)
+    np.testing.assert_allclose(served.to_numpy(dtype=float), X.to_numpy(dtype=float), atol=1e-9)
+
+
+def test_compact_features_match():
+    X, _, scaler, category_levels = encode_and_scale(training_rows(), mode='compact')
+    served = scale_features(encode_features(serving_rows(), list(X.columns), category_levels), scaler)
+    for col in X.columns:
+        if isinstance(X[col].dtype, pd.CategoricalDtype):
+            assert served[col].isna().sum() == 0
+            assert served[col].astype(str).tolist() == X[col].astype(str).tolist()
+        else:
+            np.testing.assert_allclose(served[col].to_numpy(dtype=float), X[col].to_numpy(dtype=float), rtol=1e-5, atol=1e-5)
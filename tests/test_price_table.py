@@ -0,0 +1,54 @@
+# tests/test_price_table.py
+# 查找表的 cpu_score 吸附: lookup_price 与 table_coverage 使用相同的匹配规则
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.price_table import TABLE_AXES, TABLE_OUTPUTS, _make_index, lookup_price, snap_cpu_scores, table_coverage
+
+CPU_GRID = [1000, 1300, 1700, 2300, 3000, 3900, 4700, 5800, 7500, 9000, 11500, 15000, 19500]
+
+
+def small_table():
+    """每个网格点的值为其 cpu_score 序号，便于检查查到的是哪个点"""
+    build_year = datetime.now().year
+    axes = [['Lenovo'], ['Integrated'], ['SSD'], ['良好'], ['良好'], [8, 16], CPU_GRID, [build_year - 2, build_year - 1]]
+    shape = tuple(len(values) for values in axes)
+    values = np.broadcast_to(np.arange(len(CPU_GRID), dtype=np.float32)[None, :, None, None],
+                             (shape[5], len(CPU_GRID), shape[7], len(TABLE_OUTPUTS))).reshape(shape + (len(TABLE_OUTPUTS),))
+    return {'axes': axes, 'index': _make_index(axes), 'values': values, 'build_year': build_year}
+
+
+def test_snap_within_tolerance_and_tier():
+    snapped = snap_cpu_scores([3000, 3300, 1950, 2050, 4999, 800, 30000, np.nan], CPU_GRID, tolerance=0.15)
+    # 1950 属于 low 等级，只能吸附到 1700 (偏差 12.8%)；4999 吸附到同等级的 4700 而不是 5800 (high)；800 超出容差
+    np.testing.assert_array_equal(snapped, [3000, 3000, 1700, 2300, 4700, np.nan, np.nan, np.nan])
+    assert np.isnan(snap_cpu_scores([1950], CPU_GRID, tolerance=0.1)[0])
+
+
+def test_lookup_uses_snapped_cpu_score():
+    table = small_table()
+    request = {'brand': 'Lenovo', 'gpu_type': 'Integrated', 'storage_type': 'SSD', 'screen_condition': '良好',
+               'battery_health': '良好', 'ram_desc': '16GB', 'release_year': table['build_year'] - 1}
+    assert lookup_price(table, dict(request, cpu_score=7200), tolerance=0.15) == (8.0, 8.0, 8.0) # → 7500
+    assert lookup_price(table, request, tolerance=0.15) == (4.0, 4.0, 4.0) # 默认分数 3000
+    assert lookup_price(table, dict(request, cpu_score=30000), tolerance=0.15) is None
+    assert lookup_price(table, dict(request, brand='Dell', cpu_score=3000), tolerance=0.15) is None
+
+
+def test_coverage_matches_lookup():
+    table = small_table()
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({'brand': rng.choice(['Lenovo', 'Dell'], 300), 'gpu_type': 'Integrated', 'storage_type': 'SSD',
+                          'screen_condition': '良好', 'battery_health': '良好', 'ram_size': rng.choice([8, 16, 32], 300),
+                          'cpu_score': rng.uniform(500, 25000, 300), 'release_year': table['build_year'] - 2})
+    hits = [lookup_price(table, dict(row, ram_desc=f"{row['ram_size']}GB"), tolerance=0.15) is not None
+            for row in frame.to_dict('records')]
+    assert table_coverage(table, frame, tolerance=0.15) == np.mean(hits)
+    assert 0 < np.mean(hits) < 1
+    assert list(frame.columns) == TABLE_AXES
@@ -0,0 +1,51 @@
+# tests/test_schema.py
+# release_year 的上限按处理请求时的年份检查 (进程跨年运行后仍接受新一年的机型)
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src import schema
+from src.schema import RequestError, decode_batch, decode_request
+
+
+def frozen_year(year):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(year, 1, 1, 0, 0, 1)
+    return FrozenDatetime
+
+
+def body(obj):
+    return json.dumps(obj).encode('utf-8')
+
+
+def test_upper_bound_follows_the_clock(monkeypatch):
+    request = {'release_year': 2031, 'ram_desc': '16GB', 'brand': 'Lenovo'}
+    monkeypatch.setattr(schema, 'datetime', frozen_year(2029))
+    with pytest.raises(RequestError, match=r"Expected `int` <= 2030 - at `\$.release_year`"):
+        decode_request(body(request))
+
+    monkeypatch.setattr(schema, 'datetime', frozen_year(2030)) # 同一个进程跨年之后
+    assert decode_request(body(request))['release_year'] == 2031
+
+
+def test_batch_reports_item_path(monkeypatch):
+    monkeypatch.setattr(schema, 'datetime', frozen_year(2029))
+    ok = {'release_year': 2030, 'ram_desc': '8GB'}
+    with pytest.raises(RequestError, match=r"at `\$\[1\].release_year`"):
+        decode_batch(body([ok, dict(ok, release_year=2031)]), 10)
+    with pytest.raises(RequestError, match=r"at `\$.release_year`"):
+        decode_batch(body(dict(ok, release_year=2031)), 10)
+    records, is_list = decode_batch(body([ok, ok]), 10)
+    assert is_list and [r['release_year'] for r in records] == [2030, 2030]
+
+
+def test_lower_bound_is_still_checked_by_msgspec():
+    with pytest.raises(RequestError, match=r">= 1980 - at `\$.release_year`"):
+        decode_request(body({'release_year': 1970, 'ram_desc': '8GB'}))
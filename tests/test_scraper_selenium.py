@@ -0,0 +1,178 @@
+# tests/test_scraper_selenium.py
+# scripts/scraper_selenium.py 对本地测试站点 (scripts/fixture_listing_site.py) 的端到端测试:
+# 站点是真实的 HTTP 服务，浏览器由 FixtureDriver 代替 (测试环境没有 Chrome)。
+# 运行: python -m pytest tests
+import base64
+import importlib.util
+import json
+import re
+import threading
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urljoin, urlparse
+from urllib.request import urlopen
+
+import pytest
+
+project_root = Path(__file__).resolve().parent.parent
+PAGES = 3
+PER_PAGE = 6
+
+
+def load_script(name):
+    spec = importlib.util.spec_from_file_location(name, project_root / 'scripts' / f'{name}.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+pytest.importorskip('selenium')
+pytest.importorskip('webdriver_manager')
+fixture_site = load_script('fixture_listing_site')
+scraper = load_script('scraper_selenium')
+
+
+def log_entry(method, **params):
+    """Chrome performance 日志的一条记录"""
+    return {'message': json.dumps({'message': {'method': method, 'params': params}})}
+
+
+class FixtureDriver:
+    """代替 Chrome 的最小 WebDriver
+
+    get() 用 urllib 请求列表页，再像页面脚本一样请求 /api/items，并写入对应的 Network.* 日志事件；
+    execute_script() 只支持爬虫用到的两段脚本 (整页提取和点击下一页)，按 PAGE_HTML 中的渲染脚本生成商品元素。
+    """
+
+    def __init__(self, log_batch=None, base64_bodies=False):
+        self.log_batch = log_batch # 每次 get_log 最多返回的事件数 (模拟响应头和加载完成分属两次读取)
+        self.base64_bodies = base64_bodies
+        self.events = []
+        self.bodies = {} # requestId -> 响应体
+        self.elements = [] # 当前页的商品元素: [{CSS 选择器: textContent}]
+        self.page_html = ''
+        self.last_signature = None # 对应页面中的 window.__lastScrapedSignature
+        self.visited = []
+        self.quit_called = False
+
+    def get(self, url):
+        self.visited.append(url)
+        with urlopen(url) as response:
+            self.page_html = response.read().decode('utf-8')
+        self._record(url, response.headers.get_content_type(), self.page_html)
+        page = parse_qs(urlparse(url).query).get('page', ['1'])[0]
+        api_url = urljoin(url, f'/api/items?page={page}')
+        with urlopen(api_url) as response:
+            body = response.read().decode('utf-8')
+        self._record(api_url, response.headers.get_content_type(), body)
+        # 新页面: 与 PAGE_HTML 中的渲染脚本一致
+        self.elements = [{'a.product-title': item['title'], 'span.product-price': f"¥{item['price']}.00",
+                          'div.product-meta': f"{item['location']} · {item['post_time']}"}
+                         for item in json.loads(body)['data']['items']]
+        self.last_signature = None
+
+    def _record(self, url, mime_type, body):
+        request_id = str(len(self.bodies) + 1)
+        self.bodies[request_id] = body
+        self.events.append(log_entry('Network.responseReceived', requestId=request_id,
+                                     response={'url': url, 'mimeType': mime_type}))
+        self.events.append(log_entry('Network.loadingFinished', requestId=request_id))
+
+    def get_log(self, log_type):
+        assert log_type == 'performance'
+        count = len(self.events) if self.log_batch is None else self.log_batch
+        entries, self.events = self.events[:count], self.events[count:]
+        return entries
+
+    def execute_cdp_cmd(self, cmd, args):
+        assert cmd == 'Network.getResponseBody'
+        body = self.bodies[args['requestId']]
+        if self.base64_bodies:
+            return {'body': base64.b64encode(body.encode('utf-8')).decode('ascii'), 'base64Encoded': True}
+        return {'body': body, 'base64Encoded': False}
+
+    def execute_script(self, script, *args):
+        if script == scraper.EXTRACT_ITEMS_JS:
+            item_selector, fields = args
+            assert item_selector == 'div.product-item'
+            rows = [{name: element.get(selector) for name, selector in fields.items()} for element in self.elements]
+            signature = json.dumps(rows[0]) if rows else None
+            if signature is None or signature == self.last_signature:
+                return None
+            self.last_signature = signature
+            return json.dumps(rows, ensure_ascii=False)
+        if 'button.click()' in script:
+            match = re.search(r'<button class="next" ([^>]*)>', self.page_html)
+            if args[0] != 'button.next' or match is None or 'disabled' in match.group(1):
+                return False
+            self.get(urljoin(self.visited[-1], re.search(r"location.href='([^']+)'", match.group(1)).group(1)))
+            return True
+        raise AssertionError(f"未预期的脚本: {script[:60]}")
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture(scope='module')
+def start_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), fixture_site.make_handler(PAGES, PER_PAGE))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/search'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_scraper(monkeypatch):
+    monkeypatch.setattr(scraper, 'SLEEP_MIN', 0.0)
+    monkeypatch.setattr(scraper, 'SLEEP_MAX', 0.0)
+    monkeypatch.setattr(scraper, 'WAIT_TIMEOUT', 1.0)
+    monkeypatch.setattr(scraper, 'API_PATTERN', r'/api/items')
+    monkeypatch.setattr(scraper, 'ITEMS_PATH', 'data.items')
+    monkeypatch.setattr(scraper, 'FIELD_MAP', {'description': 'title', 'actual_price': 'price',
+                                               'location': 'location', 'post_date': 'post_time'})
+    monkeypatch.setattr(scraper, 'SELECTORS', {'item': 'div.product-item', 'description': 'a.product-title',
+                                               'actual_price': 'span.product-price', 'next': 'button.next'})
+
+
+def expected_items(pages=PAGES):
+    return [item for page in range(1, pages + 1) for item in fixture_site.make_items(page, PER_PAGE)]
+
+
+@pytest.mark.parametrize('driver_options', [{}, {'log_batch': 1, 'base64_bodies': True}], ids=['batched', 'split-base64'])
+def test_network_mode_reads_api_responses(start_url, driver_options):
+    driver = FixtureDriver(**driver_options)
+    data = scraper.scrape(driver, start_url, 1000, 'network')
+
+    expected = expected_items()
+    assert [d['description'] for d in data] == [item['title'] for item in expected]
+    assert [d['actual_price'] for d in data] == [str(item['price']) for item in expected]
+    assert [d['location'] for d in data] == [item['location'] for item in expected]
+    assert [d['post_date'] for d in data] == [item['post_time'] for item in expected]
+    assert all(d['brand'] == 'Unknown' for d in data)
+    assert len(driver.visited) == PAGES
+
+
+def test_script_mode_reads_rendered_dom(start_url):
+    driver = FixtureDriver()
+    data = scraper.scrape(driver, start_url, 1000, 'script')
+
+    expected = expected_items()
+    assert [d['description'] for d in data] == [item['title'] for item in expected]
+    assert [d['actual_price'] for d in data] == [str(item['price']) for item in expected] # '¥4230.00' -> '4230'
+    assert len(driver.visited) == PAGES
+
+
+def test_network_mode_falls_back_to_script(start_url, monkeypatch):
+    monkeypatch.setattr(scraper, 'API_PATTERN', r'/no-such-api')
+    monkeypatch.setattr(scraper, 'WAIT_TIMEOUT', 0.2)
+    data = scraper.scrape(FixtureDriver(), start_url, 1000, 'network')
+    assert [d['description'] for d in data] == [item['title'] for item in expected_items()]
+
+
+def test_max_items_stops_paging(start_url):
+    driver = FixtureDriver()
+    data = scraper.scrape(driver, start_url, PER_PAGE + 2, 'network')
+    assert [d['description'] for d in data] == [item['title'] for item in expected_items(2)[:PER_PAGE + 2]]
+    assert len(driver.visited) == 2